@@ -0,0 +1,40 @@
+"""cache_images_soumissions
+
+Revision ID: a3f8c2d6e9b4
+Revises: e5b1d9c3a7f2
+Create Date: 2026-10-17 16:21:40.318842
+
+Cache adressé par contenu des photos de soumission (voir bdproduitdz/image_cache.py) :
+- table image_cache (sha256 -> URL uploadée, texte OCR) ;
+- submission_jobs.image_hashes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f8c2d6e9b4'
+down_revision: Union[str, Sequence[str], None] = 'e5b1d9c3a7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'image_cache',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(), nullable=True),
+        sa.Column('ocr_text', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    op.add_column('submission_jobs', sa.Column('image_hashes', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('submission_jobs', 'image_hashes')
+    op.drop_table('image_cache')
@@ -0,0 +1,47 @@
+"""historique_scan_unique
+
+Revision ID: b7d4e1f0a2c6
+Revises: a3f8c2d6e9b4
+Create Date: 2026-10-17 17:42:09.615203
+
+Une seule ligne par (user_id, product_id) dans scan_history : cible du
+INSERT ... ON CONFLICT de crud.add_scan_to_history.
+- les doublons existants (scans concurrents) sont supprimés, on garde le plus récent ;
+- l'index simple ix_scan_history_user_product (script/add_indexes.py) est
+  remplacé par la contrainte unique uq_scan_history_user_product.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4e1f0a2c6'
+down_revision: Union[str, Sequence[str], None] = 'a3f8c2d6e9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        DELETE FROM scan_history
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, product_id
+                    ORDER BY scanned_at DESC NULLS LAST, id DESC
+                ) AS rang
+                FROM scan_history
+            ) AS doublons
+            WHERE rang > 1
+        )
+    """)
+    op.execute("DROP INDEX IF EXISTS ix_scan_history_user_product")
+    op.create_unique_constraint('uq_scan_history_user_product', 'scan_history', ['user_id', 'product_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_scan_history_user_product', 'scan_history', type_='unique')
+    op.create_index('ix_scan_history_user_product', 'scan_history', ['user_id', 'product_id'], unique=False)
@@ -0,0 +1,59 @@
+"""recherche_trigram_produits
+
+Revision ID: c7e2f4a9b1d3
+Revises: 4b138974121d
+Create Date: 2026-10-17 10:12:41.208733
+
+Index de recherche pour /api/search (voir bdproduitdz/text_search.py) :
+- extensions pg_trgm + unaccent ;
+- fonction IMMUTABLE dznutri_search_norm (minuscules, sans accents, sans
+  harakat ni tatweel, alef/yaa unifiés) utilisable dans un index ;
+- index GIN trigram sur nom + marque normalisés ;
+- index btree text_pattern_ops sur barcode pour la recherche par préfixe.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e2f4a9b1d3'
+down_revision: Union[str, Sequence[str], None] = '4b138974121d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    # unaccent() n'est que STABLE : on l'enveloppe (dictionnaire explicite) pour
+    # pouvoir l'utiliser dans un index d'expression.
+    op.execute(
+        r"""
+        CREATE OR REPLACE FUNCTION dznutri_search_norm(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$
+            SELECT translate(
+                regexp_replace(
+                    lower(public.unaccent('public.unaccent'::regdictionary, $1)),
+                    '[\u064B-\u065F\u0670\u0640]', '', 'g'
+                ),
+                'أإآى', 'اااي'
+            )
+        $$
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_search_trgm ON produits USING gin "
+        "(dznutri_search_norm(coalesce(product_name, '') || ' ' || coalesce(brand, '')) gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_barcode_prefix ON produits (barcode text_pattern_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_products_barcode_prefix")
+    op.execute("DROP INDEX IF EXISTS ix_products_search_trgm")
+    op.execute("DROP FUNCTION IF EXISTS dznutri_search_norm(text)")
@@ -0,0 +1,61 @@
+"""statistiques_historique
+
+Revision ID: c9e3a5f1b8d2
+Revises: b7d4e1f0a2c6
+Create Date: 2026-10-17 18:55:31.204417
+
+Table user_history_stats : compteurs de /api/history/stats tenus à jour par
+incréments (voir bdproduitdz/history_stats.py). Remplie par la migration ;
+script/history_stats.py permet de la reconstruire et de la vérifier.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e3a5f1b8d2'
+down_revision: Union[str, Sequence[str], None] = 'b7d4e1f0a2c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_history_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_scans', sa.Integer(), nullable=False),
+        sa.Column('scored_scans', sa.Integer(), nullable=False),
+        sa.Column('score_sum', sa.BigInteger(), nullable=False),
+        sa.Column('excellent', sa.Integer(), nullable=False),
+        sa.Column('bon', sa.Integer(), nullable=False),
+        sa.Column('mediocre', sa.Integer(), nullable=False),
+        sa.Column('mauvais', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    # Backfill (même calcul que history_stats.rebuild).
+    op.execute("""
+        INSERT INTO user_history_stats
+            (user_id, total_scans, scored_scans, score_sum, excellent, bon, mediocre, mauvais, updated_at)
+        SELECT h.user_id,
+               COUNT(*),
+               COUNT(p.custom_score),
+               COALESCE(SUM(p.custom_score), 0),
+               COUNT(*) FILTER (WHERE p.custom_score >= 75),
+               COUNT(*) FILTER (WHERE p.custom_score >= 50 AND p.custom_score < 75),
+               COUNT(*) FILTER (WHERE p.custom_score >= 25 AND p.custom_score < 50),
+               COUNT(*) FILTER (WHERE p.custom_score < 25),
+               now()
+        FROM scan_history h
+        JOIN produits p ON p.id = h.product_id
+        GROUP BY h.user_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_history_stats')
@@ -0,0 +1,55 @@
+"""source_produits
+
+Revision ID: d4f2b8a6c1e3
+Revises: c9e3a5f1b8d2
+Create Date: 2026-10-17 21:12:08.530117
+
+Colonnes produits.source (openfoodfacts / submission / admin) et
+produits.fetched_at (dernière lecture sur Open Food Facts), utilisées par le
+rafraîchissement en arrière-plan des fiches OFF (off_refresh.py).
+
+Backfill : les produits issus d'une soumission approuvée sont marqués
+`submission` ; les autres produits non vérifiés, sans auteur et jamais
+modifiés (updated_at NULL) viennent d'OFF (fetched_at = date de création :
+ils seront rafraîchis au prochain scan). Une fiche déjà modifiée a pu être
+corrigée par un admin (l'ancien update_product ne laissait pas de trace) :
+elle garde source NULL et n'est jamais réécrite depuis OFF.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f2b8a6c1e3'
+down_revision: Union[str, Sequence[str], None] = 'c9e3a5f1b8d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL = (
+    """
+        UPDATE produits SET source = 'submission'
+        WHERE barcode IN (SELECT barcode FROM submissions WHERE status = 'approved')
+    """,
+    """
+        UPDATE produits SET source = 'openfoodfacts', fetched_at = created_at
+        WHERE source IS NULL AND user_id IS NULL AND is_verified IS NOT TRUE
+          AND updated_at IS NULL
+    """,
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('produits', sa.Column('source', sa.String(), nullable=True))
+    op.add_column('produits', sa.Column('fetched_at', sa.DateTime(), nullable=True))
+    for statement in BACKFILL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('produits', 'fetched_at')
+    op.drop_column('produits', 'source')
@@ -0,0 +1,56 @@
+"""file_traitement_soumissions
+
+Revision ID: e5b1d9c3a7f2
+Revises: c7e2f4a9b1d3
+Create Date: 2026-10-17 14:03:17.552190
+
+Traitement des soumissions en arrière-plan (voir bdproduitdz/submission_jobs.py) :
+- table submission_jobs (file d'attente réclamée avec FOR UPDATE SKIP LOCKED) ;
+- submissions.image_front_url devient nullable (inconnue tant que le job tourne) ;
+- submissions.processing_error.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1d9c3a7f2'
+down_revision: Union[str, Sequence[str], None] = 'c7e2f4a9b1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'submission_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('submission_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('run_after', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('image_front', sa.LargeBinary(), nullable=True),
+        sa.Column('image_ingredients', sa.LargeBinary(), nullable=True),
+        sa.Column('image_nutrition', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['submission_id'], ['submissions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('submission_id'),
+    )
+    op.create_index('ix_submission_jobs_status_run_after', 'submission_jobs', ['status', 'run_after'], unique=False)
+    op.add_column('submissions', sa.Column('processing_error', sa.Text(), nullable=True))
+    op.alter_column('submissions', 'image_front_url', existing_type=sa.String(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE submissions SET image_front_url = '' WHERE image_front_url IS NULL")
+    op.alter_column('submissions', 'image_front_url', existing_type=sa.String(), nullable=False)
+    op.drop_column('submissions', 'processing_error')
+    op.drop_index('ix_submission_jobs_status_run_after', table_name='submission_jobs')
+    op.drop_table('submission_jobs')
@@ -26,3 +26,7 @@ def verify_token(token: str):
         return payload
     except JWTError:
         return None
+
+def create_user_token(user) -> str:
+    """Token d'un utilisateur : le nom (sub) et l'id (uid, évite une recherche par nom)."""
+    return create_access_token(data={"sub": user.username, "uid": user.id})
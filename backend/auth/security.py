@@ -6,6 +6,7 @@ from database import get_db
 from auth import crud as auth_crud
 from auth import schemas as auth_schemas
 from auth import models as auth_models
+from . import user_cache
 from .jwt import verify_token
 
 # "tokenUrl" est un paramètre formel, même si on ne l'utilise pas directement ici
@@ -28,28 +29,43 @@ async def get_current_user(
     if payload is None:
         raise credentials_exception
         
-    username: str = payload.get("sub")
-    if username is None:
+    cache_key = user_cache.subject_key(payload)
+    if cache_key is None:
         raise credentials_exception
-        
-    user_in_db = await auth_crud.get_user_by_username(db, username=username)
+
+    # Cache court (LRU + Redis) : évite un SELECT sur users à chaque requête.
+    # En cas de hit, l'objet retourné est détaché de la session (lecture seule).
+    cached_user = await user_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+
+    # Tokens récents : l'id est dans le token (recherche par clé primaire).
+    if payload.get("uid") is not None:
+        user_in_db = await auth_crud.get_user_by_id(db, user_id=payload["uid"])
+    else:
+        user_in_db = await auth_crud.get_user_by_username(db, username=payload["sub"])
     if user_in_db is None:
         raise credentials_exception
-        
+
+    await user_cache.put(cache_key, user_in_db)
     return user_in_db
 
 
 async def get_current_admin(
-    # On réutilise la dépendance get_current_user pour obtenir l'utilisateur de la base de données
-    current_user: auth_models.UserTable = Depends(get_current_user)
+    # On réutilise la dépendance get_current_user pour authentifier le token
+    current_user: auth_models.UserTable = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ) -> auth_models.UserTable:
     """
     Dépendance qui vérifie que l'utilisateur courant est bien un administrateur.
     Retourne l'objet utilisateur complet de la base de données s'il est admin,
     sinon lève une erreur 403.
     """
-    # On vérifie la propriété is_admin sur l'objet de la base de données
-    if not current_user.is_admin:
+    # Les routes admin sont rares : on relit toujours is_admin en base (par id)
+    # plutôt que de faire confiance au cache, pour qu'un retrait de droits
+    # s'applique immédiatement.
+    current_user = await auth_crud.get_user_by_id(db, user_id=current_user.id)
+    if current_user is None or not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Accès refusé. Les droits d'administrateur sont requis."
@@ -0,0 +1,126 @@
+"""
+Cache court de l'identité des utilisateurs authentifiés.
+
+Chaque route protégée passe par `security.get_current_user` : sans cache, c'est
+un SELECT sur `users` à chaque requête (y compris le polling des
+notifications toutes les 15 s). On garde ici un instantané de l'utilisateur :
+
+- niveau 1 : LRU en mémoire du worker, TTL court (USER_CACHE_TTL_SECONDS) ;
+- niveau 2 (optionnel) : Redis, partagé entre workers (USER_CACHE_REDIS_TTL_SECONDS).
+
+La clé est le sujet du token : `id:<uid>` (tokens récents) ou `name:<sub>`
+(anciens tokens sans uid). L'instantané ne contient aucun secret (mot de
+passe, code de réinitialisation). `invalidate(user_id, username)` est appelé
+après un changement de push-token ou de mot de passe ; il purge Redis et
+prévient les autres workers par pub/sub.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+import redis_client
+from redis_client import get_redis_client
+from . import models
+
+logger = logging.getLogger("dznutri.user_cache")
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_REDIS_TTL_SECONDS = int(os.getenv("USER_CACHE_REDIS_TTL_SECONDS", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+_REDIS_PREFIX = "dznutri:user:"
+INVALIDATION_CHANNEL = "dznutri:user:invalidate"
+
+# Colonnes recopiées dans l'instantané (jamais hashed_password / reset_code).
+SNAPSHOT_FIELDS = ("id", "username", "email", "google_id", "is_admin", "userPushToken")
+
+_local: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+_stats = {"hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def subject_key(payload: Dict[str, Any]) -> Optional[str]:
+    """Clé de cache à partir du payload JWT (None si le token n'a pas de sujet)."""
+    if payload.get("uid") is not None:
+        return f"id:{payload['uid']}"
+    if payload.get("sub"):
+        return f"name:{payload['sub']}"
+    return None
+
+
+def _from_snapshot(data: Dict[str, Any]) -> models.UserTable:
+    # Objet détaché (hors session) : lecture seule, ne pas l'ajouter à la session.
+    return models.UserTable(**data)
+
+
+async def get(key: str) -> Optional[models.UserTable]:
+    snapshot = _local.get(key)
+    if snapshot is not None:
+        _stats["hits"] += 1
+        return _from_snapshot(snapshot)
+
+    redis = get_redis_client()
+    if redis is not None:
+        try:
+            raw = await redis.get(_REDIS_PREFIX + key)
+        except Exception as exc:  # noqa: BLE001 - Redis en panne : on lira la base
+            logger.warning("Cache utilisateurs Redis indisponible : %s", exc)
+            raw = None
+        if raw:
+            snapshot = json.loads(raw)
+            _local[key] = snapshot
+            _stats["redis_hits"] += 1
+            return _from_snapshot(snapshot)
+
+    _stats["misses"] += 1
+    return None
+
+
+async def put(key: str, user: Any) -> None:
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    _local[key] = snapshot
+    redis = get_redis_client()
+    if redis is None:
+        return
+    try:
+        await redis.set(_REDIS_PREFIX + key, json.dumps(snapshot), ex=USER_CACHE_REDIS_TTL_SECONDS)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Écriture du cache utilisateurs Redis impossible : %s", exc)
+
+
+async def invalidate(user_id: int, username: Optional[str]) -> None:
+    """À appeler après toute modification d'un utilisateur (push-token, mot de passe, is_admin)."""
+    keys = [f"id:{user_id}", f"name:{username}"]
+    for key in keys:
+        _local.pop(key, None)
+    redis = get_redis_client()
+    if redis is None:
+        return
+    try:
+        await redis.delete(*(_REDIS_PREFIX + key for key in keys))
+        await redis.publish(INVALIDATION_CHANNEL, ",".join(keys))
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Invalidation du cache utilisateurs impossible : %s", exc)
+
+
+def _on_remote_invalidation(data: str) -> None:
+    for key in str(data).split(","):
+        _local.pop(key, None)
+
+
+async def listen_for_invalidations(redis: Any) -> None:
+    """Tâche de fond : purge le LRU local quand un autre worker invalide un utilisateur."""
+    # Messages possiblement perdus pendant une coupure : on repart d'un cache vide.
+    await redis_client.listen(redis, INVALIDATION_CHANNEL, _on_remote_invalidation, _local.clear)
+
+
+def clear() -> None:
+    _local.clear()
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    lookups = sum(_stats.values())
+    return {**_stats, "hit_ratio": (lookups - _stats["misses"]) / lookups if lookups else 0.0, "size": len(_local)}
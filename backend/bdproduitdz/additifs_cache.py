@@ -0,0 +1,193 @@
+"""
+Cache de la table des pénalités d'additifs, partagé entre workers.
+
+La table change très rarement (un admin ajuste un `danger_level` de temps en
+temps) mais elle est lue à CHAQUE calcul de score. Deux modes :
+
+- Redis disponible : un instantané {"version", "data"} est stocké dans Redis
+  avec un numéro de version croissant (INCR). Chaque worker garde une copie
+  locale et ne la recharge que si la version change. Une invalidation
+  incrémente la version et la publie sur un canal pub/sub : tous les workers
+  convergent immédiatement, sans attendre un TTL.
+- Sans Redis (dev local) : cache en mémoire par processus avec un TTL de
+  5 minutes, comme auparavant.
+
+La version sert aussi de clé au cache de scores (scoring.score_product) et
+au matcher d'additifs. Les versions du mode mémoire sont négatives : elles ne
+peuvent pas coïncider avec le compteur Redis (>= 1), sinon un worker revenu
+de fallback pourrait garder une table locale sous le numéro d'une autre.
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Dict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import redis_client
+from redis_client import get_redis_client
+from . import models
+
+logger = logging.getLogger("dznutri.additifs_cache")
+
+ADDITIFS_TTL_SECONDS = 300.0  # mode mémoire : 5 minutes
+# Filet de sécurité en mode Redis si un message pub/sub est perdu.
+VERSION_CHECK_SECONDS = float(os.getenv("ADDITIFS_VERSION_CHECK_SECONDS", "30"))
+
+VERSION_KEY = "dznutri:additifs:version"
+SNAPSHOT_KEY = "dznutri:additifs:snapshot"
+INVALIDATION_CHANNEL = "dznutri:additifs:invalidate"
+
+# data : table en cache ; version : version du contenu de `data` ;
+# ts : date du chargement (mode mémoire) ; checked : dernière vérification
+# de la version Redis.
+_state: Dict[str, Any] = {"data": None, "ts": 0.0, "version": 0, "checked": 0.0}
+
+
+def normalize_db_key(key: str) -> str:
+    """Nettoie les clés de la base de données pour la comparaison."""
+    if not key:
+        return ""
+    # "E330" -> "e330"
+    # "SIN 330" -> "sin330"
+    return str(key).strip().lower().replace(" ", "")
+
+
+async def load_additifs_penalty_from_db(db: AsyncSession) -> Dict[str, float]:
+    """
+    Crée un dictionnaire de pénalités pour TOUS les identifiants d'additifs
+    (E, SIN, INS), normalisés pour la recherche.
+    ex: {"e330": 2.0, "sin330": 2.0, "ins330": 2.0, ...}
+    """
+    # 1. On sélectionne tous les identifiants et le niveau de danger
+    query = select(
+        models.Additif.e_number,
+        models.Additif.sin_number,
+        models.Additif.ins_number,
+        models.Additif.danger_level
+    )
+    result = await db.execute(query)
+
+    penalty_map = {}
+
+    # 2. On construit le dictionnaire de pénalités
+    for row in result.all():
+        e_number, sin_number, ins_number, danger_level = row
+        penalty = float(danger_level or 0.0)
+
+        # On ajoute chaque clé valide (E, SIN, INS) au dictionnaire
+        for key in (normalize_db_key(e_number), normalize_db_key(sin_number), normalize_db_key(ins_number)):
+            if key:
+                penalty_map[key] = penalty
+
+    return penalty_map
+
+
+def _store_local(penalty_map: Dict[str, float], version: int) -> Dict[str, float]:
+    now = time.monotonic()
+    _state.update(data=penalty_map, version=version, ts=now, checked=now)
+    return penalty_map
+
+
+async def _get_local(db: AsyncSession, force_refresh: bool) -> Dict[str, float]:
+    cached = _state["data"]
+    if (
+        not force_refresh
+        and cached is not None
+        and (time.monotonic() - _state["ts"]) < ADDITIFS_TTL_SECONDS
+    ):
+        return cached
+
+    penalty_map = await load_additifs_penalty_from_db(db)
+    version = _state["version"] if penalty_map == cached else min(_state["version"], 0) - 1
+    _store_local(penalty_map, version)
+    # Redis revenu : relire sa version dès le prochain accès.
+    _state["checked"] = 0.0
+    return penalty_map
+
+
+async def _get_shared(db: AsyncSession, redis: Any, force_refresh: bool) -> Dict[str, float]:
+    cached = _state["data"]
+    if (
+        not force_refresh
+        and cached is not None
+        and (time.monotonic() - _state["checked"]) < VERSION_CHECK_SECONDS
+    ):
+        return cached
+
+    remote_version = int(await redis.get(VERSION_KEY) or 0)
+    if not force_refresh and cached is not None and remote_version == _state["version"]:
+        _state["checked"] = time.monotonic()
+        return cached
+
+    # Version différente : on prend l'instantané partagé s'il correspond.
+    raw = await redis.get(SNAPSHOT_KEY)
+    snapshot = json.loads(raw) if raw else None
+    if not force_refresh and snapshot and snapshot.get("version") == remote_version:
+        return _store_local(snapshot["data"], remote_version)
+
+    # Pas d'instantané à jour (premier démarrage, invalidation, rechargement forcé) :
+    # on relit la base et on publie le résultat pour les autres workers.
+    penalty_map = await load_additifs_penalty_from_db(db)
+    if remote_version == 0 or (snapshot and snapshot.get("data") != penalty_map):
+        # Contenu modifié sans invalidation explicite (ex. édition SQL manuelle).
+        remote_version = int(await redis.incr(VERSION_KEY))
+        await redis.publish(INVALIDATION_CHANNEL, remote_version)
+    await redis.set(SNAPSHOT_KEY, json.dumps({"version": remote_version, "data": penalty_map}))
+    return _store_local(penalty_map, remote_version)
+
+
+async def get_additifs_penalty(db: AsyncSession, force_refresh: bool = False) -> Dict[str, float]:
+    """Table des pénalités d'additifs, via le cache partagé (Redis) ou local."""
+    redis = get_redis_client()
+    if redis is not None:
+        try:
+            return await _get_shared(db, redis, force_refresh)
+        except Exception as exc:  # noqa: BLE001 - Redis en panne : on retombe sur le cache local
+            logger.warning("Cache additifs Redis indisponible, fallback mémoire : %s", exc)
+    return await _get_local(db, force_refresh)
+
+
+def get_additifs_version() -> int:
+    """Version du contenu de la table des additifs actuellement en cache."""
+    return int(_state["version"])
+
+
+async def invalidate_additifs_cache() -> None:
+    """
+    À appeler après une modification de la table des additifs (côté admin).
+    Incrémente la version partagée et prévient tous les workers via pub/sub.
+    """
+    _state["data"] = None
+    _state["ts"] = 0.0
+    redis = get_redis_client()
+    if redis is None:
+        return
+    try:
+        version = await redis.incr(VERSION_KEY)
+        await redis.delete(SNAPSHOT_KEY)
+        await redis.publish(INVALIDATION_CHANNEL, version)
+        logger.info("Table des additifs invalidée (version %s).", version)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Publication de l'invalidation des additifs impossible : %s", exc)
+
+
+def _on_remote_invalidation(data: str) -> None:
+    try:
+        version = int(data)
+    except (TypeError, ValueError):
+        return
+    if version != _state["version"]:
+        # Force la vérification de la version au prochain accès.
+        _state["checked"] = 0.0
+
+
+def _on_disconnect() -> None:
+    _state["checked"] = 0.0
+
+
+async def listen_for_invalidations(redis: Any) -> None:
+    """Tâche de fond : écoute le canal d'invalidation (relancée si Redis coupe)."""
+    await redis_client.listen(redis, INVALIDATION_CHANNEL, _on_remote_invalidation, _on_disconnect)
@@ -1,78 +1,160 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from . import models
+from . import additifs_cache
+from .text_search import normalize_search_text
+import os
 import re
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+# Le matcher est reconstruit quand la version de la table des additifs change
+# (voir additifs_cache) ou au plus tard après ce délai (renommage d'un additif
+# sans invalidation explicite).
+MATCHER_MAX_AGE_SECONDS = float(os.getenv("ADDITIVES_MATCHER_MAX_AGE_SECONDS", "600"))
+
+# Noms trop courts : trop de faux positifs dans un texte OCR.
+MIN_NAME_LENGTH = 3
+
+# On cherche (E ou SIN ou INS) suivi éventuellement d'espace ou tiret, suivi de 3 ou 4 chiffres,
+# suivi optionnellement d'une lettre. Ex: "SIN 503", "E-330", "INS407a"
+CODE_PATTERN = r'\b(?:e|sin|ins)\.?\s*-?\s*(?P<code>\d{3,4}[a-z]?)\b'
+
+
+class KnownAdditif(NamedTuple):
+    """Ce dont les appelants ont besoin d'un additif (détaché de la session)."""
+    id: int
+    e_number: Optional[str]
+    name: Optional[str]
+    danger_level: Optional[int]
+
+
+def _code_number(code: Optional[str]) -> str:
+    """"E 330" / "SIN330" / "ins-330a" -> "330A"."""
+    if not code:
+        return ""
+    return re.sub(r'^(?:E|SIN|INS)\.?', '', re.sub(r'[\s-]', '', code.upper()))
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Alternative regex factorisée par préfixes communs (« trie regex »).
+
+    ["acide citrique", "acide ascorbique"] -> "acide\\s+(?:citrique|ascorbique)" :
+    le moteur de regex avance caractère par caractère dans l'arbre au lieu
+    d'essayer chaque nom l'un après l'autre.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: dict) -> str:
+        end = node.get("") is True
+        branches = [
+            (r'\s+' if ch == " " else re.escape(ch)) + emit(child)
+            for ch, child in sorted(node.items()) if ch != ""
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            # Le mot peut s'arrêter ici : on tente d'abord la forme la plus longue.
+            body = "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+class AdditiveMatcher:
+    """Recherche en UNE passe de tous les additifs connus (codes E/SIN/INS et noms).
+
+    Construit une fois par version de la table des additifs, puis réutilisé
+    pour chaque soumission.
+    """
+
+    def __init__(self, rows: Iterable[Any], version: int = 0):
+        """`rows` : objets exposant id, e_number, name, danger_level et,
+        optionnellement, sin_number / ins_number (modèles ou lignes SQL)."""
+        self.version = version
+        self.built_at = time.monotonic()
+        self.by_code: Dict[str, KnownAdditif] = {}
+        self.by_name: Dict[str, KnownAdditif] = {}
+        fallback_codes: Dict[str, KnownAdditif] = {}
+
+        for row in rows:
+            add = KnownAdditif(row.id, row.e_number, row.name, row.danger_level)
+            number = _code_number(add.e_number)
+            if number:
+                self.by_code[number] = add
+            # Les numéros SIN/INS explicites ne remplacent jamais un E-number.
+            for other in (getattr(row, "sin_number", None), getattr(row, "ins_number", None)):
+                other_number = _code_number(other)
+                if other_number:
+                    fallback_codes.setdefault(other_number, add)
+            name = re.sub(r'\s+', ' ', normalize_search_text(add.name or "").strip())
+            if len(name) >= MIN_NAME_LENGTH:
+                self.by_name.setdefault(name, add)
+        for number, add in fallback_codes.items():
+            self.by_code.setdefault(number, add)
+
+        alternatives = [CODE_PATTERN]
+        if self.by_name:
+            alternatives.append(r'\b(?P<name>' + _trie_regex(self.by_name) + r')\b')
+        self.pattern = re.compile("|".join(alternatives))
+
+    def find(self, text: str) -> List[KnownAdditif]:
+        """Additifs présents dans `text`, dans leur ordre d'apparition, sans doublon."""
+        if not text:
+            return []
+        found: Dict[int, KnownAdditif] = {}
+        for match in self.pattern.finditer(normalize_search_text(text)):
+            code = match.group("code")
+            if code is not None:
+                additif = self.by_code.get(code.upper())
+            else:
+                additif = self.by_name.get(re.sub(r'\s+', ' ', match.group("name")))
+            if additif is not None and additif.id not in found:
+                found[additif.id] = additif
+        return list(found.values())
+
+
+_matcher: Optional[AdditiveMatcher] = None
+
+
+async def get_matcher(db: AsyncSession) -> AdditiveMatcher:
+    """Matcher à jour pour la version courante de la table des additifs."""
+    global _matcher
+    # Met à jour la version partagée (Redis) si nécessaire ; lecture en cache sinon.
+    await additifs_cache.get_additifs_penalty(db)
+    version = additifs_cache.get_additifs_version()
+    if (
+        _matcher is not None
+        and _matcher.version == version
+        and time.monotonic() - _matcher.built_at < MATCHER_MAX_AGE_SECONDS
+    ):
+        return _matcher
+
+    result = await db.execute(select(
+        models.Additif.id,
+        models.Additif.e_number,
+        models.Additif.name,
+        models.Additif.danger_level,
+        models.Additif.sin_number,
+        models.Additif.ins_number,
+    ))
+    _matcher = AdditiveMatcher(result.all(), version=version)
+    return _matcher
+
 
 async def find_additives_in_text(db: AsyncSession, ocr_text: str):
     """
     Cherche des additifs dans un texte en se basant sur la table des additifs.
-    Amélioré pour détecter SIN/INS et les e-numbers avec espaces.
+    Détecte les codes E/SIN/INS (avec espaces, tirets, points) et les noms
+    complets, sans tenir compte des accents ni de la casse.
     """
     if not ocr_text:
         return []
-
-    # 1. Récupérer tous les additifs connus de la base de données
-    result = await db.execute(select(models.Additif))
-    known_additives = result.scalars().all()
-    
-    found_additives = []
-    
-    # Prétraitement de la map des codes connus pour un lookup rapide
-    # On mappe E322 -> Additif(E322), SIN322 -> Additif(E322), etc.
-    code_map = {}
-    name_check_list = []
-
-    for add in known_additives:
-        # Standard E-number (ex: E322)
-        code = add.e_number.upper()
-        code_map[code] = add
-        
-        # Variations standard (SIN322, INS322)
-        number_part = code[1:] if code.startswith("E") else code
-        code_map[f"SIN{number_part}"] = add
-        code_map[f"INS{number_part}"] = add
-        
-        # Pour les noms, on garde la liste pour regex plus tard
-        if add.name:
-            name_check_list.append(add)
-
-    # 2. STRATÉGIE 1 : RECHERCHE PAR PATTERN INTELLIGENT (Codes)
-    # On cherche (E ou SIN ou INS) suivi éventuellement d'espace ou tiret, suivi de 3 ou 4 chiffres, suivi optionnellement d'une lettre
-    # Ex: "SIN 503", "E-330", "INS407a"
-    pattern = r'\b(?:E|SIN|INS|SIN\.|INS\.)\s*[-]?\s*(\d{3,4}[a-z]?)\b'
-    
-    matches = re.finditer(pattern, ocr_text, re.IGNORECASE)
-    
-    found_ids = set()
-    
-    for match in matches:
-        number_part = match.group(1).upper() # ex: "503"
-        # On reconstitue un code standard "E"+number (ex: E503) pour chercher dans la DB
-        # Ou on cherche via nos clés simulées
-        potential_keys = [f"E{number_part}", f"SIN{number_part}", f"INS{number_part}"]
-        
-        for key in potential_keys:
-            if key in code_map:
-                additif = code_map[key]
-                if additif.id not in found_ids:
-                    found_additives.append(additif)
-                    found_ids.add(additif.id)
-                break # On a trouvé l'additif pour ce match
-
-    # 3. STRATÉGIE 2 : RECHERCHE PAR NOM (Fallback et Complément)
-    # Utile si le code est manquant mais le nom est écrit "Gomme Xanthane"
-    # On ne le fait que si on n'a pas déjà trouvé l'additif par code (optimisation optionnelle, mais ici on veut tout trouver)
-    
-    # Pour optimisation, on pourrait ne chercher que ceux pas encore trouvés
-    # Mais un texte peut contenir le nom ET le code, c'est pas grave.
-    
-    for additif in name_check_list:
-        if additif.id in found_ids:
-            continue
-            
-        # Regex simple pour le nom complet
-        if re.search(r'\b' + re.escape(additif.name) + r'\b', ocr_text, re.IGNORECASE):
-            found_additives.append(additif)
-            found_ids.add(additif.id)
-            
-    return found_additives
\ No newline at end of file
+    matcher = await get_matcher(db)
+    return matcher.find(ocr_text)
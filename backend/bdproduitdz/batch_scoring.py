@@ -0,0 +1,297 @@
+"""
+Moteur de scoring par lots, utilisé pour recalculer tout le catalogue
+(script/update_scores.py) après un changement de seuils ou de la table des additifs.
+
+Par rapport à scoring.calculate_score appelé produit par produit :
+- les produits sont lus par tranches (pagination par clé sur l'id) avec
+  uniquement les colonnes utiles au scoring ;
+- les points Nutri-Score et le malus additifs sont calculés pour toute la
+  tranche avec NumPy (np.searchsorted sur les tables de seuils de scoring.py) ;
+- les additifs inconnus sont agrégés et enregistrés une seule fois par tranche ;
+- les scores sont réécrits avec un seul UPDATE ... FROM (VALUES ...) par tranche ;
+- user_history_stats est reconstruite à la fin (history_stats.rebuild).
+
+Les résultats sont strictement identiques à scoring.calculate_score
+(voir tests/unit/test_batch_scoring.py).
+"""
+import logging
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import JSON, Integer, column, func, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, history_stats, models, scoring
+
+logger = logging.getLogger("dznutri.batch_scoring")
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Colonnes lues pour le rescoring (on évite ingredients_text, image_url, etc.).
+RESCORE_COLUMNS = (
+    models.Product.id,
+    models.Product.nutriments,
+    models.Product.nova_group,
+    models.Product.additives_tags,
+    models.Product.ecoscore_grade,
+    models.Product.nutri_score,
+    models.Product.category,
+)
+
+# Seuils convertis une fois pour toutes en tableaux NumPy.
+_T = {
+    name: np.asarray(getattr(scoring, name), dtype=np.float64)
+    for name in (
+        "ENERGY_KJ_THRESHOLDS_SOLIDS", "SATFAT_G_THRESHOLDS_SOLIDS",
+        "SUGARS_G_THRESHOLDS_SOLIDS", "SALT_MG_THRESHOLDS_SOLIDS",
+        "FIBER_G_THRESHOLDS_SOLIDS", "PROTEIN_G_THRESHOLDS_SOLIDS",
+        "FRUITS_PCT_THRESHOLDS_SOLIDS", "ENERGY_KJ_THRESHOLDS_BEVERAGES",
+        "SUGARS_G_THRESHOLDS_BEVERAGES", "RATIO_FAT_THRESHOLDS",
+    )
+}
+
+_MALUS_REASONS = [
+    "Additif(s) à risque élevé",
+    "NOVA 4 + Additifs modérés",
+    "Produit ultra-transformé (NOVA 4)",
+    "Multiples additifs à risque modéré",
+    "Un additif à risque modéré",
+    "Additifs à faible risque",
+    "",
+]
+
+
+def product_row_to_scoring_data(row: Any) -> Dict[str, Any]:
+    """Construit le dictionnaire attendu par le scoring à partir d'une ligne `produits`."""
+    return {
+        "nutriments": row.nutriments,
+        "nova_group": row.nova_group,
+        "additives_tags": row.additives_tags,
+        "ecoscore_grade": row.ecoscore_grade,
+        "nutriscore_grade": row.nutri_score,
+        # La catégorie stockée (ex. "boissons" choisi par l'admin) est celle
+        # utilisée lors du scoring initial : sans elle, les boissons seraient
+        # rescorées comme des solides.
+        "category": row.category,
+    }
+
+
+def _points(values_: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Équivalent vectorisé de scoring.get_points_from_thresholds : pour des seuils
+    triés, le nombre de points est le nombre de seuils strictement inférieurs
+    à la valeur. Une valeur NaN ne dépasse aucun seuil (0 point).
+    """
+    v = np.where(np.isnan(values_), -np.inf, values_)
+    return np.searchsorted(thresholds, v, side="left")
+
+
+def _extract_nutrition_inputs(product_data: Dict[str, Any]) -> Tuple[float, ...]:
+    """Lit les nutriments d'un produit exactement comme _calculate_nutrition_score."""
+    get = scoring.get_nutriment
+    n = product_data.get("nutriments", {}) or {}
+    return (
+        get(n, "energy-kcal_100g") * 4.184 or get(n, "energy-kj_100g"),
+        get(n, "saturated-fat_100g", "saturated-fat"),
+        get(n, "fat_100g", "fat"),
+        get(n, "sugars_100g", "sugars"),
+        (get(n, "salt_100g", "salt") * 1000) or (get(n, "sodium_100g", "sodium") * 2.5 * 1000),
+        get(n, "fiber_100g", "fiber"),
+        get(n, "proteins_100g", "proteins"),
+        scoring.to_float_safe(product_data.get("fruits_percent", 0.0)),
+    )
+
+
+def _nutrition_scores(inputs: np.ndarray, categories: Sequence[str]) -> List[Dict[str, Any]]:
+    """Calcule le score nutritionnel (sur 60) de toute une tranche en une passe NumPy."""
+    energy, sat, fat, sugars, salt_mg, fiber, protein, fruits = inputs.T
+    cats = np.asarray(categories, dtype=object)
+    is_bev = cats == "boissons"
+    is_fat = cats == "matières grasses"
+    is_cheese = cats == "fromages"
+
+    ratio = np.divide(sat, fat, out=np.zeros_like(sat), where=fat > 0) * 100
+
+    n_energy = np.where(is_bev, _points(energy, _T["ENERGY_KJ_THRESHOLDS_BEVERAGES"]),
+                        _points(energy, _T["ENERGY_KJ_THRESHOLDS_SOLIDS"]))
+    n_sug = np.where(is_bev, _points(sugars, _T["SUGARS_G_THRESHOLDS_BEVERAGES"]),
+                     _points(sugars, _T["SUGARS_G_THRESHOLDS_SOLIDS"]))
+    n_sat = np.where(is_bev, 0,
+                     np.where(is_fat, _points(ratio, _T["RATIO_FAT_THRESHOLDS"]),
+                              _points(sat, _T["SATFAT_G_THRESHOLDS_SOLIDS"])))
+    n_salt = _points(salt_mg, _T["SALT_MG_THRESHOLDS_SOLIDS"])
+    N = n_energy + n_sat + n_sug + n_salt
+
+    p_fiber = _points(fiber, _T["FIBER_G_THRESHOLDS_SOLIDS"])
+    p_protein = _points(protein, _T["PROTEIN_G_THRESHOLDS_SOLIDS"])
+    p_fruits = _points(fruits, _T["FRUITS_PCT_THRESHOLDS_SOLIDS"])
+    P = p_fiber + p_protein + p_fruits
+
+    nutri_value = np.where((N >= 11) & ~is_cheese & (p_fruits < 5), N - (p_fiber + p_fruits), N - P)
+
+    norm = (nutri_value - (-15.0)) / (40.0 - (-15.0))
+    score = np.clip((1.0 - norm) * 60.0, 0.0, 60.0)
+
+    results = []
+    for i in range(len(cats)):
+        details: Dict[str, Any] = {}
+        if is_fat[i]:
+            details["fat_ratio"] = round(float(ratio[i]), 1) if fat[i] > 0 else 0
+        details.update({
+            "N_total": int(N[i]), "P_total": int(P[i]), "nutri_value_raw": int(nutri_value[i]),
+            "is_beverage": bool(is_bev[i]), "is_fat": bool(is_fat[i]), "is_cheese": bool(is_cheese[i]),
+        })
+        results.append({"score": float(score[i]), "details": details})
+    return results
+
+
+def _additives_scores(
+    products: Sequence[Dict[str, Any]],
+    penalty_map: Dict[str, float],
+) -> List[Dict[str, Any]]:
+    """Score additifs (sur 30) : correspondance en Python, malus « couperet » vectorisé."""
+    matches = [scoring._match_additives(p, penalty_map) for p in products]
+    high = np.array([m[1]["high"] for m in matches])
+    moderate = np.array([m[1]["moderate"] for m in matches])
+    low = np.array([m[1]["low"] for m in matches])
+    nova4 = np.array([scoring.normalize_nova(p) == 4 for p in products], dtype=bool)
+
+    conditions = [
+        high > 0,
+        nova4 & (moderate > 0),
+        nova4,
+        moderate >= 2,
+        moderate == 1,
+        low > 0,
+    ]
+    malus = np.select(conditions, [30.0, 20.0, 10.0, 15.0, 10.0, 5.0], default=0.0)
+    reason = np.select(conditions, list(range(6)), default=6)
+    score = np.maximum(0.0, 30.0 - malus)
+
+    return [
+        {
+            "score": float(score[i]),
+            "details": {"matched": matched, "counts": counts, "malus_reason": _MALUS_REASONS[reason[i]]},
+            "unknown": unknown,
+        }
+        for i, (matched, counts, unknown) in enumerate(matches)
+    ]
+
+
+def score_products(
+    products: Sequence[Dict[str, Any]],
+    penalty_map: Dict[str, float],
+) -> Tuple[List[Dict[str, Any]], Counter]:
+    """
+    Score une tranche de produits. Retourne la liste des résultats (même format
+    que scoring.calculate_score) et le compteur des additifs inconnus
+    (nombre de produits concernés par code) à enregistrer en une fois.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(products)
+    to_score: List[int] = []
+    categories: List[str] = []
+
+    for i, product_data in enumerate(products):
+        if not product_data:
+            results[i] = {"score": 0, "details": {"reason": "no product data"}, "unknown_additifs": []}
+            continue
+        full_category_text = scoring._category_text(product_data)
+        if scoring._is_water(full_category_text):
+            results[i] = scoring._water_result()
+            continue
+        to_score.append(i)
+        categories.append(scoring._technical_category(full_category_text))
+
+    unknown_counter: Counter = Counter()
+    if not to_score:
+        return results, unknown_counter
+
+    subset = [products[i] for i in to_score]
+    inputs = np.array([_extract_nutrition_inputs(p) for p in subset], dtype=np.float64).reshape(-1, 8)
+    nutrition = _nutrition_scores(inputs, categories)
+    additives = _additives_scores(subset, penalty_map)
+
+    for k, i in enumerate(to_score):
+        product_data = products[i]
+        bio = scoring._calculate_bio_score(product_data)
+        results[i] = scoring._assemble_result(product_data, categories[k], nutrition[k], additives[k], bio)
+        unknown_counter.update(additives[k]["unknown"])
+
+    return results, unknown_counter
+
+
+async def iter_product_chunks(db: AsyncSession, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[List[Any]]:
+    """Parcourt `produits` par tranches, pagination par clé (id > dernier id vu)."""
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(*RESCORE_COLUMNS)
+            .where(models.Product.id > last_id)
+            .order_by(models.Product.id)
+            .limit(chunk_size)
+        )
+        rows = result.all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+async def write_scores(db: AsyncSession, scored: List[Tuple[int, int, Dict[str, Any]]]) -> None:
+    """Réécrit (id, score, détails) d'une tranche en un seul UPDATE ... FROM (VALUES ...)."""
+    if not scored:
+        return
+    v = values(
+        column("id", Integer), column("score", Integer), column("details", JSON),
+        name="v",
+    ).data(scored)
+    stmt = (
+        update(models.Product)
+        .where(models.Product.id == v.c.id)
+        .values(custom_score=v.c.score, detail_custom_score=v.c.details, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
+
+
+async def rescore_all(
+    db: AsyncSession,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    on_chunk: Optional[Callable[[Dict[str, float]], None]] = None,
+) -> Dict[str, float]:
+    """
+    Recalcule le score de tout le catalogue, une transaction par tranche.
+    `on_chunk` reçoit les statistiques cumulées après chaque tranche.
+    """
+    penalty_map = await crud.get_additifs_penalty(db, force_refresh=True)
+    stats = {"products": 0, "chunks": 0, "unknown_additifs": 0, "elapsed_s": 0.0, "rows_per_s": 0.0}
+    started = time.perf_counter()
+
+    async for rows in iter_product_chunks(db, chunk_size):
+        products = [product_row_to_scoring_data(r) for r in rows]
+        results, unknown = score_products(products, penalty_map)
+
+        await write_scores(db, [(r.id, res["score"], res["details"]) for r, res in zip(rows, results)])
+        if unknown:
+            try:
+                # Savepoint : un échec ici ne doit pas annuler la mise à jour des scores.
+                async with db.begin_nested():
+                    await crud.store_or_increment_pending_additifs(db, list(unknown), occurrences=dict(unknown))
+            except Exception as e:
+                logger.error("Erreur sauvegarde additifs inconnus: %s", e)
+        await db.commit()
+
+        stats["products"] += len(rows)
+        stats["chunks"] += 1
+        stats["unknown_additifs"] += len(unknown)
+        stats["elapsed_s"] = time.perf_counter() - started
+        stats["rows_per_s"] = stats["products"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+        if on_chunk is not None:
+            on_chunk(stats)
+
+    # Les scores ont changé : les statistiques d'historique sont recalculées d'un bloc.
+    if stats["products"]:
+        await history_stats.rebuild(db)
+    return stats
@@ -1,25 +1,81 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from . import models , schemas, scoring
 from auth import models as auth_models
-from . import additives_parser
+from auth import user_cache
+from . import additives_parser, history_stats, negative_cache, pagination
+# Cache de la table des additifs (Redis versionné ou mémoire) : ré-exporté ici.
+from .additifs_cache import get_additifs_penalty, get_additifs_version, invalidate_additifs_cache, normalize_db_key  # noqa: F401
 from sqlalchemy.orm import load_only
-from typing import Dict, Tuple, List
-from sqlalchemy import select, update
+from typing import Dict, Tuple, List, Optional
+from sqlalchemy import DateTime, Integer, case, cast, column, delete, literal_column, select, update, values
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects import sqlite as sqlite_dialect
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 from sqlalchemy import func
 
 logger = logging.getLogger("dznutri.crud")
 
 
+# Colonnes chargées par les endpoints de liste en mode "summary" (cf. schemas.ProductSummary) :
+# on évite de lire et transférer les colonnes JSON/texte lourdes (nutriments,
+# detail_custom_score, ingredients_text, additives_tags).
+PRODUCT_SUMMARY_COLUMNS = (
+    models.Product.id,
+    models.Product.barcode,
+    models.Product.product_name,
+    models.Product.brand,
+    models.Product.image_url,
+    models.Product.category,
+    models.Product.subcategory,
+    models.Product.custom_score,
+    models.Product.nutri_score,
+    models.Product.nova_group,
+    models.Product.ecoscore_grade,
+    models.Product.is_verified,
+)
+
+
+def product_load_options(detail: str = "full") -> list:
+    """Options de chargement d'un `select(Product)` selon le niveau de détail."""
+    return [load_only(*PRODUCT_SUMMARY_COLUMNS)] if detail == "summary" else []
+
+
 async def getProduitByBarcode(db: AsyncSession, barcode: str):
     """Récupère un produit officiel par son code-barres de manière asynchrone."""
     
     result = await db.execute(select(models.Product).where(models.Product.barcode == barcode))
     return result.scalars().first()
 
+async def get_products_by_barcodes(db: AsyncSession, barcodes: List[str]) -> Dict[str, models.Product]:
+    """Récupère plusieurs produits en UNE requête. Retourne {barcode: produit}."""
+    if not barcodes:
+        return {}
+    result = await db.execute(select(models.Product).where(models.Product.barcode.in_(barcodes)))
+    return {p.barcode: p for p in result.scalars().all()}
+
+
+def _upsert_insert(db: AsyncSession, table):
+    """INSERT supportant ON CONFLICT pour le dialecte courant (PostgreSQL, SQLite en test)."""
+    if db.bind is not None and db.bind.dialect.name == "sqlite":
+        return sqlite_dialect.insert(table)
+    return insert(table)
+
+
+async def bulk_insert_products(db: AsyncSession, products: List[schemas.ProductCreate]) -> None:
+    """
+    Insère plusieurs produits en une requête. Les codes-barres déjà présents
+    (course avec un scan concurrent) sont ignorés : INSERT ... ON CONFLICT DO NOTHING.
+    """
+    if not products:
+        return
+    # Un même code peut revenir deux fois (codes normalisés par OFF) : on dédoublonne.
+    rows = list({p.barcode: p.model_dump() for p in products}.values())
+    stmt = _upsert_insert(db, models.Product).values(rows).on_conflict_do_nothing(index_elements=["barcode"])
+    await db.execute(stmt)
+    await db.commit()
+
 async def add_product_submissions(db: AsyncSession, submission: schemas.SubmissionCreate, user_id: int):
     """
     Crée une nouvelle soumission de produit.
@@ -87,6 +143,7 @@ async def approve_submission(db: AsyncSession, submission_id: int, admin_data: s
         # On injecte les résultats du scoring
         custom_score=score_result.get('score'),
         detail_custom_score=score_result.get('details'),
+        source=models.PRODUCT_SOURCE_SUBMISSION,
         
         # On peut aussi sauvegarder le type spécifique si on veut le garder
         # (Assurez-vous que votre modèle Product a une colonne pour ça, sinon ignorez)
@@ -100,6 +157,8 @@ async def approve_submission(db: AsyncSession, submission_id: int, admin_data: s
     submission.status = "approved"
     db.add(submission)
     await db.commit()
+    # Le code-barres n'est plus inconnu (il a pu être scanné avant la soumission).
+    await negative_cache.forget([product_to_create.barcode])
 
     # 7. Créer une notification pour l'utilisateur
     try:
@@ -154,46 +213,159 @@ async def create_product(db: AsyncSession, product: schemas.ProductCreate) -> mo
     return db_product
 
 
-async def add_scan_to_history(db: AsyncSession, user_id: int, product_id: int):
+async def add_scan_to_history(db: AsyncSession, user_id: int, product_id: int) -> None:
     """
-    Ajoute un scan à l'historique.
-    Si le produit a déjà été scanné par cet utilisateur,
-    met à jour le timestamp 'scanned_at' pour le faire remonter.
-    Sinon, crée une nouvelle entrée.
+    Ajoute un scan à l'historique, sans SELECT préalable ni ORM : voir
+    upsert_scan_history. Un produit déjà scanné remonte simplement en tête de
+    l'historique ; deux scans simultanés ne peuvent plus créer de doublon.
+    Date du scan : now() de la base, comme le server_default de scan_history.
     """
-    
-    # 1. On vérifie si une entrée existe déjà pour ce user ET ce produit
-    result = await db.execute(
-        select(models.ScanHistory).where(
-            models.ScanHistory.user_id == user_id,
-            models.ScanHistory.product_id == product_id
-        )
+    await upsert_scan_history(
+        db, [{"user_id": user_id, "product_id": product_id, "scanned_at": None}], newer_only=False
     )
-    existing_scan = result.scalars().first()
 
-    if existing_scan:
-        # 2. Si elle existe : on met à jour son timestamp à "maintenant"
-        existing_scan.scanned_at = func.now()
-        db.add(existing_scan)
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+async def add_scans_to_history(
+    db: AsyncSession, user_id: int, scans: List[Tuple[int, Optional[datetime]]]
+) -> int:
+    """
+    Ajoute plusieurs scans (product_id, scanned_at) en un seul INSERT ... ON CONFLICT
+    (synchro des scans faits hors ligne).
+    - scanned_at absent : maintenant ; dans le futur : ramené à maintenant ;
+    - une entrée existante n'avance que si le scan est plus récent (un vieux
+      scan rejoué ne fait pas redescendre le produit) ;
+    - les produits inconnus sont ignorés.
+    Retourne le nombre de produits enregistrés.
+    """
+    now = datetime.utcnow()
+    latest: Dict[int, datetime] = {}
+    for product_id, scanned_at in scans:
+        scanned_at = min(_naive_utc(scanned_at), now) if scanned_at else now
+        if product_id not in latest or scanned_at > latest[product_id]:
+            latest[product_id] = scanned_at
+    if not latest:
+        return 0
+
+    return await upsert_scan_history(db, [
+        {"user_id": user_id, "product_id": product_id, "scanned_at": scanned_at}
+        for product_id, scanned_at in latest.items()
+    ])
+
+async def upsert_scan_history(db: AsyncSession, rows: List[Dict], newer_only: bool = True) -> int:
+    """
+    Écrit des lignes {user_id, product_id, scanned_at} (une par couple, tous
+    utilisateurs confondus) et met à jour user_history_stats dans la même
+    transaction, puis commit. scanned_at None : now() de la base. Avec
+    `newer_only`, scanned_at n'avance que si la valeur est plus récente
+    (scans hors ligne rejoués) ; sinon il est toujours remplacé (scan en
+    direct). Les produits inconnus sont ignorés. Retourne le nombre de lignes écrites.
+
+    PostgreSQL : UN seul INSERT ... SELECT FROM (VALUES ...) JOIN produits
+    ON CONFLICT DO UPDATE RETURNING (xmax = 0) : un re-scan ne coûte qu'une
+    requête, et seules les lignes réellement insérées (+1 aux statistiques)
+    font lire leur score, sans fenêtre de course avec une suppression.
+    """
+    if not rows:
+        return 0
+    # Ordre fixe : deux écritures concurrentes verrouillent les lignes dans le même ordre.
+    rows = sorted(rows, key=lambda row: (row["user_id"], row["product_id"]))
+    if db.bind is not None and db.bind.dialect.name == "sqlite":
+        written, inserted = await _upsert_scan_history_sqlite(db, rows, newer_only)
     else:
-        # 3. Si elle n'existe pas : on crée une nouvelle entrée
-        new_scan = models.ScanHistory(user_id=user_id, product_id=product_id)
-        db.add(new_scan)
-    
-    # 4. On sauvegarde les changements
+        written, inserted = await _upsert_scan_history_pg(db, rows, newer_only)
+
+    # Statistiques (user_history_stats) : +1 par nouvelle ligne, même transaction.
+    if inserted:
+        scores = dict((await db.execute(
+            select(models.Product.id, models.Product.custom_score)
+            .where(models.Product.id.in_({product_id for _, product_id in inserted}))
+        )).all())
+        await history_stats.apply_rows(db, inserted, scores)
     await db.commit()
-    
-    return existing_scan if existing_scan else new_scan
-
-async def get_user_history(db: AsyncSession, user_id: int):
+    return written
+
+def _scanned_at_update(stmt, newer_only: bool):
+    History = models.ScanHistory
+    if not newer_only:
+        return {"scanned_at": stmt.excluded.scanned_at}
+    return {"scanned_at": case(
+        (stmt.excluded.scanned_at > History.scanned_at, stmt.excluded.scanned_at),
+        else_=func.coalesce(History.scanned_at, stmt.excluded.scanned_at),
+    )}
+
+async def _upsert_scan_history_pg(
+    db: AsyncSession, rows: List[Dict], newer_only: bool
+) -> Tuple[int, List[Tuple[int, int]]]:
+    History = models.ScanHistory
+    v = values(
+        column("user_id", Integer), column("product_id", Integer), column("scanned_at", DateTime),
+        name="v",
+    ).data([(row["user_id"], row["product_id"], row["scanned_at"]) for row in rows])
+    stmt = insert(History).from_select(
+        ["user_id", "product_id", "scanned_at"],
+        select(v.c.user_id, v.c.product_id, func.coalesce(cast(v.c.scanned_at, DateTime), func.now()))
+        .join(models.Product, models.Product.id == v.c.product_id)
+        .order_by(v.c.user_id, v.c.product_id),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"], set_=_scanned_at_update(stmt, newer_only)
+    ).returning(History.user_id, History.product_id, literal_column("(xmax = 0)").label("inserted"))
+    written = (await db.execute(stmt)).all()
+    return len(written), [(row.user_id, row.product_id) for row in written if row.inserted]
+
+async def _upsert_scan_history_sqlite(
+    db: AsyncSession, rows: List[Dict], newer_only: bool
+) -> Tuple[int, List[Tuple[int, int]]]:
+    """Tests (SQLite) : pas de xmax, insertions et mises à jour en deux requêtes."""
+    History = models.ScanHistory
+    known = set((await db.execute(
+        select(models.Product.id).where(models.Product.id.in_({row["product_id"] for row in rows}))
+    )).scalars().all())
+    rows = [
+        {**row, "scanned_at": row["scanned_at"] or func.now()}
+        for row in rows if row["product_id"] in known
+    ]
+    if not rows:
+        return 0, []
+    inserted = [tuple(row) for row in (await db.execute(
+        sqlite_dialect.insert(History).values(rows)
+        .on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+        .returning(History.user_id, History.product_id)
+    )).all()]
+    existing = [row for row in rows if (row["user_id"], row["product_id"]) not in set(inserted)]
+    if existing:
+        stmt = sqlite_dialect.insert(History).values(existing)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "product_id"], set_=_scanned_at_update(stmt, newer_only)
+        ))
+    return len(rows), inserted
+
+async def get_user_history(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 50,
+    after: Optional[Tuple[datetime, int]] = None,
+    detail: str = "full",
+):
     # Récupère les scans et les produits associés en renvoyant un objet combiné
     # contenant les informations du produit et la date du scan (scanned_at).
-    result = await db.execute(
+    # `after` = (scanned_at, history_id) du dernier élément de la page précédente.
+    # detail="summary" : sans nutriments / additifs / détail du score.
+    query = (
         select(models.ScanHistory, models.Product)
         .join(models.Product, models.Product.id == models.ScanHistory.product_id)
         .where(models.ScanHistory.user_id == user_id)
-        .order_by(models.ScanHistory.scanned_at.desc())
-        .limit(50)
+        .options(*product_load_options(detail))
+    )
+    if after is not None:
+        query = query.where(pagination.after_desc(
+            models.ScanHistory.scanned_at, models.ScanHistory.id, *after
+        ))
+    result = await db.execute(
+        query.order_by(models.ScanHistory.scanned_at.desc().nullsfirst(), models.ScanHistory.id.desc())
+        .limit(limit)
     )
 
     rows = result.all()
@@ -204,164 +376,53 @@ async def get_user_history(db: AsyncSession, user_id: int):
         except Exception:
             scanned_at = None
 
-        history_list.append({
+        item = {
             'id': product.id,
             'barcode': product.barcode,
             'product_name': product.product_name,
             'brand': product.brand,
             'image_url': product.image_url,
-            'nutriments': product.nutriments,        
-            'additives_tags': product.additives_tags,
             'nova_group': product.nova_group,        
             'ecoscore_grade': product.ecoscore_grade,
-            'detail_custom_score': product.detail_custom_score, 
             'custom_score': product.custom_score,
             'nutri_score': getattr(product, 'nutri_score', None),
             'scanned_at': scanned_at,
-        })
+            'history_id': scan.id,
+        }
+        if detail == "full":
+            item['nutriments'] = product.nutriments
+            item['additives_tags'] = product.additives_tags
+            item['detail_custom_score'] = product.detail_custom_score
+        history_list.append(item)
 
     return history_list
 
 async def delete_scan_from_history(db: AsyncSession, user_id: int, product_id: int):
     """
     Supprime un élément spécifique de l'historique d'un utilisateur.
-    Vérifie que l'élément appartient bien à l'utilisateur avant de le supprimer.
+    Le filtre sur user_id garantit qu'on ne supprime que ses propres scans.
     """
-    
-    # 1. On cherche l'entrée dans l'historique qui correspond à la fois à l'ID de l'historique
-    #    ET à l'ID de l'utilisateur. C'est la partie sécurité.
-    result = await db.execute(
-        select(models.ScanHistory).where(
-            models.ScanHistory.product_id == product_id,
-            models.ScanHistory.user_id == user_id
-            ).order_by(models.ScanHistory.scanned_at.desc())
-    )
-    
-    history_item = result.scalars().first()
-    
-    # 2. Si on ne trouve rien (soit l'historique n'existe pas, soit il n'appartient pas au bon utilisateur),
-    #    on lève une erreur.
-    if not history_item:
+    deleted = (await db.execute(
+        delete(models.ScanHistory)
+        .where(models.ScanHistory.product_id == product_id, models.ScanHistory.user_id == user_id)
+        .returning(models.ScanHistory.user_id, models.ScanHistory.product_id)
+    )).all()
+    if not deleted:
         raise ValueError("Élément d'historique non trouvé ou non autorisé")
-        
-    # 3. Si l'élément est trouvé, on le supprime
-    await db.delete(history_item)
+
+    score = (await db.execute(
+        select(models.Product.custom_score).where(models.Product.id == product_id)
+    )).scalar_one_or_none()
+    await history_stats.apply_rows(db, [tuple(row) for row in deleted], {product_id: score}, sign=-1)
     await db.commit()
-    
-    return True 
+    return True
 
 async def get_user_history_stats(db: AsyncSession, user_id: int):
     """
-    Récupère tous les scores de l'historique d'un utilisateur et calcule des statistiques.
+    Statistiques de l'historique d'un utilisateur : une lecture par clé primaire
+    de user_history_stats (compteurs tenus à jour, voir history_stats.py).
     """
-    # On fait une requête pour récupérer uniquement la colonne custom_score
-    result = await db.execute(
-        select(models.Product.custom_score)
-        .join(models.ScanHistory, models.Product.id == models.ScanHistory.product_id)
-        .where(models.ScanHistory.user_id == user_id)
-    )
-    scores = result.scalars().all()
-
-    if not scores:
-        return {
-            "total_scans": 0,
-            "average_score": 0,
-            "distribution": {"excellent": 0, "bon": 0, "mediocre": 0, "mauvais": 0}
-        }
-
-    total_scans = len(scores)
-    average_score = round(sum(scores) / total_scans)
-    
-    distribution = {"excellent": 0, "bon": 0, "mediocre": 0, "mauvais": 0}
-    for score in scores:
-        if score >= 75:
-            distribution["excellent"] += 1
-        elif score >= 50:
-            distribution["bon"] += 1
-        elif score >= 25:
-            distribution["mediocre"] += 1
-        else:
-            distribution["mauvais"] += 1
-            
-    return {
-        "total_scans": total_scans,
-        "average_score": average_score,
-        "distribution": distribution
-    }
-
-
-def normalize_db_key(key: str) -> str:
-    """Nettoie les clés de la base de données pour la comparaison."""
-    if not key:
-        return ""
-    # "E330" -> "e330"
-    # "SIN 330" -> "sin330"
-    return str(key).strip().lower().replace(" ", "")
-
-# Cache en mémoire de la table des additifs : elle change très rarement (un admin
-# ajoute un additif de temps en temps), mais get_additifs_penalty est appelé à
-# CHAQUE calcul de score. On évite ainsi une requête « SELECT * additifs » par scan.
-_additifs_cache: Dict[str, object] = {"data": None, "ts": 0.0}
-_ADDITIFS_TTL_SECONDS = 300.0  # 5 minutes
-
-
-def invalidate_additifs_cache() -> None:
-    """À appeler après une modification de la table des additifs (côté admin)."""
-    _additifs_cache["data"] = None
-    _additifs_cache["ts"] = 0.0
-
-
-async def get_additifs_penalty(db: AsyncSession, force_refresh: bool = False) -> Dict[str, float]:
-    """
-    Crée un dictionnaire de pénalités pour TOUS les identifiants d'additifs
-    (E, SIN, INS), normalisés pour la recherche.
-    ex: {"e330": 2.0, "sin330": 2.0, "ins330": 2.0, ...}
-
-    Le résultat est mis en cache en mémoire pendant _ADDITIFS_TTL_SECONDS.
-    """
-    import time
-    now = time.monotonic()
-    cached = _additifs_cache["data"]
-    if (
-        not force_refresh
-        and cached is not None
-        and (now - float(_additifs_cache["ts"])) < _ADDITIFS_TTL_SECONDS
-    ):
-        return cached  # type: ignore[return-value]
-
-    # 1. On sélectionne tous les identifiants et le niveau de danger
-    query = select(
-        models.Additif.e_number, 
-        models.Additif.sin_number, 
-        models.Additif.ins_number, 
-        models.Additif.danger_level
-    )
-    result = await db.execute(query)
-    
-    penalty_map = {}
-    
-    # 2. On construit le dictionnaire de pénalités
-    for row in result.all():
-        e_number, sin_number, ins_number, danger_level = row
-        penalty = float(danger_level or 0.0)
-
-        # On crée une liste de toutes les clés valides pour cet additif
-        keys_to_add = [
-            normalize_db_key(e_number),
-            normalize_db_key(sin_number),
-            normalize_db_key(ins_number)
-        ]
-
-        # On ajoute chaque clé valide au dictionnaire
-        for key in keys_to_add:
-            if key:
-                penalty_map[key] = penalty
-
-    # Mise en cache du résultat
-    _additifs_cache["data"] = penalty_map
-    _additifs_cache["ts"] = now
-    return penalty_map
-
+    return history_stats.to_response(await db.get(models.UserHistoryStats, user_id))
 
 
 def normalize_code(code: str) -> str:
@@ -388,26 +449,41 @@ async def save_user_push_token(db: AsyncSession, user_id: int, token: str):
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    await user_cache.invalidate(user.id, user.username)
     return user
 
-async def store_or_increment_pending_additifs(db: AsyncSession, additives: List[str]):
+async def store_or_increment_pending_additifs(
+    db: AsyncSession,
+    additives: List[str],
+    occurrences: Optional[Dict[str, int]] = None,
+):
     """
     Insère de nouveaux additifs ou incrémente le compteur de ceux qui existent déjà,
     en une seule requête "upsert".
+
+    `occurrences` (optionnel) donne le nombre de produits concernés par code :
+    le rescoring par lots agrège ainsi tout un lot en une seule requête.
     """
     if not additives:
         return
 
-    # Normalisation et dédoublonnage
-    normalized_codes = {normalize_code(a) for a in additives if a}
-    normalized_codes.discard("")  # Retire les chaînes vides
-    if not normalized_codes:
+    # Normalisation et dédoublonnage (en cumulant les occurrences par code)
+    counts: Dict[str, int] = {}
+    for a in additives:
+        code = normalize_code(a) if a else ""
+        if not code:
+            continue
+        if occurrences is None:
+            counts[code] = 1
+        else:
+            counts[code] = counts.get(code, 0) + occurrences.get(a, 1)
+    if not counts:
         return
 
     # Préparer les données pour l'insertion
     insert_data = [
-        {'e_code': code, 'count': 1, 'status': 'pending'}
-        for code in normalized_codes
+        {'e_code': code, 'count': n}
+        for code, n in counts.items()
     ]
 
     # Créer la commande INSERT ... ON CONFLICT DO UPDATE
@@ -416,7 +492,7 @@ async def store_or_increment_pending_additifs(db: AsyncSession, additives: List[
     update_on_conflict_stmt = stmt.on_conflict_do_update(
         index_elements=['e_code'],  # colonne unique
         set_={
-            'count': models.AdditifPending.count + 1  # incrémenter le compteur
+            'count': models.AdditifPending.count + stmt.excluded.count  # incrémenter le compteur
         }
     )
 
@@ -525,6 +601,8 @@ async def update_product(db: AsyncSession, barcode: str, product_update: schemas
     if not db_product:
         return None
 
+    old_score = db_product.custom_score
+
     # 2. Mettre à jour les champs du produit
     update_data = product_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
@@ -541,6 +619,10 @@ async def update_product(db: AsyncSession, barcode: str, product_update: schemas
     # 4. Mettre à jour le score dans le produit
     db_product.custom_score = score_result.get('score')
     db_product.detail_custom_score = score_result.get('details')
+    # Fiche corrigée à la main : elle n'est plus rafraîchie depuis OFF.
+    db_product.source = models.PRODUCT_SOURCE_ADMIN
+    # Statistiques d'historique de ceux qui ont scanné ce produit.
+    await history_stats.shift_product_score(db, db_product.id, old_score, db_product.custom_score)
 
     # 5. Sauvegarder
     db.add(db_product)
@@ -549,7 +631,9 @@ async def update_product(db: AsyncSession, barcode: str, product_update: schemas
     
     return db_product
 
-async def get_better_alternatives(db: AsyncSession, barcode: str, limit: int = 5) -> List[models.Product]:
+async def get_better_alternatives(
+    db: AsyncSession, barcode: str, limit: int = 5, detail: str = "full"
+) -> List[models.Product]:
     """
     Trouve de meilleures alternatives pour un produit donné.
     Critères : Même catégorie, score plus élevé.
@@ -583,6 +667,7 @@ async def get_better_alternatives(db: AsyncSession, barcode: str, limit: int = 5
     stmt = (
         select(models.Product)
         .where(*query_filters)
+        .options(*product_load_options(detail))
         .order_by(models.Product.custom_score.desc())
         .limit(limit)
     )
@@ -602,11 +687,26 @@ async def create_notification(db: AsyncSession, notification: schemas.Notificati
     await db.refresh(db_notification)
     return db_notification
 
-async def get_user_notifications(db: AsyncSession, user_id: int, unread_only: bool = False, limit: int = 50):
+async def get_user_notifications(
+    db: AsyncSession,
+    user_id: int,
+    unread_only: bool = False,
+    limit: int = 50,
+    offset: int = 0,
+    after: Optional[Tuple[datetime, int]] = None,
+):
+    # `after` = (created_at, id) de la dernière notification déjà affichée.
     query = select(models.Notification).where(models.Notification.user_id == user_id)
     if unread_only:
         query = query.where(models.Notification.read == False)
-    query = query.order_by(models.Notification.created_at.desc()).limit(limit)
+    if after is not None:
+        query = query.where(pagination.after_desc(
+            models.Notification.created_at, models.Notification.id, *after
+        ))
+    query = (
+        query.order_by(models.Notification.created_at.desc().nullsfirst(), models.Notification.id.desc())
+        .limit(limit).offset(offset)
+    )
     result = await db.execute(query)
     return result.scalars().all()
 
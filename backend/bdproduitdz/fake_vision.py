@@ -0,0 +1,79 @@
+"""
+Faux serveur Google Vision (gRPC local) pour les tests et les benchmarks hors ligne.
+
+Il implémente `ImageAnnotator.BatchAnnotateImages` avec les vrais messages
+protobuf de google-cloud-vision : le client officiel, son transport gRPC et
+la (dé)sérialisation sont donc réellement exercés, seul le serveur est local.
+
+    with FakeVisionServer({"https://x/ing.jpg": "Ingrédients : ..."}) as server:
+        ocr.set_client(server.client())
+        ...
+
+Une URL inconnue renvoie une erreur Vision pour cette image (comme une image
+illisible). `latency` simule le temps de traitement de Google par appel.
+"""
+import threading
+import time
+from concurrent import futures
+from typing import Dict, Optional
+
+import grpc
+from google.cloud import vision
+from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcTransport
+
+SERVICE_NAME = "google.cloud.vision.v1.ImageAnnotator"
+
+
+class FakeVisionServer:
+    def __init__(self, texts: Optional[Dict[str, str]] = None, latency: float = 0.0) -> None:
+        self.texts: Dict[str, str] = dict(texts or {})
+        self.latency = latency
+        self.calls = 0    # nombre de RPC reçues
+        self.images = 0   # nombre d'images annotées
+        self._lock = threading.Lock()
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+        self._server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "BatchAnnotateImages": grpc.unary_unary_rpc_method_handler(
+                self._batch_annotate,
+                request_deserializer=vision.BatchAnnotateImagesRequest.deserialize,
+                response_serializer=vision.BatchAnnotateImagesResponse.serialize,
+            ),
+        }),))
+        self.port = self._server.add_insecure_port("127.0.0.1:0")
+
+    def _batch_annotate(self, request, context):
+        with self._lock:
+            self.calls += 1
+            self.images += len(request.requests)
+        if self.latency:
+            time.sleep(self.latency)
+        responses = []
+        for item in request.requests:
+            url = item.image.source.image_uri
+            if url in self.texts:
+                responses.append(vision.AnnotateImageResponse(
+                    text_annotations=[vision.EntityAnnotation(description=self.texts[url])]
+                ))
+            else:
+                responses.append(vision.AnnotateImageResponse(
+                    error={"code": 3, "message": f"Image introuvable : {url}"}
+                ))
+        return vision.BatchAnnotateImagesResponse(responses=responses)
+
+    def client(self) -> vision.ImageAnnotatorClient:
+        """Un nouveau client officiel (nouveau canal gRPC) pointant sur ce serveur."""
+        channel = grpc.insecure_channel(f"127.0.0.1:{self.port}")
+        return vision.ImageAnnotatorClient(transport=ImageAnnotatorGrpcTransport(channel=channel))
+
+    def start(self) -> "FakeVisionServer":
+        self._server.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.stop(grace=None)
+
+    def __enter__(self) -> "FakeVisionServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
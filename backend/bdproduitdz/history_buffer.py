@@ -0,0 +1,161 @@
+"""
+Écriture différée (write-behind) de l'historique des scans.
+
+Chaque scan appelle POST /api/history/{product_id} : aux heures de pointe,
+des milliers de petites transactions par minute sur `scan_history`. Avec
+HISTORY_WRITE_BEHIND=1, le scan est seulement noté en mémoire et une tâche
+de fond écrit le tampon toutes les HISTORY_FLUSH_INTERVAL_MS, ou dès
+HISTORY_FLUSH_MAX_EVENTS couples (utilisateur, produit), en UN upsert
+multi-lignes (crud.upsert_scan_history). Deux scans du même produit par le
+même utilisateur entre deux écritures n'en font qu'une ligne.
+
+Cohérence : avant de lire ou modifier l'historique d'un utilisateur (liste,
+stats, suppression), les routes appellent `flush_user()` qui écrit d'abord
+ses scans en attente ; la pagination par curseur reste donc exacte. Le
+tampon est propre à chaque worker : un utilisateur servi par un autre worker
+voit ses derniers scans au plus tard après un intervalle.
+
+Arrêt : le lifespan de main.py appelle `stop()`, qui écrit tout le tampon.
+En cas d'échec d'écriture, les scans sont remis dans le tampon et réessayés.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from . import crud
+
+logger = logging.getLogger("dznutri.history_buffer")
+
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "500"))
+HISTORY_FLUSH_MAX_EVENTS = int(os.getenv("HISTORY_FLUSH_MAX_EVENTS", "500"))
+
+SessionFactory = Callable[[], AsyncSession]
+
+
+class HistoryBuffer:
+    def __init__(
+        self,
+        session_factory: SessionFactory = AsyncSessionLocal,
+        interval_ms: int = HISTORY_FLUSH_INTERVAL_MS,
+        max_events: int = HISTORY_FLUSH_MAX_EVENTS,
+    ) -> None:
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        # (user_id, product_id) -> date du scan le plus récent
+        self._pending: Dict[Tuple[int, int], datetime] = {}
+        # Une seule écriture à la fois : flush_user attend la fin d'un flush en cours.
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.stats = {"recorded": 0, "flushes": 0, "rows_written": 0, "errors": 0}
+
+    def record(self, user_id: int, product_id: int, scanned_at: Optional[datetime] = None) -> None:
+        self._pending[(user_id, product_id)] = scanned_at or datetime.utcnow()
+        self.stats["recorded"] += 1
+        if len(self._pending) >= self.max_events:
+            self._full.set()
+
+    async def flush(self, user_id: Optional[int] = None) -> int:
+        """Écrit le tampon (ou seulement les scans de `user_id`). Renvoie le nombre de lignes."""
+        async with self._lock:
+            if user_id is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {key: self._pending.pop(key) for key in [key for key in self._pending if key[0] == user_id]}
+            if not batch:
+                return 0
+            try:
+                async with self.session_factory() as db:
+                    written = await crud.upsert_scan_history(db, [
+                        {"user_id": uid, "product_id": pid, "scanned_at": scanned_at}
+                        for (uid, pid), scanned_at in batch.items()
+                    ])
+            except Exception:
+                # On remet les scans sans écraser un scan plus récent arrivé entre-temps.
+                for key, scanned_at in batch.items():
+                    if key not in self._pending or self._pending[key] < scanned_at:
+                        self._pending[key] = scanned_at
+                self.stats["errors"] += 1
+                raise
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += written
+            return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:  # noqa: BLE001 - base indisponible : réessayé au prochain tour
+                logger.exception("Écriture de l'historique différée : échec, %s scans en attente", len(self._pending))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête la tâche de fond et écrit tout ce qui reste en attente."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:  # noqa: BLE001
+            logger.exception("Arrêt : %s scans d'historique non écrits", len(self._pending))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending)}
+
+
+_buffer: Optional[HistoryBuffer] = None
+
+
+def is_enabled() -> bool:
+    return HISTORY_WRITE_BEHIND
+
+
+def get_buffer() -> HistoryBuffer:
+    global _buffer
+    if _buffer is None:
+        _buffer = HistoryBuffer()
+    return _buffer
+
+
+def record(user_id: int, product_id: int) -> None:
+    get_buffer().record(user_id, product_id)
+
+
+async def flush_user(user_id: int) -> None:
+    """À appeler avant de lire ou modifier l'historique d'un utilisateur."""
+    if _buffer is not None:
+        await _buffer.flush(user_id)
+
+
+def start() -> None:
+    """Démarrage de l'application (si HISTORY_WRITE_BEHIND)."""
+    if is_enabled():
+        get_buffer().start()
+
+
+async def stop() -> None:
+    global _buffer
+    if _buffer is not None:
+        await _buffer.stop()
+        _buffer = None
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    return {"enabled": is_enabled(), **(_buffer.get_stats() if _buffer is not None else {})}
@@ -0,0 +1,173 @@
+"""
+Statistiques d'historique par utilisateur, maintenues au fil de l'eau.
+
+/api/history/stats relisait tout l'historique (custom_score de chaque produit
+scanné) et calculait total, moyenne et répartition en Python à chaque appel.
+Les compteurs sont maintenant stockés dans `user_history_stats` et mis à jour
+par incréments, dans la même transaction que l'écriture qui les change :
+
+- nouvelle ligne d'historique (crud.upsert_scan_history) : +1 ;
+- suppression (crud.delete_scan_from_history) : -1 ;
+- changement de score d'un produit (crud.update_product) : la ligne de
+  chaque utilisateur qui l'a scanné est décalée en un seul UPDATE.
+
+Un rescoring de tout le catalogue (batch_scoring.rescore_all) reconstruit
+la table avec `rebuild()`. La migration la remplit ; script/history_stats.py
+la reconstruit (backfill) et vérifie sa cohérence (`check()`).
+
+Les produits sans score comptent dans total_scans mais pas dans la moyenne
+ni la répartition.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models
+
+# Répartition : (colonne, score minimum), du meilleur au moins bon.
+BUCKETS = (("excellent", 75), ("bon", 50), ("mediocre", 25), ("mauvais", None))
+COUNTERS = ("total_scans", "scored_scans", "score_sum") + tuple(name for name, _ in BUCKETS)
+
+Delta = Dict[str, int]
+
+
+def bucket_of(score: int) -> str:
+    for name, minimum in BUCKETS:
+        if minimum is None or score >= minimum:
+            return name
+    raise AssertionError("unreachable")
+
+
+def delta(scores: Iterable[Optional[int]], sign: int = 1) -> Delta:
+    """Variation des compteurs quand des scans de produits de ces scores sont ajoutés (sign=-1 : retirés)."""
+    d = dict.fromkeys(COUNTERS, 0)
+    for score in scores:
+        d["total_scans"] += sign
+        if score is not None:
+            d["scored_scans"] += sign
+            d["score_sum"] += sign * score
+            d[bucket_of(score)] += sign
+    return d
+
+
+async def apply(db: AsyncSession, deltas: Dict[int, Delta]) -> None:
+    """Ajoute les variations {user_id: delta} en un seul INSERT ... ON CONFLICT (sans commit)."""
+    rows = [{"user_id": user_id, **d} for user_id, d in sorted(deltas.items()) if any(d.values())]
+    if not rows:
+        return
+    Stats = models.UserHistoryStats
+    stmt = crud._upsert_insert(db, Stats).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            **{name: getattr(Stats, name) + getattr(stmt.excluded, name) for name in COUNTERS},
+            "updated_at": func.now(),
+        },
+    )
+    await db.execute(stmt)
+
+
+async def apply_rows(
+    db: AsyncSession, rows: Iterable[Tuple[int, int]], scores: Dict[int, Optional[int]], sign: int = 1
+) -> None:
+    """+1 (sign=-1 : -1) par ligne d'historique (user_id, product_id) ajoutée (retirée), sans commit."""
+    per_user: Dict[int, List[Optional[int]]] = defaultdict(list)
+    for user_id, product_id in rows:
+        per_user[user_id].append(scores.get(product_id))
+    await apply(db, {user_id: delta(user_scores, sign) for user_id, user_scores in per_user.items()})
+
+
+async def shift_product_score(db: AsyncSession, product_id: int, old: Optional[int], new: Optional[int]) -> None:
+    """Le score d'un produit change : décale les compteurs de tous ceux qui l'ont scanné (sans commit)."""
+    if old == new:
+        return
+    d = delta([new])
+    for name, value in delta([old], sign=-1).items():
+        d[name] += value
+    del d["total_scans"]  # même nombre de scans
+    Stats = models.UserHistoryStats
+    await db.execute(
+        update(Stats)
+        .where(Stats.user_id.in_(
+            select(models.ScanHistory.user_id).where(models.ScanHistory.product_id == product_id)
+        ))
+        .values({
+            **{name: getattr(Stats, name) + value for name, value in d.items() if value},
+            "updated_at": func.now(),
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+
+def to_response(stats: Optional[models.UserHistoryStats]) -> Dict[str, Any]:
+    if stats is None or not stats.total_scans:
+        return {
+            "total_scans": 0,
+            "average_score": 0,
+            "distribution": {name: 0 for name, _ in BUCKETS},
+        }
+    return {
+        "total_scans": stats.total_scans,
+        "average_score": round(stats.score_sum / stats.scored_scans) if stats.scored_scans else 0,
+        "distribution": {name: getattr(stats, name) for name, _ in BUCKETS},
+    }
+
+
+def _aggregate_query(user_ids: Optional[List[int]] = None):
+    """Compteurs recalculés depuis scan_history (la vérité), un SELECT ... GROUP BY."""
+    score = models.Product.custom_score
+    bucket = case(
+        *((score >= minimum, name) for name, minimum in BUCKETS if minimum is not None),
+        else_=case((score.isnot(None), BUCKETS[-1][0])),
+    )
+    bucket_columns = [func.coalesce(func.sum(case((bucket == name, 1), else_=0)), 0).label(name) for name, _ in BUCKETS]
+    query = (
+        select(
+            models.ScanHistory.user_id,
+            func.count().label("total_scans"),
+            func.count(score).label("scored_scans"),
+            func.coalesce(func.sum(score), 0).label("score_sum"),
+            *bucket_columns,
+        )
+        .join(models.Product, models.Product.id == models.ScanHistory.product_id)
+        .group_by(models.ScanHistory.user_id)
+    )
+    if user_ids is not None:
+        query = query.where(models.ScanHistory.user_id.in_(user_ids))
+    return query
+
+
+async def rebuild(db: AsyncSession, user_ids: Optional[List[int]] = None) -> int:
+    """Recalcule la table (ou les lignes de `user_ids`) en INSERT ... SELECT. Renvoie le nombre de lignes."""
+    Stats = models.UserHistoryStats
+    cleanup = delete(Stats)
+    if user_ids is not None:
+        cleanup = cleanup.where(Stats.user_id.in_(user_ids))
+    await db.execute(cleanup)
+    aggregate = _aggregate_query(user_ids).subquery()
+    result = await db.execute(
+        Stats.__table__.insert().from_select(
+            ["user_id", *COUNTERS, "updated_at"],
+            select(aggregate.c.user_id, *(aggregate.c[name] for name in COUNTERS), func.now()),
+        )
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def check(db: AsyncSession) -> List[Tuple[int, Dict[str, int], Dict[str, int]]]:
+    """Compare la table aux compteurs recalculés. Renvoie [(user_id, attendu, stocké)] pour les écarts."""
+    expected = {row.user_id: {name: int(row._mapping[name]) for name in COUNTERS}
+                for row in (await db.execute(_aggregate_query())).all()}
+    stored = {row.user_id: {name: getattr(row, name) for name in COUNTERS}
+              for row in (await db.execute(select(models.UserHistoryStats))).scalars().all()}
+    empty = dict.fromkeys(COUNTERS, 0)
+    mismatches = []
+    for user_id in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(user_id, empty), stored.get(user_id, empty)
+        if want != have:
+            mismatches.append((user_id, want, have))
+    return mismatches
+
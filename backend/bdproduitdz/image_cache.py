@@ -0,0 +1,91 @@
+"""
+Cache des photos de soumission adressé par contenu (SHA-256 des octets).
+
+Les mêmes photos reviennent souvent : nouvel essai après une erreur réseau,
+plusieurs utilisateurs qui soumettent le même produit. Pour une image déjà
+vue, on réutilise l'URL Cloudinary et le texte OCR au lieu de repayer
+l'upload et l'appel Vision.
+
+- niveau 1 : LRU en mémoire du worker (IMAGE_CACHE_SIZE entrées) ;
+- niveau 2 : table `image_cache` (sha256 -> url, ocr_text), partagée.
+
+Le parsing (nutriments, additifs) n'est pas mis en cache : il est recalculé
+à partir du texte (quelques dizaines de µs) et suit donc les corrections du
+parser. Un échec d'OCR n'est jamais mis en cache.
+"""
+import hashlib
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from cachetools import LRUCache
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models
+
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "2048"))
+
+# sha256 -> {"url": ..., "ocr_text": ...}
+_local: LRUCache = LRUCache(maxsize=IMAGE_CACHE_SIZE)
+_stats = {"hits": 0, "db_hits": 0, "misses": 0}
+
+
+def hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+async def get_many(db: AsyncSession, hashes: Iterable[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """Entrées connues pour ces empreintes (les inconnues sont absentes du résultat)."""
+    found: Dict[str, Dict[str, Any]] = {}
+    missing = []
+    for sha in {h for h in hashes if h}:
+        entry = _local.get(sha)
+        if entry is not None:
+            found[sha] = entry
+            _stats["hits"] += 1
+        else:
+            missing.append(sha)
+    if missing:
+        result = await db.execute(
+            select(models.ImageCache.sha256, models.ImageCache.url, models.ImageCache.ocr_text)
+            .where(models.ImageCache.sha256.in_(missing))
+        )
+        for sha, url, ocr_text in result.all():
+            found[sha] = _local[sha] = {"url": url, "ocr_text": ocr_text}
+            _stats["db_hits"] += 1
+        _stats["misses"] += len(missing) - sum(1 for sha in missing if sha in found)
+    return found
+
+
+async def remember(db: AsyncSession, sha: Optional[str], url: Optional[str] = None, ocr_text: Optional[str] = None) -> None:
+    """Enregistre l'URL et/ou le texte OCR d'une image (sans commit).
+
+    Les valeurs déjà connues ne sont jamais effacées par un None.
+    """
+    if not sha:
+        return
+    stmt = crud._upsert_insert(db, models.ImageCache).values(sha256=sha, url=url, ocr_text=ocr_text)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sha256"],
+        set_={
+            "url": func.coalesce(stmt.excluded.url, models.ImageCache.url),
+            "ocr_text": func.coalesce(stmt.excluded.ocr_text, models.ImageCache.ocr_text),
+        },
+    )
+    await db.execute(stmt)
+    entry = dict(_local.get(sha) or {"url": None, "ocr_text": None})
+    if url is not None:
+        entry["url"] = url
+    if ocr_text is not None:
+        entry["ocr_text"] = ocr_text
+    _local[sha] = entry
+
+
+def clear() -> None:
+    _local.clear()
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    lookups = sum(_stats.values())
+    return {**_stats, "hit_ratio": (lookups - _stats["misses"]) / lookups if lookups else 0.0, "size": len(_local)}
@@ -0,0 +1,79 @@
+"""
+Stockage des images de soumission et OCR, derrière une interface commune.
+
+- `MEDIA_BACKEND=cloudinary` (défaut) : upload sur Cloudinary ;
+  `MEDIA_BACKEND=local` : fichier écrit dans uploads/submissions, servi par
+  le montage statique /uploads de main.py.
+- `OCR_BACKEND=vision` (défaut) : Google Vision (bdproduitdz/ocr.py) ;
+  `OCR_BACKEND=local` : lit le fichier local et le décode en UTF-8. En dev et
+  dans les tests, une « photo » est donc simplement un fichier texte contenant
+  le texte que l'OCR doit renvoyer.
+
+Les backends locaux permettent de faire tourner tout le pipeline des
+soumissions hors ligne. Fonctions synchrones (appels réseau bloquants) : à
+exécuter dans un thread.
+"""
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import List
+
+import cloudinary.uploader
+
+from . import ocr
+
+logger = logging.getLogger("dznutri.media")
+
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "cloudinary").lower()
+OCR_BACKEND = os.getenv("OCR_BACKEND", "vision").lower()
+
+LOCAL_UPLOAD_DIR = Path("uploads") / "submissions"
+LOCAL_URL_PREFIX = "/uploads/submissions/"
+
+
+class MediaError(Exception):
+    """Échec de l'upload d'une image."""
+
+
+def upload_image(content: bytes, kind: str) -> str:
+    """Stocke l'image et renvoie son URL publique."""
+    if MEDIA_BACKEND == "local":
+        # Nom dérivé du contenu : un nouvel essai réécrit le même fichier.
+        name = f"{kind}_{hashlib.sha256(content).hexdigest()[:24]}.jpg"
+        LOCAL_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        (LOCAL_UPLOAD_DIR / name).write_bytes(content)
+        return LOCAL_URL_PREFIX + name
+    try:
+        result = cloudinary.uploader.upload(content)
+    except Exception as exc:  # noqa: BLE001 - erreurs réseau/API de Cloudinary
+        raise MediaError(f"Upload Cloudinary impossible : {exc}") from exc
+    url = result.get("secure_url") if isinstance(result, dict) else None
+    if not url:
+        raise MediaError("Réponse Cloudinary sans secure_url")
+    return url
+
+
+def _detect_text_local(image_url: str) -> str:
+    if not image_url.startswith(LOCAL_URL_PREFIX):
+        raise ocr.OcrError(f"OCR local : URL non locale {image_url}")
+    path = LOCAL_UPLOAD_DIR / image_url[len(LOCAL_URL_PREFIX):]
+    try:
+        return path.read_bytes().decode("utf-8", errors="ignore").strip()
+    except OSError as exc:
+        raise ocr.OcrError(f"OCR local : {exc}") from exc
+
+
+def detect_text_batch(image_urls: List[str]) -> List[str]:
+    """Texte lu sur chaque image, dans l'ordre (lève ocr.OcrError en cas d'échec).
+
+    Avec Vision, toutes les images partent dans un seul appel.
+    """
+    if OCR_BACKEND == "local":
+        return [_detect_text_local(url) for url in image_urls]
+    return ocr.detect_text_batch(image_urls)
+
+
+def detect_text(image_url: str) -> str:
+    """Texte lu sur une image (lève ocr.OcrError en cas d'échec)."""
+    return detect_text_batch([image_url])[0]
@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Enum as SqlEnum, JSON, Index
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Enum as SqlEnum, JSON, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
 
 
+# Origine d'une fiche (`Product.source`) : seules les fiches Open Food Facts
+# sont rafraîchies depuis OFF (off_refresh.py).
+PRODUCT_SOURCE_OFF = "openfoodfacts"
+PRODUCT_SOURCE_SUBMISSION = "submission"
+PRODUCT_SOURCE_ADMIN = "admin"
+
+
 class Product(Base):
     __tablename__ = "produits"
 
@@ -32,6 +39,9 @@ class Product(Base):
     ecoscore_grade = Column(String) # La lettre de l'Eco-Score
     detail_custom_score = Column(JSON, nullable=True)
 
+    source = Column(String, nullable=True)  # PRODUCT_SOURCE_*
+    fetched_at = Column(DateTime, nullable=True)  # dernière lecture de la fiche sur OFF
+
     # Index composites pour la recherche par catégorie triée par score
     # (utilisés par /api/search, /api/categories et la recherche d'alternatives).
     __table_args__ = (
@@ -45,7 +55,8 @@ class Submission(Base):
 
     id = Column(Integer, primary_key=True)
     barcode = Column(String, index=True, nullable=False)
-    image_front_url = Column(String, nullable=False)
+    # NULL tant que la soumission est en cours de traitement (status "processing").
+    image_front_url = Column(String, nullable=True)
     image_ingredients_url = Column(String, nullable=True)
     image_nutrition_url = Column(String, nullable=True)
     productName = Column(String, nullable=True)
@@ -58,11 +69,56 @@ class Submission(Base):
     ocr_nutrition_text = Column(String, nullable=True)
     parsed_nutriments = Column(JSON, nullable=True)
     found_additives = Column(JSON, nullable=True) 
-    
+    # Dernière erreur du traitement en arrière-plan (upload/OCR), pour l'admin.
+    processing_error = Column(Text, nullable=True)
+
 
     submitted_by_user_id = Column(Integer, ForeignKey("users.id"))
     submitted_by = relationship("UserTable", back_populates="submissions")
 
+class SubmissionJob(Base):
+    """File d'attente durable du traitement des soumissions (upload + OCR + parsing).
+
+    Réclamée par les workers avec SELECT ... FOR UPDATE SKIP LOCKED (voir
+    bdproduitdz/submission_jobs.py). Les images restent ici jusqu'à l'upload.
+    """
+    __tablename__ = "submission_jobs"
+
+    id = Column(Integer, primary_key=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False, unique=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, server_default=func.now())
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    image_front = Column(LargeBinary, nullable=True)
+    image_ingredients = Column(LargeBinary, nullable=True)
+    image_nutrition = Column(LargeBinary, nullable=True)
+    # {"front": sha256, ...} des photos reçues : clés de ImageCache.
+    image_hashes = Column(JSON, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Réclamation : prochain job prêt (status + run_after).
+        Index("ix_submission_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class ImageCache(Base):
+    """URL et texte OCR d'une photo déjà traitée, par SHA-256 de ses octets.
+
+    Voir bdproduitdz/image_cache.py : une photo déjà vue n'est ni ré-uploadée
+    ni ré-OCRisée.
+    """
+    __tablename__ = "image_cache"
+
+    sha256 = Column(String(64), primary_key=True)
+    url = Column(String, nullable=True)
+    ocr_text = Column(Text, nullable=True)  # None : pas encore passée à l'OCR
+    created_at = Column(DateTime, server_default=func.now())
+
+
 class ScanHistory(Base):
     __tablename__ = "scan_history"
 
@@ -74,10 +130,28 @@ class ScanHistory(Base):
     __table_args__ = (
         # Liste de l'historique : filtre user_id + tri par date décroissante.
         Index("ix_scan_history_user_scanned", "user_id", "scanned_at"),
-        # add_scan_to_history / delete : recherche par (user_id, product_id).
-        Index("ix_scan_history_user_product", "user_id", "product_id"),
+        # Une ligne par (user_id, product_id) : cible du ON CONFLICT de
+        # add_scan_to_history (remplace l'index simple ix_scan_history_user_product).
+        UniqueConstraint("user_id", "product_id", name="uq_scan_history_user_product"),
     )
 
+class UserHistoryStats(Base):
+    """Compteurs de l'historique d'un utilisateur, tenus à jour par incréments.
+
+    Voir bdproduitdz/history_stats.py. Moyenne = score_sum / scored_scans.
+    """
+    __tablename__ = "user_history_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_scans = Column(Integer, nullable=False, default=0)
+    scored_scans = Column(Integer, nullable=False, default=0)
+    score_sum = Column(BigInteger, nullable=False, default=0)
+    excellent = Column(Integer, nullable=False, default=0)
+    bon = Column(Integer, nullable=False, default=0)
+    mediocre = Column(Integer, nullable=False, default=0)
+    mauvais = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
 class Additif(Base):
     __tablename__ = "additifs"
 
@@ -143,9 +217,10 @@ class Favorite(Base):
     product = relationship("Product")
 
     __table_args__ = (
-        # toggle/check favori : recherche par (user_id, product_id) ;
-        # liste des favoris : filtre user_id.
+        # toggle/check favori : recherche par (user_id, product_id).
         Index("ix_favorites_user_product", "user_id", "product_id"),
+        # liste des favoris paginée par curseur : filtre user_id + tri par date.
+        Index("ix_favorites_user_saved", "user_id", "saved_at"),
     )
 
 
@@ -0,0 +1,132 @@
+"""
+Cache négatif des codes-barres inconnus (ni dans `produits`, ni sur Open Food Facts).
+
+Un produit absent partout n'était mémorisé nulle part : `@cache` ne garde pas
+les 404, et chaque nouveau scan (les utilisateurs rescannent souvent avant de
+soumettre le produit) repartait sur la base puis sur OFF. On retient donc le
+résultat négatif :
+
+- niveau 1 : LRU en mémoire du worker (NEGATIVE_CACHE_SIZE entrées) ;
+- niveau 2 : Redis, partagé entre workers (`dznutri:off-miss:<barcode>`).
+
+La durée de vie est NEGATIVE_CACHE_TTL_SECONDS ± NEGATIVE_CACHE_JITTER (en
+fraction) : les codes scannés ensemble n'expirent pas tous à la même seconde,
+ce qui évite de renvoyer une rafale d'appels OFF d'un coup.
+
+Le cache ne sert qu'à éviter l'appel OFF : l'API lit toujours la base
+d'abord, un produit apparu en base est donc servi même si son entrée n'a
+pas encore été purgée. `forget` est appelé quand le produit apparaît
+(approbation d'une soumission, import d'un dump OFF) : suppression Redis et
+message pub/sub pour que les autres workers purgent leur LRU.
+"""
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Iterable
+
+from cachetools import LRUCache
+
+import redis_client
+from redis_client import get_redis_client
+
+logger = logging.getLogger("dznutri.negative_cache")
+
+NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "21600"))
+NEGATIVE_CACHE_JITTER = float(os.getenv("NEGATIVE_CACHE_JITTER", "0.2"))
+NEGATIVE_CACHE_SIZE = int(os.getenv("NEGATIVE_CACHE_SIZE", "50000"))
+
+_REDIS_PREFIX = "dznutri:off-miss:"
+INVALIDATION_CHANNEL = "dznutri:off-miss:forget"
+
+# barcode -> échéance (time.monotonic()).
+_local: LRUCache = LRUCache(maxsize=NEGATIVE_CACHE_SIZE)
+_stats = {"hits": 0, "redis_hits": 0, "misses": 0, "remembered": 0, "forgotten": 0}
+
+
+def _ttl() -> int:
+    return max(1, round(NEGATIVE_CACHE_TTL_SECONDS * random.uniform(1 - NEGATIVE_CACHE_JITTER, 1 + NEGATIVE_CACHE_JITTER)))
+
+
+def _local_hit(barcode: str) -> bool:
+    expires_at = _local.get(barcode)
+    if expires_at is None:
+        return False
+    if expires_at <= time.monotonic():
+        _local.pop(barcode, None)
+        return False
+    return True
+
+
+async def is_unknown(barcode: str) -> bool:
+    """True si le code-barres a été récemment trouvé ni en base ni sur OFF."""
+    if _local_hit(barcode):
+        _stats["hits"] += 1
+        return True
+
+    redis = get_redis_client()
+    if redis is not None:
+        try:
+            remaining = await redis.ttl(_REDIS_PREFIX + barcode)  # -2 : clé absente
+        except Exception as exc:  # noqa: BLE001 - Redis en panne : on interrogera OFF
+            logger.warning("Cache négatif Redis indisponible : %s", exc)
+            remaining = -2
+        if remaining > 0:
+            _local[barcode] = time.monotonic() + remaining
+            _stats["redis_hits"] += 1
+            return True
+
+    _stats["misses"] += 1
+    return False
+
+
+async def remember(barcode: str) -> None:
+    """Note que OFF ne connaît pas ce code-barres."""
+    ttl = _ttl()
+    _local[barcode] = time.monotonic() + ttl
+    _stats["remembered"] += 1
+    redis = get_redis_client()
+    if redis is None:
+        return
+    try:
+        await redis.set(_REDIS_PREFIX + barcode, "1", ex=ttl)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Écriture du cache négatif Redis impossible : %s", exc)
+
+
+async def forget(barcodes: Iterable[str]) -> None:
+    """À appeler quand ces codes-barres existent désormais dans `produits`."""
+    barcodes = [b for b in dict.fromkeys(barcodes) if b]
+    if not barcodes:
+        return
+    for barcode in barcodes:
+        _local.pop(barcode, None)
+    _stats["forgotten"] += len(barcodes)
+    redis = get_redis_client()
+    if redis is None:
+        return
+    try:
+        await redis.delete(*(_REDIS_PREFIX + barcode for barcode in barcodes))
+        await redis.publish(INVALIDATION_CHANNEL, ",".join(barcodes))
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Purge du cache négatif impossible : %s", exc)
+
+
+def _on_remote_invalidation(data: str) -> None:
+    for barcode in str(data).split(","):
+        _local.pop(barcode, None)
+
+
+async def listen_for_invalidations(redis: Any) -> None:
+    """Tâche de fond : purge le LRU local quand un autre processus appelle `forget`."""
+    # Messages possiblement perdus pendant une coupure : on repart d'un cache vide.
+    await redis_client.listen(redis, INVALIDATION_CHANNEL, _on_remote_invalidation, _local.clear)
+
+
+def clear() -> None:
+    _local.clear()
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    return {**_stats, "size": len(_local)}
@@ -1,6 +1,9 @@
 import logging
-from google.cloud import vision
 import os
+import threading
+from typing import Any, List, Optional
+
+from google.cloud import vision
 
 logger = logging.getLogger("dznutri.ocr")
 
@@ -8,30 +11,79 @@ logger = logging.getLogger("dznutri.ocr")
 KEY_FILENAME = "dznutri-632fbb70c039.json"
 KEY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), KEY_FILENAME)
 
-def detect_text_from_url(image_url: str) -> str:
-    """Analyse une image depuis une URL avec Google Vision AI."""
-    
-    # On vérifie si le fichier de clé existe physiquement
-    if not os.path.exists(KEY_PATH):
-        error_msg = f"ERREUR: Le fichier de clé '{KEY_FILENAME}' est introuvable."
-        logger.error(error_msg)
-        return error_msg
+# Limite de l'API pour un appel synchrone batch_annotate_images.
+MAX_IMAGES_PER_BATCH = 16
+
+# Client Vision partagé par tout le processus (thread-safe) : les identifiants
+# ne sont lus et le canal gRPC n'est ouvert qu'une seule fois.
+_client: Optional[Any] = None
+_client_lock = threading.Lock()
+
+
+class OcrError(Exception):
+    """Échec de l'appel OCR (clé absente, erreur réseau ou de l'API)."""
+
+
+def get_client() -> Any:
+    """Client Vision du processus, créé au premier appel."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # On vérifie si le fichier de clé existe physiquement
+                if not os.path.exists(KEY_PATH):
+                    raise OcrError(f"Le fichier de clé '{KEY_FILENAME}' est introuvable.")
+                _client = vision.ImageAnnotatorClient.from_service_account_json(KEY_PATH)
+    return _client
+
 
+def set_client(client: Optional[Any]) -> None:
+    """Remplace le client partagé (tests : faux serveur Vision ; None : recréé au prochain appel)."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def _text_request(image_url: str) -> vision.AnnotateImageRequest:
+    return vision.AnnotateImageRequest(
+        image=vision.Image(source=vision.ImageSource(image_uri=image_url)),
+        features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
+    )
+
+
+def detect_text_batch(image_urls: List[str]) -> List[str]:
+    """Texte de plusieurs images en UN appel Vision (batch_annotate_images).
+
+    Renvoie un texte par URL, dans le même ordre. Lève OcrError si l'appel ou
+    l'une des images échoue.
+    """
+    if not image_urls:
+        return []
+    client = get_client()
+    texts: List[str] = []
+    for start in range(0, len(image_urls), MAX_IMAGES_PER_BATCH):
+        chunk = image_urls[start:start + MAX_IMAGES_PER_BATCH]
+        try:
+            response = client.batch_annotate_images(requests=[_text_request(url) for url in chunk])
+        except Exception as e:
+            raise OcrError(str(e)) from e
+        for url, result in zip(chunk, response.responses):
+            if result.error.message:
+                raise OcrError(f"Erreur de l'API Google ({url}) : {result.error.message}")
+            texts.append(result.text_annotations[0].description if result.text_annotations else "")
+    return texts
+
+
+def detect_text(image_url: str) -> str:
+    """Analyse une image depuis une URL avec Google Vision AI (lève OcrError)."""
+    return detect_text_batch([image_url])[0]
+
+
+def detect_text_from_url(image_url: str) -> str:
+    """Comme detect_text, mais renvoie le message d'erreur au lieu de lever."""
     try:
-        # L'initialisation et l'utilisation du client sont dans le même bloc
-        client = vision.ImageAnnotatorClient.from_service_account_json(KEY_PATH)
-
-        image = vision.Image()
-        image.source.image_uri = image_url
-        
-        response = client.text_detection(image=image)
-        
-        if response.error.message:
-            raise Exception(f"Erreur de l'API Google : {response.error.message}")
-
-        return response.text_annotations[0].description if response.text_annotations else ""
-        
-    except Exception as e:
+        return detect_text(image_url)
+    except OcrError as e:
         logger.error("Erreur lors du processus OCR : %s", e)
         # On retourne un message d'erreur clair qui sera stocké dans la base de données
-        return f"Erreur OCR : {e}"
\ No newline at end of file
+        return f"Erreur OCR : {e}"
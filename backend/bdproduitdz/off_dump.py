@@ -0,0 +1,171 @@
+"""
+Lecture en flux des exports Open Food Facts, pour script/import_off_dump.py.
+
+Formats acceptés (gzip ou non, détecté à l'extension) :
+- JSONL (`openfoodfacts-products.jsonl.gz`) : une fiche JSON par ligne ;
+- CSV (`en.openfoodfacts.org.products.csv.gz`) : séparé par des tabulations,
+  colonnes `*_tags` séparées par des virgules, nutriments à plat (`*_100g`).
+
+Le fichier n'est jamais chargé en mémoire : on lit ligne par ligne et chaque
+fiche est aussitôt réduite à DUMP_FIELDS (les champs du mapping et du scoring,
+voir off_fields), comme la réponse projetée de l'API OFF. Les valeurs vides
+sont retirées pour que les replis du mapping (product_name_fr -> product_name,
+pnns_groups_1 -> categories) se comportent comme avec l'API.
+
+Chaque fiche porte son numéro d'enregistrement : le script s'en sert pour
+reprendre un import interrompu (`skip`).
+"""
+import csv
+import gzip
+import io
+import sys
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from pydantic import ValidationError
+
+from . import batch_scoring, off_fields, schemas
+
+# + countries_tags, utilisé par le filtre par pays.
+DUMP_FIELDS = off_fields.OFF_FIELDS + ("countries_tags",)
+_DUMP_FIELDS = frozenset(DUMP_FIELDS)
+
+# Colonnes chargées par COPY, dans l'ordre de ProductCreate (= colonnes de `produits`).
+COPY_COLUMNS = tuple(schemas.ProductCreate.model_fields)
+JSON_COLUMNS = frozenset({"nutriments", "additives_tags", "detail_custom_score"})
+
+Record = Tuple[int, Optional[Dict[str, Any]]]
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _is_csv(path: str) -> bool:
+    name = path[:-3] if path.endswith(".gz") else path
+    return name.endswith((".csv", ".tsv"))
+
+
+def _project(product: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in product.items() if key in _DUMP_FIELDS and value not in (None, "")}
+
+
+def _iter_jsonl(stream: Iterable[str], skip: int) -> Iterator[Record]:
+    for number, line in enumerate(stream, start=1):
+        if number <= skip:
+            continue  # reprise : pas de décodage
+        try:
+            product = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield number, None
+            continue
+        yield number, _project(product) if isinstance(product, dict) else None
+
+
+def _from_csv_row(header: Sequence[str], row: Sequence[str]) -> Dict[str, Any]:
+    product: Dict[str, Any] = {}
+    nutriments: Dict[str, float] = {}
+    for key, value in zip(header, row):
+        if not value:
+            continue
+        if key.endswith("_100g"):
+            try:
+                nutriments[key] = float(value)
+            except ValueError:
+                pass
+        elif key in _DUMP_FIELDS:
+            product[key] = value.split(",") if key.endswith("_tags") else value
+    if nutriments:
+        product["nutriments"] = nutriments
+    return product
+
+
+def _iter_csv(stream: Iterable[str], skip: int) -> Iterator[Record]:
+    reader = csv.reader(stream, delimiter="\t", quoting=csv.QUOTE_NONE)
+    header = next(reader, None)
+    if header is None:
+        return
+    for number, row in enumerate(reader, start=1):
+        if number > skip:
+            yield number, _from_csv_row(header, row)
+
+
+def iter_products(path: str, skip: int = 0) -> Iterator[Record]:
+    """(numéro d'enregistrement, fiche réduite à DUMP_FIELDS) ; None si la ligne est illisible.
+
+    Les `skip` premiers enregistrements sont sautés sans être décodés.
+    """
+    csv.field_size_limit(sys.maxsize)  # ingrédients et catégories très longs dans le CSV OFF
+    with _open_text(path) as stream:
+        if _is_csv(path):
+            yield from _iter_csv(stream, skip)
+        else:
+            yield from _iter_jsonl(stream, skip)
+
+
+def _tag(value: str) -> str:
+    value = value.strip().lower()
+    return value if ":" in value else f"en:{value}"
+
+
+def make_filter(
+    countries: Sequence[str] = (),
+    prefixes: Sequence[str] = (),
+    categories: Sequence[str] = (),
+) -> Callable[[Dict[str, Any]], bool]:
+    """Filtre des fiches : tous les critères donnés (ET), une valeur parmi celles de chaque critère (OU).
+
+    Pays et catégories sans préfixe de langue sont pris en anglais
+    (« algeria » -> « en:algeria »), comme les `*_tags` OFF.
+    """
+    country_tags = {_tag(c) for c in countries}
+    category_tags = {_tag(c) for c in categories}
+    prefixes = tuple(prefixes)
+
+    def keep(product: Dict[str, Any]) -> bool:
+        if prefixes and not str(product.get("code", "")).startswith(prefixes):
+            return False
+        if country_tags and country_tags.isdisjoint(product.get("countries_tags") or ()):
+            return False
+        if category_tags and category_tags.isdisjoint(product.get("categories_tags") or ()):
+            return False
+        return True
+
+    return keep
+
+
+def _copy_value(column: str, value: Any) -> Any:
+    if column in JSON_COLUMNS and value is not None:
+        return orjson.dumps(value).decode()
+    return value
+
+
+def prepare_batch(
+    products: Sequence[Dict[str, Any]], penalty_map: Dict[str, float]
+) -> Tuple[List[Tuple[Any, ...]], Counter, int]:
+    """
+    Score un lot (batch_scoring.score_products) et le convertit en lignes COPY_COLUMNS
+    via le mapping de l'API (off_fields.to_product_create).
+
+    Retourne (lignes, additifs inconnus, nombre de fiches rejetées). Une fiche
+    sans code-barres ou sans nom est rejetée ; un code-barres vu deux fois dans le
+    lot garde la dernière fiche (un INSERT ... ON CONFLICT ne peut pas toucher
+    deux fois la même ligne).
+    """
+    usable = [p for p in products if p.get("code") and (p.get("product_name_fr") or p.get("product_name"))]
+    rejected = len(products) - len(usable)
+    results, unknown = batch_scoring.score_products(usable, penalty_map)
+
+    rows: Dict[str, Tuple[Any, ...]] = {}
+    for product, result in zip(usable, results):
+        try:
+            create = off_fields.to_product_create(str(product["code"]), product, result)
+        except ValidationError:
+            rejected += 1
+            continue
+        data = create.model_dump()
+        rows[create.barcode] = tuple(_copy_value(column, data[column]) for column in COPY_COLUMNS)
+    return list(rows.values()), unknown, rejected
@@ -0,0 +1,91 @@
+"""
+Champs Open Food Facts utilisés par DZnutri et décodage compact des réponses.
+
+La fiche OFF v2 complète pèse souvent 100 à 400 Ko (toutes les langues,
+métadonnées d'images, analyse des ingrédients) alors que le mapping
+(routers/products.py : _build_product_from_off, is_product_suspicious) et le
+scoring n'en lisent qu'une vingtaine de champs. On demande donc à OFF
+uniquement ces champs (`?fields=`), on décode avec orjson et on ne garde
+qu'un petit dict limité à OFF_FIELDS.
+
+`to_product_create` est le mapping unique fiche OFF -> ProductCreate, partagé
+par l'API et script/import_off_dump.py.
+
+Si un champ de REQUIRED_FIELDS manque dans la réponse projetée, l'appelant
+refait un appel sans projection (document complet) : voir
+routers/products.py::_fetch_off_product. Compteurs dans `get_stats()`.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import orjson
+
+from . import models, schemas, scoring
+
+# Lus par le mapping vers ProductCreate et la détection des fiches suspectes.
+MAPPING_FIELDS = (
+    "code", "product_name", "product_name_fr", "brands", "nutriments", "image_url",
+    "ingredients_text", "nutriscore_grade", "nova_group", "additives_tags",
+    "ecoscore_grade", "pnns_groups_1", "pnns_groups_2", "categories",
+)
+# + champs lus par le scoring (scoring.SCORING_FIELDS).
+OFF_FIELDS = tuple(dict.fromkeys(MAPPING_FIELDS + scoring.SCORING_FIELDS))
+FIELDS_PARAM = ",".join(OFF_FIELDS)
+
+# Sans eux la fiche n'est pas exploitable : on retente avec le document complet.
+# Chaque entrée liste des alternatives (le mapping prend product_name_fr, sinon product_name).
+REQUIRED_FIELDS = (("product_name_fr", "product_name"), ("nutriments",))
+
+_stats = {"projected": 0, "full_fallbacks": 0, "bytes": 0}
+
+
+def decode_product(content: bytes) -> Optional[Dict[str, Any]]:
+    """Fiche OFF réduite à OFF_FIELDS (None si OFF ne connaît pas le produit).
+
+    Lève orjson.JSONDecodeError si la réponse n'est pas du JSON.
+    """
+    data = orjson.loads(content)
+    if not isinstance(data, dict) or data.get("status") != 1:
+        return None
+    product = data.get("product") or {}
+    return {key: product[key] for key in OFF_FIELDS if key in product}
+
+
+def to_product_create(barcode: str, off_product_data: Dict[str, Any], score_result: Dict[str, Any]) -> schemas.ProductCreate:
+    """Fiche OFF + résultat du scoring -> ProductCreate (API et import des dumps OFF)."""
+    return schemas.ProductCreate(
+        barcode=off_product_data.get('code', barcode),
+        product_name=off_product_data.get('product_name_fr', off_product_data.get('product_name')),
+        brand=off_product_data.get('brands'),
+        nutriments=off_product_data.get('nutriments'),
+        image_url=off_product_data.get('image_url'),
+        ingredients_text=off_product_data.get('ingredients_text'),
+
+        nutriscore_grade=off_product_data.get('nutriscore_grade'),
+        nova_group=off_product_data.get('nova_group'),
+        additives_tags=off_product_data.get('additives_tags', []),
+        ecoscore_grade=off_product_data.get('ecoscore_grade'),
+
+        custom_score=score_result.get('score'),
+        detail_custom_score=score_result.get('details'),
+        category=off_product_data.get('pnns_groups_1', off_product_data.get('categories', '').split(',')[0]),
+        subcategory=off_product_data.get('pnns_groups_2', off_product_data.get('categories', '').split(',')[1] if len(off_product_data.get('categories', '').split(',')) > 1 else None),
+
+        source=models.PRODUCT_SOURCE_OFF,
+        fetched_at=datetime.utcnow(),
+    )
+
+
+def missing_required(product: Dict[str, Any]) -> bool:
+    return any(not any(key in product for key in keys) for keys in REQUIRED_FIELDS)
+
+
+def record_fetch(size: int, full: bool = False) -> None:
+    _stats["full_fallbacks" if full else "projected"] += 1
+    _stats["bytes"] += size
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    fetches = _stats["projected"] + _stats["full_fallbacks"]
+    return {**_stats, "avg_bytes": round(_stats["bytes"] / fetches) if fetches else 0}
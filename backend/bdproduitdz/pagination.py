@@ -0,0 +1,83 @@
+"""
+Pagination par curseur (« keyset ») pour les listes longues.
+
+Avec LIMIT/OFFSET, Postgres lit puis jette toutes les lignes des pages
+précédentes : plus on descend, plus c'est lent. Avec un curseur, la page
+suivante reprend juste après la dernière ligne vue, via les index composites
+existants (ex. (user_id, scanned_at)) : coût constant quelle que soit la page.
+
+Le curseur est opaque pour le client : les valeurs de la clé de tri de la
+dernière ligne, en JSON encodé base64url. Il est renvoyé dans l'en-tête
+`X-Next-Cursor` (absent sur la dernière page) pour ne pas changer le format
+des réponses existantes.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Type
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Type) -> List[Any]:
+    """Décode un curseur ; lève ValueError s'il est invalide ou falsifié."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [
+            None if v is None else (datetime.fromisoformat(v) if t is datetime else t(v))
+            for v, t in zip(values, types)
+        ]
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise ValueError("Curseur de pagination invalide") from None
+
+
+def after_desc(
+    column: ColumnElement, id_column: ColumnElement, value: Any, last_id: int
+) -> ColumnElement:
+    """Condition « après (value, last_id) » pour un tri `column DESC NULLS FIRST, id DESC`.
+
+    C'est l'ordre DESC par défaut de Postgres (à écrire `.desc().nullsfirst()`
+    pour que SQLite trie pareil) : les lignes à NULL passent en premier, donc
+    une fois la clé non NULL, `(column, id) < (value, last_id)` suffit et
+    l'index (user_id, column) borne le parcours. Pour les dates
+    `server_default=now()` (historique, favoris, notifications).
+    """
+    if value is None:
+        return or_(and_(column.is_(None), id_column < last_id), column.isnot(None))
+    return tuple_(column, id_column) < tuple_(value, last_id)
+
+
+def after_desc_nulls_last(
+    column: ColumnElement, id_column: ColumnElement, value: Any, last_id: int
+) -> ColumnElement:
+    """Condition « après (value, last_id) » pour un tri `column DESC NULLS LAST, id DESC`.
+
+    Pour une colonne où NULL est courant (custom_score de la recherche) : les
+    lignes à NULL, en fin de tri, restent après toute valeur non NULL.
+    """
+    if value is None:
+        return and_(column.is_(None), id_column < last_id)
+    return or_(
+        and_(column <= value, or_(column < value, id_column < last_id)),
+        column.is_(None),
+    )
+
+
+def next_cursor(rows: Sequence[Any], limit: int, *key_getters) -> Optional[str]:
+    """Curseur de la page suivante, ou None si `rows` est la dernière page."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(*(getter(last) for getter in key_getters))
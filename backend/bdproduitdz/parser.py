@@ -1,11 +1,11 @@
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set
 
-# synonyms pour chaque clé
+# synonyms pour chaque clé (par ordre de priorité)
 LABELS = {
     "energy_kcal_100g": [r"énergie", r"kcal", r"énergie/100g"],
     "fat_100g": [r"matières grasses", r"lipides"],
-    "saturated_fat_100g": [r"dont satur.{1,3}es", r"acides gras satur.{0,10}"],
+    "saturated_fat_100g": [r"dont satur\D{1,3}es", r"acides gras satur\D{0,10}"],
     "carbohydrates_100g": [r"glucides", r"hydrates de carbone"],
     "sugars_100g": [r"dont sucres", r"sucres"],
     "proteins_100g": [r"protéines", r"proteines"],
@@ -14,6 +14,42 @@ LABELS = {
     "sodium_100g": [r"sodium"],
 }
 
+# Clés rattrapées ligne par ligne (label sur une ligne, valeur sur la suivante).
+LINE_FALLBACK_KEYS = (
+    "fat_100g", "saturated_fat_100g", "carbohydrates_100g", "sugars_100g",
+    "proteins_100g", "fiber_100g", "salt_100g",
+)
+
+# Distance max (en caractères sans chiffre) entre un label et sa valeur.
+MAX_LABEL_GAP = 40
+
+# Ligne sans nombre (à distinguer d'un nombre illisible, qui vaut None).
+MISSING: Any = object()
+
+# --- Expressions compilées une fois à l'import ---------------------------------
+_NUMBER = re.compile(r"(\d+[\d.,]*)\s*(mg|g|kcal|kj)?", re.I)
+_ENERGY_KJ_KCAL = re.compile(r"(\d{2,5})\s*kJ\s*/\s*(\d{2,4})\s*kcal", re.I)
+_ENERGY_KCAL = re.compile(r"(\d{2,4})\s*kcal", re.I)
+_ENERGY_KJ = re.compile(r"(\d{3,5})\s*kJ", re.I)
+
+# « label ... nombre (unité) » pour chaque synonyme, sur le texte mis à plat.
+_NEAR_LABEL: Dict[str, List["re.Pattern"]] = {
+    key: [
+        re.compile(rf"{pat}[^0-9\r\n]{{0,{MAX_LABEL_GAP}}}?(\d+[\d.,]*)\s*(mg|g|kcal|kj)?", re.I | re.UNICODE)
+        for pat in patterns
+    ]
+    for key, patterns in LABELS.items()
+}
+
+# Un seul automate pour tous les labels (repli ligne par ligne) : le groupe
+# nommé `k<i>` désigne la i-ième clé de LABELS.
+_LABEL_KEYS = {f"k{i}": key for i, key in enumerate(LABELS)}
+_LABELS_RE = re.compile(
+    "|".join(f"(?P<k{i}>{'|'.join(patterns)})" for i, patterns in enumerate(LABELS.values())),
+    re.I | re.UNICODE,
+)
+
+
 # helpers
 def to_float(s: str) -> Optional[float]:
     try:
@@ -21,38 +57,80 @@ def to_float(s: str) -> Optional[float]:
     except Exception:
         return None
 
+
+def _number_value(match: "re.Match") -> Optional[float]:
+    """Valeur du nombre capturé, en g si l'unité était mg."""
+    val = to_float(match.group(1))
+    # normaliser mg -> g
+    if (match.group(2) or "").lower() == "mg" and val is not None:
+        val = val / 1000.0
+    return val
+
+
 def find_energy(text: str) -> Optional[float]:
     # cas: "2217 kJ/530 kcal" ou "530 kcal"
-    m = re.search(r"(\d{2,5})\s*kJ\s*/\s*(\d{2,4})\s*kcal", text, re.I)
+    m = _ENERGY_KJ_KCAL.search(text)
     if m:
         return to_float(m.group(2))
-    m2 = re.search(r"(\d{2,4})\s*kcal", text, re.I)
+    m2 = _ENERGY_KCAL.search(text)
     if m2:
         return to_float(m2.group(1))
     # parfois kJ seul -> convertir kJ -> kcal
-    m3 = re.search(r"(\d{3,5})\s*kJ", text, re.I)
+    m3 = _ENERGY_KJ.search(text)
     if m3:
         kj = to_float(m3.group(1))
         if kj:
             return kj / 4.184
     return None
 
-def regex_search_near_label(text: str, patterns: list) -> Optional[float]:
-    """
-    Cherche une occurrence label ... nombre (unit g/mg/kcal) n'importe où dans le texte.
-    """
-    for label_pat in patterns:
-        # cherche "label ... number unit" sur le texte entier
-        pat = rf"{label_pat}[^0-9\r\n]{{0,40}}?(\d+[\d.,]*)\s*(mg|g|kcal|kj)?"
-        m = re.search(pat, text, re.I | re.UNICODE)
-        if m:
-            val = to_float(m.group(1))
-            unit = (m.group(2) or "").lower()
-            # normaliser mg -> g
-            if unit == "mg" and val is not None:
-                val = val / 1000.0
-            return val
-    return None
+
+class _TextIndex:
+    """Le texte OCR découpé UNE fois : version à plat, lignes et premier nombre de chaque ligne."""
+
+    def __init__(self, text: str):
+        self.lines = [ln.strip() for ln in text.splitlines()]
+        # version "une ligne" pour les recherches globales
+        self.flat = " ".join(ln for ln in self.lines if ln)
+        self._first_numbers: Optional[List[Optional[float]]] = None
+
+    def value_near_label(self, key: str) -> Optional[float]:
+        """Première occurrence « label ... nombre » (synonymes par ordre de priorité)."""
+        for pattern in _NEAR_LABEL[key]:
+            m = pattern.search(self.flat)
+            if m:
+                return _number_value(m)
+        return None
+
+    def first_numbers(self) -> List[Optional[float]]:
+        """Premier nombre de chaque ligne (MISSING si la ligne n'en a pas)."""
+        if self._first_numbers is None:
+            self._first_numbers = [
+                _number_value(m) if m else MISSING
+                for m in map(_NUMBER.search, self.lines)
+            ]
+        return self._first_numbers
+
+    def line_values(self, wanted: Set[str]) -> Dict[str, Optional[float]]:
+        """Repli ligne par ligne, en une passe : pour chaque clé de `wanted`, la
+        première ligne qui contient son label et un nombre (sur la ligne même ou,
+        à défaut, sur la suivante)."""
+        numbers = self.first_numbers()
+        found: Dict[str, Optional[float]] = {}
+        for i, line in enumerate(self.lines):
+            keys = {_LABEL_KEYS[m.lastgroup] for m in _LABELS_RE.finditer(line)} & wanted
+            keys.difference_update(found)
+            if not keys:
+                continue
+            value = numbers[i]
+            if value is MISSING and i + 1 < len(numbers):
+                value = numbers[i + 1]
+            if value is not MISSING:
+                for key in keys:
+                    found[key] = value
+                if len(found) == len(wanted):
+                    break
+        return found
+
 
 def parse_nutritional_info_improved(ocr_text: str) -> Dict[str, Any]:
     """
@@ -60,66 +138,33 @@ def parse_nutritional_info_improved(ocr_text: str) -> Dict[str, Any]:
     """
     # normalisation simple
     text = ocr_text.replace("\xa0", " ").replace("\u200b", "").strip()
-    # garder também uma versão "one-line" pour regex globales
-    flat = " ".join([ln.strip() for ln in text.splitlines() if ln.strip()])
+    index = _TextIndex(text)
 
     results: Dict[str, Any] = {}
 
-    # énergie
-    energy = find_energy(flat)
+    # énergie : "kJ / kcal" d'abord ; le label « énergie » ne sert que s'il n'y a pas d'unité
+    energy = find_energy(index.flat)
     if energy is not None:
         results["energy_kcal_100g"] = round(energy, 2)
 
-    # pour chaque nutriment tenter recherche globale
-    for key, patterns in LABELS.items():
-        if key == "sodium_100g" or key == "salt_100g":
-            # on laisse pour la suite
-            pass
-        val = regex_search_near_label(flat, patterns)
+    # pour chaque nutriment, recherche globale « label ... nombre »
+    for key in LABELS:
+        if key in results:
+            continue
+        val = index.value_near_label(key)
         if val is not None:
-            # normaliser noms et unités
-            results_key = key
-            results[results_key] = round(val, 3) if isinstance(val, float) else val
-
-    # tentatives ligne-by-line pour rattraper "label" sur une ligne et "value" sur la suivante
-    if any(k not in results for k in ["fat_100g","saturated_fat_100g","carbohydrates_100g","sugars_100g","proteins_100g","fiber_100g","salt_100g"]):
-        for i, line in enumerate(text.splitlines()):
-            line = line.strip()
-            # si la ligne contient un label mais pas de valeur, chercher la valeur sur la ligne suivante
-            for key, patterns in LABELS.items():
-                if key in results:
-                    continue
-                for pat in patterns:
-                    if re.search(pat, line, re.I):
-                        # chercher nombre sur la même ligne
-                        m = re.search(r"(\d+[\d.,]*)\s*(mg|g|kcal|kj)?", line)
-                        if m:
-                            val = to_float(m.group(1))
-                            unit = (m.group(2) or "").lower()
-                            if unit == "mg" and val is not None:
-                                val = val / 1000.0
-                            results[key] = val
-                        else:
-                            # regarder la ligne suivante si existe
-                            if i+1 < len(text.splitlines()):
-                                nxt = text.splitlines()[i+1]
-                                m2 = re.search(r"(\d+[\d.,]*)\s*(mg|g|kcal|kj)?", nxt)
-                                if m2:
-                                    val2 = to_float(m2.group(1))
-                                    unit2 = (m2.group(2) or "").lower()
-                                    if unit2 == "mg" and val2 is not None:
-                                        val2 = val2 / 1000.0
-                                    results[key] = val2
+            results[key] = round(val, 3)
+
+    # tentatives ligne par ligne pour rattraper "label" sur une ligne et "value" sur la suivante
+    if any(k not in results for k in LINE_FALLBACK_KEYS):
+        results.update(index.line_values({k for k in LABELS if k not in results}))
 
     # si salt absent, tenter récupérer sodium et convertir Na->salt
     if "salt_100g" not in results:
-        sodium_val = regex_search_near_label(flat, LABELS.get("sodium_100g", []))
+        sodium_val = index.value_near_label("sodium_100g")
         if sodium_val is not None:
-            # sodium_val est en g si mg converti précédemment; mais si regex a trouvé mg, on a converti
-            # Si on a sodium en g -> salt = sodium * 2.5
+            # sodium en g (mg déjà converti) -> salt = sodium * 2.5
             results["sodium_100g"] = round(sodium_val, 4)
             results["salt_100g"] = round(sodium_val * 2.5, 4)
 
-    # convert keys to expected output names and tidy
-    # assurer unités: énergie en kcal, masses en g
     return results
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal, Sequence
 from datetime import datetime
 from enum import Enum
 
@@ -27,7 +27,10 @@ class ProductBase(BaseModel):
     detail_custom_score: Optional[Dict[str, Any]] = None
 
 class ProductCreate(ProductBase):
-    pass
+    # Origine (models.PRODUCT_SOURCE_*) et date de lecture sur OFF : posées
+    # par le serveur, jamais exposées en écriture (ProductUpdate).
+    source: Optional[str] = None
+    fetched_at: Optional[datetime] = None
 
 class ProductUpdate(ProductBase):
     pass
@@ -39,6 +42,50 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+# Niveau de détail des endpoints de liste : "summary" (défaut) ou "full".
+ProductDetailLevel = Literal["summary", "full"]
+
+class ProductSummary(BaseModel):
+    """Ce qu'affichent les listes (recherche, historique, favoris, alternatives).
+
+    Sans nutriments, ingrédients ni détail du score : l'écran produit recharge
+    la fiche complète via /api/product/{barcode}.
+    """
+    id: int
+    barcode: str
+    product_name: str
+    brand: Optional[str] = None
+    image_url: Optional[str] = None
+    category: Optional[str] = None
+    subcategory: Optional[str] = None
+    custom_score: Optional[int] = None
+    nutri_score: Optional[str] = None
+    nova_group: Optional[int] = None
+    ecoscore_grade: Optional[str] = None
+    is_verified: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+def serialize_products(products: Sequence[Any], detail: ProductDetailLevel) -> List[BaseModel]:
+    """Convertit des produits ORM vers le schéma demandé (résumé ou complet)."""
+    model = Product if detail == "full" else ProductSummary
+    return [model.model_validate(p) for p in products]
+
+class ProductBatchRequest(BaseModel):
+    """Liste de codes-barres à résoudre en une seule requête (synchro mobile)."""
+    barcodes: List[str] = Field(..., min_length=1, max_length=300)
+
+# --- HISTORY SCHEMAS ---
+class HistoryScan(BaseModel):
+    product_id: int
+    # Heure du scan sur le téléphone (scans faits hors ligne) ; défaut : maintenant.
+    scanned_at: Optional[datetime] = None
+
+class HistoryBatchRequest(BaseModel):
+    """Scans accumulés hors ligne, envoyés en une seule requête."""
+    scans: List[HistoryScan] = Field(..., min_length=1, max_length=500)
+
 # --- SUBMISSIONS SCHEMAS ---
 class SubmissionBase(BaseModel):
     barcode: str
@@ -71,6 +118,8 @@ class SubmissionResponse(SubmissionBase):
     id: int
     submitted_at: datetime
     submitted_by_user_id: int
+    # Erreur du traitement en arrière-plan (upload/OCR), le cas échéant
+    processing_error: Optional[str] = None
 
     class Config:
         from_attributes = True
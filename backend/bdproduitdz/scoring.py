@@ -1,9 +1,15 @@
+import copy
+import hashlib
+import json
 import logging
 import asyncio
+import os
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, Optional, List, Set
 import math
 
+from cachetools import LRUCache
+
 # Import du CRUD pour les opérations sur les additifs
 from . import crud
 # Import des modèles pour le typage
@@ -202,16 +208,14 @@ def _calculate_nutrition_score(
     return {"score": score_nutritionnel, "details": details}
 
 
-def _calculate_additives_score(
-    product_data: Dict[str, Any], 
+def _match_additives(
+    product_data: Dict[str, Any],
     additifs_penalty_map: Dict[str, float]
-) -> Dict[str, Any]:
+) -> tuple:
     """
-    Calcule le score Additifs sur 30 points (Malus discret et plafonné).
+    Associe les tags d'additifs du produit à la table des pénalités.
+    Retourne (matched, counts par niveau, additifs inconnus).
     """
-    score_additifs = 30.0
-    details: Dict[str, Any] = {}
-
     additives_from_product = {
         normalize_additive_tag(a) 
         for a in product_data.get("additives_tags", []) or []
@@ -230,6 +234,21 @@ def _calculate_additives_score(
         elif add_code:
             unknown_additifs.append(add_code)
 
+    return matched_add, add_counts, unknown_additifs
+
+
+def _calculate_additives_score(
+    product_data: Dict[str, Any], 
+    additifs_penalty_map: Dict[str, float]
+) -> Dict[str, Any]:
+    """
+    Calcule le score Additifs sur 30 points (Malus discret et plafonné).
+    """
+    score_additifs = 30.0
+    details: Dict[str, Any] = {}
+
+    matched_add, add_counts, unknown_additifs = _match_additives(product_data, additifs_penalty_map)
+
     # Logique de pénalité "Couperet"
     malus = 0.0
     malus_reason = ""
@@ -267,78 +286,56 @@ def _calculate_bio_score(product_data: Dict[str, Any]) -> Dict[str, Any]:
 
 
 # =============================================================================
-# 4. FONCTION PRINCIPALE (ROUTEUR)
+# 4. DÉTECTION DE CATÉGORIE ET ASSEMBLAGE (Synchrones, partagés avec batch_scoring)
 # =============================================================================
 
-async def calculate_score(db: AsyncSession, product_data: Dict[str, Any]) -> Dict[str, Any]:
+def _category_text(product_data: Dict[str, Any]) -> str:
     """
-    Fonction principale appelée par le backend.
+    Regroupe toutes les sources de catégories en une "méga-chaîne" minuscule
+    ("Boissons", "en:beverages", "Eaux", etc.) pour la recherche de mots-clés.
     """
-    if not product_data:
-        return {"score": 0, "details": {"reason": "no product data"}, "unknown_additifs": []}
-
-    # --- DÉBUT DEBUG ET NETTOYAGE CATÉGORIES ---
-    
-    # 1. On récupère TOUTES les sources possibles de catégories
     cat_string = str(product_data.get("categories", "") or "")
     cat_tags = product_data.get("categories_tags", []) or []
     main_cat = str(product_data.get("category", "") or "")
-    
-    # 2. On crée une "méga-chaîne" de texte en minuscule pour la recherche
-    # Cela regroupe "Boissons", "en:beverages", "Eaux", etc.
-    full_category_text = (cat_string + " " + " ".join(cat_tags) + " " + main_cat).lower()
+    return (cat_string + " " + " ".join(cat_tags) + " " + main_cat).lower()
 
-    logger.debug("Scoring produit : %s", product_data.get('product_name'))
-    logger.debug("Texte des catégories analysé : %s", full_category_text[:100])
 
-    # 3. Détection EAU
-    # On cherche si l'un des mots-clés de l'eau est DANS la méga-chaîne
-    is_water = any(keyword in full_category_text for keyword in CAT_WATER)
+def _is_water(full_category_text: str) -> bool:
+    """On cherche si l'un des mots-clés de l'eau est DANS la méga-chaîne."""
+    return any(keyword in full_category_text for keyword in CAT_WATER)
 
-    if is_water:
-        logger.debug("Produit détecté comme eau -> note forcée à 100.")
-        return {
-            "score": 100,
-            "details": {
-                "info": "L'eau est la seule boisson recommandée à volonté.",
-                "nutrition_score": 60, "additives_score": 30, "bio_score": 10,
-                "is_beverage": True
-            },
-            "unknown_additifs": []
-        }
-
-    # --- FIN DEBUG ---
-    # 2. Charger les pénalités additifs
-    try:
-        additifs_penalty_map = await crud.get_additifs_penalty(db)
-    except Exception as e:
-        logging.error(f"Erreur chargement additifs: {e}")
-        additifs_penalty_map = {}
 
-    # 3. Déterminer la "Super-Catégorie" pour le calcul nutritionnel
-    category_technical = "solid" # Par défaut
-    
+def _technical_category(full_category_text: str) -> str:
+    """Détermine la "Super-Catégorie" utilisée par le calcul nutritionnel."""
     if any(keyword in full_category_text for keyword in CAT_BEVERAGES):
-        category_technical = "boissons" 
-    elif any(keyword in full_category_text for keyword in CAT_FATS):
-        category_technical = "matières grasses"
-    elif any(keyword in full_category_text for keyword in CAT_CHEESE):
-        category_technical = "fromages"
-    
-    # 4. Lancer les calculs
-    nutrition_res = _calculate_nutrition_score(product_data, category_technical)
-    additives_res = _calculate_additives_score(product_data, additifs_penalty_map)
-    bio_res = _calculate_bio_score(product_data)
-    
-    # 5. Sauvegarde des additifs inconnus (Async)
-    unknown = additives_res.get("unknown", [])
-    if unknown:
-        try:
-            await crud.store_or_increment_pending_additifs(db, unknown)
-        except Exception as e:
-            logging.error(f"Erreur sauvegarde additifs inconnus: {e}")
+        return "boissons"
+    if any(keyword in full_category_text for keyword in CAT_FATS):
+        return "matières grasses"
+    if any(keyword in full_category_text for keyword in CAT_CHEESE):
+        return "fromages"
+    return "solid"
+
 
-    # 6. Score Final
+def _water_result() -> Dict[str, Any]:
+    return {
+        "score": 100,
+        "details": {
+            "info": "L'eau est la seule boisson recommandée à volonté.",
+            "nutrition_score": 60, "additives_score": 30, "bio_score": 10,
+            "is_beverage": True
+        },
+        "unknown_additifs": []
+    }
+
+
+def _assemble_result(
+    product_data: Dict[str, Any],
+    category_technical: str,
+    nutrition_res: Dict[str, Any],
+    additives_res: Dict[str, Any],
+    bio_res: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Construit le résultat final (score sur 100 + détails) à partir des 3 piliers."""
     final_score = nutrition_res["score"] + additives_res["score"] + bio_res["score"]
     
     # Info Eco-Score
@@ -357,5 +354,140 @@ async def calculate_score(db: AsyncSession, product_data: Dict[str, Any]) -> Dic
             "ecoscore_grade": ecoscore or "non-disponible",
             "TypeSpecifique": category_technical or "non-disponible"
         },
-        "unknown_additifs": unknown
-    }
\ No newline at end of file
+        "unknown_additifs": additives_res.get("unknown", [])
+    }
+
+
+# =============================================================================
+# 5. API PURE + CACHE DE SCORES
+# =============================================================================
+
+# Champs réellement lus par le scoring : la clé du cache ne dépend que d'eux
+# (le nom, l'image ou le code-barres n'influencent pas la note).
+SCORING_FIELDS = (
+    "nutriments", "fruits_percent", "additives_tags", "labels_tags",
+    "categories", "categories_tags", "category", "ecoscore_grade",
+    "nova_group", "nova_groups", "nova",
+)
+
+SCORE_MEMO_SIZE = int(os.getenv("SCORE_MEMO_SIZE", "4096"))
+_score_memo: LRUCache = LRUCache(maxsize=SCORE_MEMO_SIZE)
+_score_memo_stats = {"hits": 0, "misses": 0}
+
+
+def product_content_hash(product_data: Dict[str, Any]) -> str:
+    """Empreinte stable des champs utilisés par le scoring (indépendante de l'ordre des clés)."""
+    relevant = {k: product_data[k] for k in SCORING_FIELDS if k in product_data}
+    payload = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _score_product_uncached(product_data: Dict[str, Any], additifs_penalty_map: Dict[str, float]) -> Dict[str, Any]:
+    if not product_data:
+        return {"score": 0, "details": {"reason": "no product data"}, "unknown_additifs": []}
+
+    # 1. Texte de catégories analysé (toutes sources confondues)
+    full_category_text = _category_text(product_data)
+
+    logger.debug("Scoring produit : %s", product_data.get('product_name'))
+    logger.debug("Texte des catégories analysé : %s", full_category_text[:100])
+
+    # 2. Détection EAU
+    if _is_water(full_category_text):
+        logger.debug("Produit détecté comme eau -> note forcée à 100.")
+        return _water_result()
+
+    # 3. Déterminer la "Super-Catégorie" pour le calcul nutritionnel
+    category_technical = _technical_category(full_category_text)
+
+    # 4. Lancer les calculs
+    nutrition_res = _calculate_nutrition_score(product_data, category_technical)
+    additives_res = _calculate_additives_score(product_data, additifs_penalty_map)
+    bio_res = _calculate_bio_score(product_data)
+
+    # 5. Score Final
+    return _assemble_result(product_data, category_technical, nutrition_res, additives_res, bio_res)
+
+
+def score_product(
+    product_data: Dict[str, Any],
+    additifs_penalty_map: Dict[str, float],
+    version: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Calcul pur et synchrone du score (aucun accès base de données).
+
+    `version` identifie le contenu de `additifs_penalty_map` (voir
+    crud.get_additifs_version). Lorsqu'il est fourni, le résultat est mémorisé
+    dans un LRU indexé par (empreinte du produit, version) : re-scorer un
+    contenu identique ne coûte plus qu'une recherche dans un dict. Sans
+    version, on calcule toujours (impossible de savoir si la table a changé).
+    Le résultat retourné est une copie : l'appelant peut le modifier librement.
+    """
+    if version is None or not product_data:
+        return _score_product_uncached(product_data, additifs_penalty_map)
+
+    key = (product_content_hash(product_data), version)
+    cached = _score_memo.get(key)
+    if cached is not None:
+        _score_memo_stats["hits"] += 1
+        return copy.deepcopy(cached)
+
+    _score_memo_stats["misses"] += 1
+    result = _score_product_uncached(product_data, additifs_penalty_map)
+    _score_memo[key] = result
+    return copy.deepcopy(result)
+
+
+def get_score_memo_stats() -> Dict[str, Any]:
+    """Compteurs du cache de scores de ce worker (succès, échecs, taille)."""
+    hits, misses = _score_memo_stats["hits"], _score_memo_stats["misses"]
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "size": len(_score_memo),
+        "maxsize": _score_memo.maxsize,
+    }
+
+
+def clear_score_memo() -> None:
+    _score_memo.clear()
+    _score_memo_stats["hits"] = 0
+    _score_memo_stats["misses"] = 0
+
+
+# =============================================================================
+# 6. FONCTION PRINCIPALE (ROUTEUR)
+# =============================================================================
+
+async def calculate_score(db: AsyncSession, product_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fonction principale appelée par le backend.
+    Charge la table des additifs, délègue le calcul à score_product (mémorisé)
+    puis enregistre les additifs inconnus.
+    """
+    if not product_data:
+        return {"score": 0, "details": {"reason": "no product data"}, "unknown_additifs": []}
+
+    # 1. Charger les pénalités additifs (et leur version pour le cache)
+    try:
+        additifs_penalty_map = await crud.get_additifs_penalty(db)
+        version = crud.get_additifs_version()
+    except Exception as e:
+        logging.error(f"Erreur chargement additifs: {e}")
+        additifs_penalty_map = {}
+        version = None  # table indisponible : on ne mémorise pas ce résultat dégradé
+
+    # 2. Calcul pur (ou résultat mémorisé)
+    result = score_product(product_data, additifs_penalty_map, version)
+
+    # 3. Sauvegarde des additifs inconnus (Async)
+    unknown = result.get("unknown_additifs", [])
+    if unknown:
+        try:
+            await crud.store_or_increment_pending_additifs(db, unknown)
+        except Exception as e:
+            logging.error(f"Erreur sauvegarde additifs inconnus: {e}")
+
+    return result
@@ -0,0 +1,301 @@
+"""
+Traitement des soumissions en arrière-plan.
+
+POST /api/submission ne fait plus que lire les photos, créer la soumission
+(status "processing") et un job dans `submission_jobs`, dans la même
+transaction, puis répond. Des workers asyncio (SUBMISSION_WORKERS par
+processus, démarrés dans le lifespan de main.py) réclament les jobs avec
+SELECT ... FOR UPDATE SKIP LOCKED : plusieurs workers / processus se
+partagent la file sans se marcher dessus, et un job survit à un redémarrage.
+
+Un job : upload des photos (media.upload_image), OCR des photos ingrédients
+et nutrition (media.detect_text_batch : un seul appel Vision), parsing des
+nutriments, détection des additifs, puis la soumission passe en "pending"
+(visible par l'admin). Une photo déjà vue (même SHA-256, bdproduitdz/image_cache.py)
+n'est ni ré-uploadée ni ré-OCRisée.
+En cas d'erreur le job est reprogrammé avec un backoff exponentiel. Après
+SUBMISSION_JOB_MAX_ATTEMPTS essais il passe en "failed" : la soumission reste
+consultable par l'admin si les photos ont été uploadées ("pending" +
+processing_error), sinon elle passe en "failed".
+Un job "running" dont le worker est mort est repris après
+SUBMISSION_JOB_LOCK_TIMEOUT_SECONDS.
+"""
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import executors
+from database import AsyncSessionLocal
+from . import additives_parser, image_cache, media, models, schemas
+from . import parser as nutrition_parser
+
+logger = logging.getLogger("dznutri.submission_jobs")
+
+SUBMISSION_WORKERS = int(os.getenv("SUBMISSION_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("SUBMISSION_JOB_MAX_ATTEMPTS", "5"))
+BACKOFF_SECONDS = float(os.getenv("SUBMISSION_JOB_BACKOFF_SECONDS", "10"))
+MAX_BACKOFF_SECONDS = float(os.getenv("SUBMISSION_JOB_MAX_BACKOFF_SECONDS", "600"))
+POLL_SECONDS = float(os.getenv("SUBMISSION_JOB_POLL_SECONDS", "5"))
+LOCK_TIMEOUT_SECONDS = float(os.getenv("SUBMISSION_JOB_LOCK_TIMEOUT_SECONDS", "600"))
+
+IMAGE_KINDS = ("front", "ingredients", "nutrition")
+
+SessionFactory = Callable[[], AsyncSession]
+
+# Réveille les workers de ce processus dès qu'un job est ajouté (sinon : polling).
+_wakeup = asyncio.Event()
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Délai avant le prochain essai : exponentiel, plafonné, avec un peu de jitter."""
+    delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def enqueue_submission(
+    db: AsyncSession,
+    submission: schemas.SubmissionCreate,
+    user_id: int,
+    images: Dict[str, Optional[bytes]],
+    image_hashes: Optional[Dict[str, str]] = None,
+) -> models.Submission:
+    """Crée la soumission ("processing") et son job dans une seule transaction.
+
+    `image_hashes` : SHA-256 des photos (image_cache.hash_bytes), par type.
+    """
+    db_submission = models.Submission(
+        **submission.model_dump(exclude={"status"}),
+        status="processing",
+        submitted_by_user_id=user_id,
+    )
+    db.add(db_submission)
+    await db.flush()
+    db.add(models.SubmissionJob(
+        submission_id=db_submission.id,
+        status="queued",
+        attempts=0,
+        run_after=datetime.utcnow(),
+        image_hashes=image_hashes or None,
+        **{f"image_{kind}": images.get(kind) or None for kind in IMAGE_KINDS},
+    ))
+    await db.commit()
+    await db.refresh(db_submission)
+    _wakeup.set()
+    return db_submission
+
+
+async def claim_next(db: AsyncSession) -> Optional[int]:
+    """Réclame le prochain job prêt (ou abandonné) et renvoie son id."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    Job = models.SubmissionJob
+    result = await db.execute(
+        select(Job.id)
+        .where(or_(
+            and_(Job.status == "queued", Job.run_after <= now),
+            and_(Job.status == "running", Job.locked_at < stale),
+        ))
+        .order_by(Job.run_after)
+        .limit(1)
+        # Postgres : les jobs verrouillés par un autre worker sont sautés.
+        .with_for_update(skip_locked=True)
+    )
+    job_id = result.scalar_one_or_none()
+    if job_id is None:
+        await db.rollback()
+        return None
+    job = await db.get(models.SubmissionJob, job_id)
+    job.status = "running"
+    job.attempts += 1
+    job.locked_at = now
+    await db.commit()
+    return job_id
+
+
+async def _load(db: AsyncSession, job_id: int) -> Tuple[models.SubmissionJob, models.Submission]:
+    job = (await db.execute(
+        select(models.SubmissionJob)
+        .where(models.SubmissionJob.id == job_id)
+        .execution_options(populate_existing=True)
+    )).scalar_one()
+    submission = await db.get(models.Submission, job.submission_id)
+    return job, submission
+
+
+async def _upload_images(
+    db: AsyncSession, job: models.SubmissionJob, submission: models.Submission, cached: Dict[str, Dict[str, Any]]
+) -> None:
+    hashes = job.image_hashes or {}
+    kinds = []
+    for kind in IMAGE_KINDS:
+        if not getattr(job, f"image_{kind}"):
+            continue
+        entry = cached.get(hashes.get(kind))
+        if entry and entry["url"]:
+            setattr(submission, f"image_{kind}_url", entry["url"])
+        else:
+            kinds.append(kind)
+    urls = await asyncio.gather(*(
+        executors.run("uploads", media.upload_image, getattr(job, f"image_{kind}"), kind) for kind in kinds
+    ))
+    for kind, url in zip(kinds, urls):
+        setattr(submission, f"image_{kind}_url", url)
+        await image_cache.remember(db, hashes.get(kind), url=url)
+    # Photos stockées : un nouvel essai ne refera que l'OCR.
+    for kind in IMAGE_KINDS:
+        setattr(job, f"image_{kind}", None)
+    await db.commit()
+    await db.refresh(job)
+    await db.refresh(submission)
+
+
+async def _ocr(
+    db: AsyncSession, job: models.SubmissionJob, submission: models.Submission, cached: Dict[str, Dict[str, Any]]
+) -> Tuple[str, str]:
+    """Textes des photos ingrédients et nutrition (vide si pas de photo).
+
+    Les textes absents du cache partent dans un seul appel OCR.
+    """
+    hashes = job.image_hashes or {}
+    texts = {"ingredients": "", "nutrition": ""}
+    missing = []
+    for kind in texts:
+        if not getattr(submission, f"image_{kind}_url"):
+            continue
+        entry = cached.get(hashes.get(kind))
+        if entry and entry["ocr_text"] is not None:
+            texts[kind] = entry["ocr_text"]
+        else:
+            missing.append(kind)
+    if missing:
+        urls = [getattr(submission, f"image_{kind}_url") for kind in missing]
+        for kind, url, text in zip(missing, urls, await executors.run("ocr", media.detect_text_batch, urls)):
+            texts[kind] = text
+            await image_cache.remember(db, hashes.get(kind), url=url, ocr_text=text)
+    return texts["ingredients"], texts["nutrition"]
+
+
+async def _process(db: AsyncSession, job: models.SubmissionJob, submission: models.Submission) -> None:
+    cached = await image_cache.get_many(db, (job.image_hashes or {}).values())
+    if not submission.image_front_url:
+        await _upload_images(db, job, submission, cached)
+
+    ocr_text_ingredients, ocr_text_nutrition = await _ocr(db, job, submission, cached)
+
+    # Nutriments : tableau nutritionnel en priorité, sinon la photo des ingrédients.
+    text_for_nutriments = ocr_text_nutrition or ocr_text_ingredients
+    parsed_nutriments = (
+        nutrition_parser.parse_nutritional_info_improved(text_for_nutriments) if text_for_nutriments else {}
+    )
+
+    # Additifs : uniquement dans la liste des ingrédients (trop de faux positifs sinon).
+    found_additives = []
+    if ocr_text_ingredients:
+        found_additives = [
+            {"e_number": add.e_number, "name": add.name, "danger_level": add.danger_level}
+            for add in await additives_parser.find_additives_in_text(db, ocr_text_ingredients)
+        ]
+
+    # On combine les textes OCR pour garder une trace complète pour l'admin
+    full_ocr_text = ""
+    if ocr_text_ingredients:
+        full_ocr_text += f"--- INGRÉDIENTS ---\n{ocr_text_ingredients}\n\n"
+    if ocr_text_nutrition:
+        full_ocr_text += f"--- NUTRITION ---\n{ocr_text_nutrition}"
+
+    submission.ocr_ingredients_text = full_ocr_text.strip()
+    submission.parsed_nutriments = parsed_nutriments
+    submission.found_additives = found_additives
+    submission.processing_error = None
+    submission.status = "pending"
+    job.status = "done"
+    job.locked_at = None
+    job.last_error = None
+    await db.commit()
+
+
+async def _record_failure(session_factory: SessionFactory, job_id: int, error: str) -> None:
+    async with session_factory() as db:
+        job, submission = await _load(db, job_id)
+        job.last_error = error
+        job.locked_at = None
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = "failed"
+            submission.processing_error = error
+            # Photos disponibles : l'admin peut encore saisir la fiche à la main.
+            submission.status = "pending" if submission.image_front_url else "failed"
+            logger.error("Soumission %s : abandon après %s essais (%s)", submission.id, job.attempts, error)
+        else:
+            delay = backoff_seconds(job.attempts)
+            job.status = "queued"
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(
+                "Soumission %s : essai %s échoué (%s), nouvel essai dans %.0f s",
+                submission.id, job.attempts, error, delay,
+            )
+        await db.commit()
+
+
+async def process_job(job_id: int, session_factory: SessionFactory = AsyncSessionLocal) -> bool:
+    """Exécute un job réclamé. Renvoie True s'il a abouti."""
+    try:
+        async with session_factory() as db:
+            job, submission = await _load(db, job_id)
+            submission_id = submission.id
+            await _process(db, job, submission)
+    except Exception as exc:  # noqa: BLE001 - toute erreur est retentée
+        await _record_failure(session_factory, job_id, f"{type(exc).__name__}: {exc}"[:2000])
+        return False
+    logger.info("Soumission %s traitée (job %s)", submission_id, job_id)
+    return True
+
+
+async def run_pending(session_factory: SessionFactory = AsyncSessionLocal, limit: Optional[int] = None) -> int:
+    """Traite les jobs prêts jusqu'à épuisement (ou `limit`). Renvoie le nombre traité."""
+    processed = 0
+    while limit is None or processed < limit:
+        async with session_factory() as db:
+            job_id = await claim_next(db)
+        if job_id is None:
+            break
+        await process_job(job_id, session_factory)
+        processed += 1
+    return processed
+
+
+async def _worker(session_factory: SessionFactory) -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            processed = await run_pending(session_factory)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa: BLE001 - base indisponible : on réessaie plus tard
+            logger.exception("Worker des soumissions : erreur inattendue")
+            processed = 0
+        if processed == 0:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+def start_workers(
+    count: int = SUBMISSION_WORKERS, session_factory: SessionFactory = AsyncSessionLocal
+) -> List["asyncio.Task[None]"]:
+    """Lance `count` workers (0 : traitement délégué à un autre processus)."""
+    return [asyncio.create_task(_worker(session_factory)) for _ in range(count)]
+
+
+async def get_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Nombre de jobs par statut (pour le monitoring)."""
+    result = await db.execute(
+        select(models.SubmissionJob.status, func.count()).group_by(models.SubmissionJob.status)
+    )
+    return {status: count for status, count in result.all()}
@@ -0,0 +1,116 @@
+"""
+Recherche texte des produits (écran de recherche, une requête par frappe).
+
+Postgres : index GIN trigram (pg_trgm) sur le nom + la marque normalisés par
+`dznutri_search_norm` (minuscules, sans accents, sans harakat arabes, alef
+unifiés) — voir la migration `c7e2f4a9b1d3`. Les résultats sont classés par
+similarité puis par score. Une requête numérique est traitée comme un début
+de code-barres et utilise l'index btree `text_pattern_ops`.
+
+Autres bases (SQLite des tests, dev) : même logique exécutée en Python sur les
+produits qui passent les filtres. Pas fait pour de gros volumes.
+"""
+import re
+import unicodedata
+from typing import List, Set
+
+from sqlalchemy import Select, desc, func, literal, literal_column, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Seuil de `<%` dans pg_trgm (pg_trgm.word_similarity_threshold par défaut).
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+# Doit correspondre EXACTEMENT à l'expression de l'index ix_products_search_trgm.
+_SEARCH_DOCUMENT = literal_column(
+    "dznutri_search_norm(coalesce(produits.product_name, '') || ' ' || coalesce(produits.brand, ''))"
+)
+
+_ARABIC_MARKS = re.compile("[\u064B-\u065F\u0670\u0640]")  # harakat, alef suscrit, tatweel
+_WORD = re.compile(r"\w+")
+
+
+def is_barcode_prefix(q: str) -> bool:
+    return q.isascii() and q.isdigit()
+
+
+def normalize_search_text(text: str) -> str:
+    """Équivalent Python de la fonction SQL dznutri_search_norm."""
+    # NFKD sépare accents latins et hamza (أ -> ا + ٔ) : on retire les marques.
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _ARABIC_MARKS.sub("", stripped).replace("\u0649", "\u064A")  # ى -> ي
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Trigrammes à la pg_trgm : chaque mot est entouré de "  " et " "."""
+    grams: Set[str] = set()
+    for word in _WORD.findall(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    ta, tb = _trigrams(a), _trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def word_similarity(term: str, document: str) -> float:
+    """Approximation de pg_trgm.word_similarity : meilleur passage de `document`."""
+    words = _WORD.findall(document)
+    n = max(len(_WORD.findall(term)), 1)
+    windows = [" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))]
+    return max(trigram_similarity(term, window) for window in windows)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _postgres_query(stmt: Select, q: str) -> Select:
+    if is_barcode_prefix(q):
+        # Motif littéral (q ne contient que des chiffres) : le planner peut alors
+        # transformer le LIKE en parcours d'intervalle sur ix_products_barcode_prefix.
+        pattern = literal(f"{q}%", literal_execute=True)
+        return stmt.where(models.Product.barcode.like(pattern)).order_by(models.Product.custom_score.desc().nullslast())
+
+    term = func.dznutri_search_norm(q)
+    pattern = func.dznutri_search_norm(f"%{_escape_like(q)}%")
+    rank = func.word_similarity(term, _SEARCH_DOCUMENT)
+    return (
+        stmt.where(or_(_SEARCH_DOCUMENT.like(pattern), term.op("<%")(_SEARCH_DOCUMENT)))
+        .order_by(desc(rank), models.Product.custom_score.desc().nullslast())
+    )
+
+
+def _rank_in_python(products: List[models.Product], q: str) -> List[models.Product]:
+    if is_barcode_prefix(q):
+        matches = [(0.0, p) for p in products if (p.barcode or "").startswith(q)]
+    else:
+        term = normalize_search_text(q)
+        matches = []
+        for p in products:
+            document = normalize_search_text(f"{p.product_name or ''} {p.brand or ''}")
+            rank = word_similarity(term, document)
+            if term in document or rank >= WORD_SIMILARITY_THRESHOLD:
+                matches.append((rank, p))
+    # Même ordre que PostgreSQL : score décroissant, produits sans score en dernier.
+    matches.sort(key=lambda m: (-m[0], m[1].custom_score is None, -(m[1].custom_score or 0)))
+    return [p for _, p in matches]
+
+
+async def search_products(
+    db: AsyncSession, stmt: Select, q: str, limit: int, offset: int
+) -> List[models.Product]:
+    """Applique la recherche texte `q` à `stmt` (déjà filtré) et pagine."""
+    q = q.strip()
+    if db.bind.dialect.name == "postgresql":
+        result = await db.execute(_postgres_query(stmt, q).limit(limit).offset(offset))
+        return list(result.scalars().all())
+
+    result = await db.execute(stmt)
+    return _rank_in_python(list(result.scalars().all()), q)[offset:offset + limit]
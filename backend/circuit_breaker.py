@@ -0,0 +1,155 @@
+"""Disjoncteur (circuit breaker) pour un service externe, ici Open Food Facts.
+
+Quand OFF est lent ou en panne, chaque produit inconnu attendait le timeout
+complet avant de répondre 503, en gardant une coroutine et une session DB.
+Le disjoncteur observe les appels sur une fenêtre glissante et coupe court :
+
+- `closed` : les appels passent ; sur les `window_seconds` dernières secondes
+  (au moins `min_calls` appels), un taux d'erreur >= `error_rate` ou un p95
+  de latence >= `p95_ms` fait passer en `open` ;
+- `open` : les appels sont refusés tout de suite (`allow()` renvoie False)
+  pendant `open_seconds` ;
+- `half_open` : `half_open_calls` appels d'essai passent ; un essai réussi
+  et rapide referme le circuit, un échec le rouvre.
+
+L'appelant encadre chaque appel : `allow()` avant, puis `record(durée, ok)`
+(ou `release()` si l'appel a été annulé sans résultat). État exposé par
+`snapshot()` (endpoint /health).
+"""
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger("dznutri.circuit_breaker")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        p95_ms: float = 3000.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.p95_ms = p95_ms
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self.state = CLOSED
+        self.reason: Optional[str] = None
+        self._opened_at = 0.0
+        self._probes = 0
+        # (instant, durée en ms, succès) des appels de la fenêtre.
+        self._calls: Deque[Tuple[float, float, bool]] = deque()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "trips": 0}
+
+    # -- fenêtre glissante -------------------------------------------------
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def _window_stats(self) -> Tuple[int, float, float]:
+        """(appels, taux d'erreur, p95 en ms) de la fenêtre courante."""
+        count = len(self._calls)
+        if not count:
+            return 0, 0.0, 0.0
+        failures = sum(1 for _, _, ok in self._calls if not ok)
+        durations = sorted(duration for _, duration, _ in self._calls)
+        p95 = durations[min(count - 1, math.ceil(0.95 * count) - 1)]
+        return count, failures / count, p95
+
+    # -- transitions -------------------------------------------------------
+    def _open(self, now: float, reason: str) -> None:
+        if self.state != OPEN:
+            logger.warning("Circuit %s ouvert : %s", self.name, reason)
+        self.state = OPEN
+        self.reason = reason
+        self._opened_at = now
+        self._probes = 0
+        self.stats["trips"] += 1
+
+    def _close(self) -> None:
+        logger.info("Circuit %s refermé", self.name)
+        self.state = CLOSED
+        self.reason = None
+        self._probes = 0
+        self._calls.clear()
+
+    def _current_state(self, now: float) -> str:
+        if self.state == OPEN and now >= self._opened_at + self.open_seconds:
+            self.state = HALF_OPEN
+            self._probes = 0
+        return self.state
+
+    # -- API -----------------------------------------------------------------
+    def allow(self) -> bool:
+        """True si l'appel peut partir (à faire suivre de record() ou release())."""
+        state = self._current_state(self._clock())
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def release(self) -> None:
+        """L'appel autorisé a été annulé sans résultat : libère l'essai éventuel."""
+        if self.state == HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def record(self, duration_s: float, ok: bool) -> None:
+        now = self._clock()
+        duration_ms = duration_s * 1000
+        self.stats["calls"] += 1
+        if not ok:
+            self.stats["failures"] += 1
+
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if ok and duration_ms < self.p95_ms:
+                self._close()
+            else:
+                self._open(now, "échec de l'appel d'essai" if not ok else f"appel d'essai lent ({duration_ms:.0f} ms)")
+            return
+        if self.state == OPEN:
+            return  # réponse tardive d'un appel parti avant l'ouverture
+
+        self._calls.append((now, duration_ms, ok))
+        self._prune(now)
+        count, error_rate, p95 = self._window_stats()
+        if count < self.min_calls:
+            return
+        if error_rate >= self.error_rate:
+            self._open(now, f"taux d'erreur {error_rate:.0%} sur {count} appels")
+        elif p95 >= self.p95_ms:
+            self._open(now, f"p95 {p95:.0f} ms sur {count} appels")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self._clock()
+        self._prune(now)
+        state = self._current_state(now)
+        count, error_rate, p95 = self._window_stats()
+        snapshot: Dict[str, Any] = {
+            "state": state,
+            "window_calls": count,
+            "error_rate": round(error_rate, 3),
+            "p95_ms": round(p95),
+            **self.stats,
+        }
+        if state != CLOSED:
+            snapshot["reason"] = self.reason
+            snapshot["retry_in_s"] = max(0.0, round(self._opened_at + self.open_seconds - now, 1))
+        return snapshot
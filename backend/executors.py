@@ -0,0 +1,146 @@
+"""Pools de threads dédiés aux appels bloquants, un par type de travail.
+
+Tout passait par le pool par défaut (`run_in_executor(None, ...)`,
+`asyncio.to_thread`, `run_in_threadpool`) : une rafale de soumissions
+(uploads + OCR, plusieurs secondes chacun) occupait tous les threads et
+bloquait la vérification des mots de passe. Chaque type de travail a
+maintenant son pool, de taille bornée et réglable :
+
+- `uploads` : upload des photos (Cloudinary)      EXECUTOR_UPLOADS_WORKERS (8)
+- `ocr`     : Google Vision                       EXECUTOR_OCR_WORKERS (4)
+- `crypto`  : bcrypt (hash / vérification)        EXECUTOR_CRYPTO_WORKERS (4)
+
+Chaque pool mesure sa file d'attente (tâches soumises pas encore démarrées)
+et le temps d'attente avant exécution : voir `get_stats()`, exposé dans
+/api/admin/metrics.
+
+`shutdown()` (arrêt de l'application) annule les tâches en file ; les pools
+sont recréés au premier appel suivant (nouveau démarrage du lifespan, tests).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Optional
+
+DEFAULT_WORKERS = {"uploads": 8, "ocr": 4, "crypto": 4}
+
+# Fenêtre glissante pour les percentiles du temps d'attente.
+_WAIT_SAMPLES = 256
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor nommé, avec compteurs de file et de temps d'attente."""
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self.stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "max_queue_depth": 0, "max_wait_ms": 0.0,
+        }
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"dznutri-{self.name}")
+            return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Exécute `fn(*args, **kwargs)` dans ce pool et attend son résultat."""
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+            self.stats["submitted"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queued)
+        # Passe à True quand la tâche quitte la file (démarrée, ou annulée avant).
+        dequeued = [False]
+
+        def _call() -> Any:
+            wait_ms = (time.perf_counter() - submitted_at) * 1000
+            with self._lock:
+                if dequeued[0]:  # l'appelant a abandonné pendant que le thread démarrait
+                    raise asyncio.CancelledError()
+                dequeued[0] = True
+                self._queued -= 1
+                self._running += 1
+                self._waits.append(wait_ms)
+                self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.stats["failed"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+            with self._lock:
+                self.stats["completed"] += 1
+            return result
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), _call)
+        except BaseException:
+            # Annulée avant de démarrer (shutdown(cancel_futures=True), appelant annulé) :
+            # _call ne s'exécutera pas, c'est ici qu'elle quitte la file.
+            with self._lock:
+                if not dequeued[0]:
+                    dequeued[0] = True
+                    self._queued -= 1
+                    self.stats["cancelled"] += 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                **self.stats,
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "wait_ms_p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+                "wait_ms_p95": round(waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+                "max_wait_ms": round(self.stats["max_wait_ms"], 2),
+            }
+
+    def shutdown(self) -> None:
+        """Annule les tâches en file ; le prochain `run()` recrée le pool."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _workers(name: str) -> int:
+    return max(1, int(os.getenv(f"EXECUTOR_{name.upper()}_WORKERS", str(DEFAULT_WORKERS[name]))))
+
+
+_executors: Dict[str, BoundedExecutor] = {name: BoundedExecutor(name, _workers(name)) for name in DEFAULT_WORKERS}
+
+
+def get(name: str) -> BoundedExecutor:
+    return _executors[name]
+
+
+async def run(name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Raccourci : `await executors.run("ocr", detect_text, url)`."""
+    return await _executors[name].run(partial(fn, *args, **kwargs))
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """Compteurs de chaque pool de ce worker (pour le monitoring)."""
+    return {name: executor.get_stats() for name, executor in _executors.items()}
+
+
+def shutdown() -> None:
+    """Arrêt de l'application : les tâches pas encore démarrées sont annulées."""
+    for executor in _executors.values():
+        executor.shutdown()
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
@@ -13,6 +14,12 @@ from fastapi.staticfiles import StaticFiles
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
 
+import executors
+import off_refresh
+import push
+from auth import user_cache
+from bdproduitdz import additifs_cache, history_buffer, negative_cache, submission_jobs
+from redis_client import set_redis_client
 from routers import auth, products, submissions, admin, history, report, profile, search, favorites, notifications
 
 load_dotenv()
@@ -60,6 +67,8 @@ async def _init_cache():
         # On vérifie que Redis répond réellement avant de l'adopter.
         await redis.ping()
         FastAPICache.init(RedisBackend(redis), prefix="dznutri-cache")
+        # Client partagé : verrous single-flight et autres caches inter-workers.
+        set_redis_client(redis)
         logger.info("Cache: Redis connecté (%s)", redis_url)
         return redis
     except Exception as exc:  # noqa: BLE001 - on veut un fallback sur toute erreur
@@ -75,9 +84,33 @@ async def _init_cache():
 async def lifespan(app: FastAPI):
     # Démarrage
     redis = await _init_cache()
+    # Invalidations de caches poussées par les autres workers (pub/sub).
+    listeners = [
+        asyncio.create_task(additifs_cache.listen_for_invalidations(redis)),
+        asyncio.create_task(user_cache.listen_for_invalidations(redis)),
+        asyncio.create_task(negative_cache.listen_for_invalidations(redis)),
+    ] if redis is not None else []
+    # Traitement des soumissions en arrière-plan (upload + OCR).
+    workers = submission_jobs.start_workers()
+    # Notifications Expo envoyées par lots (push.py).
+    push.start()
+    # Historique des scans écrit en différé (si HISTORY_WRITE_BEHIND).
+    history_buffer.start()
+    # Fiches OFF anciennes relues en arrière-plan (stale-while-revalidate).
+    off_refresh.start(products._fetch_off_product)
     yield
-    # Arrêt : on libère proprement les ressources réseau.
+    # Arrêt : on libère proprement les ressources réseau. Un job interrompu
+    # est repris après SUBMISSION_JOB_LOCK_TIMEOUT_SECONDS.
+    for task in listeners + workers:
+        task.cancel()
+    await asyncio.gather(*listeners, *workers, return_exceptions=True)
+    # Les scans encore en mémoire sont écrits avant de fermer la base.
+    await history_buffer.stop()
+    await push.stop()
+    await off_refresh.stop()
     await products.close_off_client()
+    executors.shutdown()
+    set_redis_client(None)
     if redis is not None:
         try:
             await redis.aclose()
@@ -128,7 +161,12 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    return {"status": "healthy", "service": "dznutri-api"}
+    # L'API reste « healthy » quand OFF est coupé : seuls les produits inconnus sont touchés.
+    return {
+        "status": "healthy",
+        "service": "dznutri-api",
+        "open_food_facts": products.get_off_health(),
+    }
 
 
 # Include Routers
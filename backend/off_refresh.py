@@ -0,0 +1,241 @@
+"""Rafraîchissement en arrière-plan des fiches venues d'Open Food Facts (stale-while-revalidate).
+
+Un produit enregistré depuis OFF n'était plus jamais relu : ses nutriments et
+additifs restaient figés même quand la fiche OFF était complétée. Maintenant
+`produits.source` / `produits.fetched_at` indiquent l'origine et l'âge de la
+fiche, et les lectures (/api/product/{barcode}, /api/products/batch) :
+
+- répondent tout de suite avec la ligne locale ;
+- si la fiche OFF date de plus de OFF_REFRESH_MAX_AGE_HOURS, appellent
+  `schedule()`, qui dépose le code-barres dans une file asyncio sans attendre.
+
+Une tâche unique (démarrée dans le lifespan de main.py) relit la fiche sur
+OFF, la re-score avec le même mapping que la création (off_fields) et met la
+ligne à jour si elle vient toujours d'OFF (une fiche corrigée par un admin
+passe en source `admin` et n'est plus touchée), puis évince le cache produit.
+
+- Coalescence par code-barres : un code déjà demandé dans les
+  OFF_REFRESH_LOCK_SECONDS n'est pas remis en file ; entre workers, un verrou
+  Redis SET NX de même durée garantit un seul rafraîchissement.
+- Débit global : au plus OFF_REFRESH_RATE_PER_SECOND appels OFF par seconde,
+  compteur Redis partagé par tous les workers (à défaut : par worker).
+- File bornée (OFF_REFRESH_QUEUE_SIZE) : au-delà, la demande est abandonnée,
+  elle reviendra au prochain scan.
+
+OFF_REFRESH_MAX_AGE_HOURS=0 désactive le rafraîchissement.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import product_cache
+from bdproduitdz import history_stats, models, off_fields, scoring
+from database import AsyncSessionLocal
+from redis_client import get_redis_client
+
+logger = logging.getLogger("dznutri.off_refresh")
+
+OFF_REFRESH_MAX_AGE_HOURS = float(os.getenv("OFF_REFRESH_MAX_AGE_HOURS", "168"))
+OFF_REFRESH_RATE_PER_SECOND = int(os.getenv("OFF_REFRESH_RATE_PER_SECOND", "2"))
+OFF_REFRESH_LOCK_SECONDS = int(os.getenv("OFF_REFRESH_LOCK_SECONDS", "600"))
+OFF_REFRESH_QUEUE_SIZE = int(os.getenv("OFF_REFRESH_QUEUE_SIZE", "1000"))
+
+_LOCK_PREFIX = "dznutri:off-refresh:lock:"
+_RATE_PREFIX = "dznutri:off-refresh:rate:"
+
+SessionFactory = Callable[[], AsyncSession]
+# routers/products.py::_fetch_off_product : fiche OFF projetée, None si inconnue.
+Fetch = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class OffRefresher:
+    def __init__(
+        self,
+        fetch: Optional[Fetch] = None,
+        session_factory: SessionFactory = AsyncSessionLocal,
+        max_age_hours: float = OFF_REFRESH_MAX_AGE_HOURS,
+        rate_per_second: int = OFF_REFRESH_RATE_PER_SECOND,
+        lock_seconds: int = OFF_REFRESH_LOCK_SECONDS,
+    ) -> None:
+        self.fetch = fetch
+        self.session_factory = session_factory
+        self.max_age = timedelta(hours=max_age_hours) if max_age_hours > 0 else None
+        self.rate_per_second = max(1, rate_per_second)
+        self.lock_seconds = lock_seconds
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=OFF_REFRESH_QUEUE_SIZE)
+        # Codes demandés récemment (en file, en cours ou déjà tentés) : coalescence locale.
+        self._seen: TTLCache = TTLCache(maxsize=OFF_REFRESH_QUEUE_SIZE * 10, ttl=lock_seconds)
+        self._next_slot = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.stats = {
+            "scheduled": 0, "coalesced": 0, "dropped": 0, "locked_elsewhere": 0,
+            "refreshed": 0, "missing_on_off": 0, "skipped": 0, "errors": 0,
+        }
+
+    def is_stale(self, product: Any) -> bool:
+        if self.max_age is None or getattr(product, "source", None) != models.PRODUCT_SOURCE_OFF:
+            return False
+        fetched_at = getattr(product, "fetched_at", None)
+        return fetched_at is None or fetched_at < datetime.utcnow() - self.max_age
+
+    def schedule(self, product: Any) -> bool:
+        """Demande le rafraîchissement d'une fiche OFF trop ancienne (sans attendre). True si mise en file."""
+        if not self.is_stale(product):
+            return False
+        barcode = product.barcode
+        if barcode in self._seen:
+            self.stats["coalesced"] += 1
+            return False
+        try:
+            self._queue.put_nowait(barcode)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        self._seen[barcode] = True
+        self.stats["scheduled"] += 1
+        return True
+
+    async def _acquire_lock(self, barcode: str) -> bool:
+        """Un seul worker rafraîchit un code donné pendant `lock_seconds`."""
+        redis = get_redis_client()
+        if redis is None:
+            return True
+        try:
+            return bool(await redis.set(_LOCK_PREFIX + barcode, "1", nx=True, ex=self.lock_seconds))
+        except Exception as exc:  # noqa: BLE001 - Redis en panne : coalescence locale seulement
+            logger.warning("Verrou de rafraîchissement Redis indisponible : %s", exc)
+            return True
+
+    async def _wait_for_slot(self) -> None:
+        """Limite le débit d'appels OFF : compteur Redis par seconde (global), sinon espacement local."""
+        redis = get_redis_client()
+        while redis is not None:
+            second = int(time.time())
+            try:
+                count = await redis.incr(f"{_RATE_PREFIX}{second}")
+                if count == 1:
+                    await redis.expire(f"{_RATE_PREFIX}{second}", 2)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Limiteur de débit Redis indisponible : %s", exc)
+                break
+            if count <= self.rate_per_second:
+                return
+            await asyncio.sleep(second + 1 - time.time())
+        loop = asyncio.get_running_loop()
+        delay = self._next_slot - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_slot = max(self._next_slot, loop.time()) + 1 / self.rate_per_second
+
+    async def refresh(self, barcode: str) -> bool:
+        """Relit la fiche sur OFF et met la ligne à jour. True si le produit a été réécrit."""
+        off_product_data = await self.fetch(barcode)
+        Product = models.Product
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(Product.id, Product.custom_score, Product.category, Product.subcategory)
+                .where(Product.barcode == barcode, Product.source == models.PRODUCT_SOURCE_OFF)
+            )).first()
+            if row is None:  # supprimé ou repris par un admin entre-temps
+                self.stats["skipped"] += 1
+                return False
+
+            if off_product_data is None:
+                # Retiré d'OFF : on garde notre fiche, relue plus tard.
+                values: Dict[str, Any] = {"fetched_at": datetime.utcnow()}
+            else:
+                score_result = await scoring.calculate_score(db, off_product_data)
+                values = off_fields.to_product_create(barcode, off_product_data, score_result).model_dump(
+                    exclude={"barcode"}
+                )
+            result = await db.execute(
+                update(Product)
+                .where(Product.id == row.id, Product.source == models.PRODUCT_SOURCE_OFF)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                self.stats["skipped"] += 1
+                return False
+            if off_product_data is not None:
+                await history_stats.shift_product_score(db, row.id, row.custom_score, values["custom_score"])
+            await db.commit()
+
+        if off_product_data is None:
+            self.stats["missing_on_off"] += 1
+            return False
+        self.stats["refreshed"] += 1
+        await product_cache.invalidate_product(
+            barcode, [row.category, values["category"]], [row.subcategory, values["subcategory"]]
+        )
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            barcode = await self._queue.get()
+            try:
+                if not await self._acquire_lock(barcode):
+                    self.stats["locked_elsewhere"] += 1
+                    continue
+                await self._wait_for_slot()
+                await self.refresh(barcode)
+            except Exception as exc:  # noqa: BLE001 - OFF injoignable, etc. : retenté au prochain scan
+                self.stats["errors"] += 1
+                logger.warning("Rafraîchissement OFF de %s impossible : %s", barcode, exc)
+            finally:
+                self._queue.task_done()
+
+    def start(self, fetch: Optional[Fetch] = None) -> None:
+        if fetch is not None:
+            self.fetch = fetch
+        if self.max_age is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Abandonne la file (elle se reconstitue aux prochains scans)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "queue_depth": self._queue.qsize(), "enabled": self.max_age is not None}
+
+
+_refresher: Optional[OffRefresher] = None
+
+
+def get_refresher() -> OffRefresher:
+    global _refresher
+    if _refresher is None:
+        _refresher = OffRefresher()
+    return _refresher
+
+
+def schedule(product: Any) -> bool:
+    return get_refresher().schedule(product)
+
+
+def start(fetch: Fetch) -> None:
+    """Démarrage de l'application : lance la tâche de rafraîchissement."""
+    get_refresher().start(fetch)
+
+
+async def stop() -> None:
+    global _refresher
+    if _refresher is not None:
+        await _refresher.stop()
+        _refresher = None
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    return get_refresher().get_stats()
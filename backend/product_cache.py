@@ -0,0 +1,179 @@
+"""Clés de cache adressables et invalidation ciblée des réponses produit.
+
+Les pages produit et les alternatives sont mises en cache 24h par
+fastapi-cache. Avant, chaque approbation/modification admin appelait
+`FastAPICache.clear()` : tout le cache de tous les utilisateurs était vidé et
+chaque session admin provoquait une avalanche de requêtes à froid sur Postgres.
+
+Ici :
+- les clés sont construites à partir du code-barres
+  (`dznutri-cache:product:<barcode>`, `dznutri-cache:alternatives:<barcode>`,
+  `dznutri-cache:categories`), donc retrouvables sans parcourir Redis ;
+- à la mise en cache, une réponse est rattachée à des « tags » (barcode,
+  category, subcategory) : un set Redis par tag (ou un set en mémoire) liste
+  les clés concernées ;
+- `invalidate_product` n'évince que le produit touché, les listes
+  d'alternatives de sa catégorie/sous-catégorie et la carte des catégories.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi_cache import FastAPICache
+
+from redis_client import get_redis_client
+
+logger = logging.getLogger("dznutri.product_cache")
+
+# Les sets de tags vivent au moins aussi longtemps que les réponses qu'ils indexent.
+TAG_TTL_SECONDS = int(os.getenv("PRODUCT_CACHE_TAG_TTL_SECONDS", "86400"))
+_TAG_PREFIX = "dznutri-cache-tag:"
+
+# Clé calculée par le key-builder pour la requête en cours : l'endpoint (exécuté
+# dans la même tâche, seulement en cas de MISS) l'utilise pour poser ses tags.
+_current_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "product_cache_key", default=None
+)
+_local_tags: Dict[str, Set[str]] = defaultdict(set)
+_stats = {"invalidations": 0, "evicted_keys": 0}
+
+
+# ---------------------------------------------------------------------------
+# Clés
+# ---------------------------------------------------------------------------
+def _query_suffix(request: Any) -> str:
+    """Les variantes d'une même ressource (?fields=...) ont chacune leur clé."""
+    if request is None or not request.query_params:
+        return ""
+    raw = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return ":" + hashlib.md5(raw.encode()).hexdigest()[:12]
+
+
+def barcode_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None) -> str:
+    """Key-builder fastapi-cache : `<prefix>:<namespace>:<barcode>[:<hash query>]`."""
+    key = f"{namespace}:{(kwargs or {})['barcode']}{_query_suffix(request)}"
+    _current_key.set(key)
+    return key
+
+
+def static_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None) -> str:
+    """Key-builder pour une ressource unique (ex. la carte des catégories)."""
+    key = f"{namespace}{_query_suffix(request)}"
+    _current_key.set(key)
+    return key
+
+
+def product_key(barcode: str) -> str:
+    return f"{FastAPICache.get_prefix()}:product:{barcode}"
+
+
+def alternatives_key(barcode: str) -> str:
+    return f"{FastAPICache.get_prefix()}:alternatives:{barcode}"
+
+
+def categories_key() -> str:
+    return f"{FastAPICache.get_prefix()}:categories"
+
+
+def _tags(barcode: Optional[str] = None, categories: Iterable[Optional[str]] = (),
+          subcategories: Iterable[Optional[str]] = ()) -> Set[str]:
+    tags = {f"barcode:{barcode}"} if barcode else set()
+    tags.update(f"category:{c}" for c in categories if c)
+    tags.update(f"subcategory:{s}" for s in subcategories if s)
+    return tags
+
+
+# ---------------------------------------------------------------------------
+# Tags
+# ---------------------------------------------------------------------------
+async def tag_current_response(
+    barcode: Optional[str] = None,
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+) -> None:
+    """Rattache la réponse en cours de mise en cache aux tags donnés.
+
+    À appeler depuis un endpoint décoré avec `barcode_key_builder` ; sans clé
+    courante (cache désactivé, requête non cacheable) l'appel ne fait rien.
+    """
+    key = _current_key.get()
+    if key is None:
+        return
+    tags = _tags(barcode, [category], [subcategory])
+    redis = get_redis_client()
+    if redis is not None:
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for tag in tags:
+                pipe.sadd(_TAG_PREFIX + tag, key)
+                pipe.expire(_TAG_PREFIX + tag, TAG_TTL_SECONDS)
+            await pipe.execute()
+            return
+        except Exception as exc:  # noqa: BLE001 - Redis en panne : tags en mémoire
+            logger.warning("Tags de cache Redis indisponibles : %s", exc)
+    for tag in tags:
+        _local_tags[tag].add(key)
+
+
+async def _pop_tagged_keys(tags: Set[str]) -> Set[str]:
+    keys: Set[str] = set()
+    for tag in tags:
+        keys |= _local_tags.pop(tag, set())
+    redis = get_redis_client()
+    if redis is not None and tags:
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for tag in tags:
+                pipe.smembers(_TAG_PREFIX + tag)
+            for members in await pipe.execute():
+                keys.update(members)
+            await redis.delete(*(_TAG_PREFIX + tag for tag in tags))
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Lecture des tags de cache Redis impossible : %s", exc)
+    return keys
+
+
+async def _delete_keys(keys: Set[str]) -> int:
+    if not keys:
+        return 0
+    backend = FastAPICache.get_backend()
+    redis = getattr(backend, "redis", None)
+    if redis is not None:
+        return int(await redis.delete(*keys))
+    deleted = 0
+    for key in keys:
+        try:
+            deleted += await backend.clear(key=key)
+        except KeyError:  # InMemoryBackend : clé déjà expirée ou jamais mise en cache
+            continue
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+async def invalidate_product(
+    barcode: str,
+    categories: Iterable[Optional[str]] = (),
+    subcategories: Iterable[Optional[str]] = (),
+) -> int:
+    """Évince le cache d'un produit modifié et ce qui en dépend.
+
+    Passer l'ancienne ET la nouvelle catégorie/sous-catégorie si elles ont
+    changé. Retourne le nombre de clés effectivement supprimées.
+    """
+    keys = {product_key(barcode), alternatives_key(barcode), categories_key()}
+    keys |= await _pop_tagged_keys(_tags(barcode, categories, subcategories))
+    deleted = await _delete_keys(keys)
+    _stats["invalidations"] += 1
+    _stats["evicted_keys"] += deleted
+    logger.debug("Cache produit %s invalidé (%d clés).", barcode, deleted)
+    return deleted
+
+
+def get_stats() -> Dict[str, int]:
+    """Compteurs d'invalidation de ce worker (pour le monitoring)."""
+    return dict(_stats)
@@ -0,0 +1,238 @@
+"""Envoi des notifications Expo par lots, sur une connexion HTTP partagée.
+
+Avant : un `PushClient()` (donc une connexion HTTPS) créé dans un thread pour
+chaque notification. Maintenant `enqueue()` dépose le message dans une file
+asyncio et rend la main ; une tâche unique (démarrée dans le lifespan de
+main.py) regroupe les messages par lots de PUSH_BATCH_SIZE (100 : limite
+d'Expo) en attendant au plus PUSH_LINGER_SECONDS, et les envoie en une requête
+via un `httpx.AsyncClient` partagé (keep-alive).
+
+- Erreurs réseau, 429 et 5xx : le lot est renvoyé avec un backoff exponentiel
+  (PUSH_MAX_ATTEMPTS essais), puis abandonné et journalisé.
+- Ticket `DeviceNotRegistered` : le token est effacé de `users.userPushToken`
+  en un seul UPDATE pour tout le lot (et le cache utilisateurs est invalidé).
+
+EXPO_PUSH_URL permet de viser un faux serveur Expo local (dev, tests).
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import models as auth_models
+from auth import user_cache
+from database import AsyncSessionLocal
+
+logger = logging.getLogger("dznutri.push")
+
+EXPO_PUSH_URL = os.getenv("EXPO_PUSH_URL", "https://exp.host/--/api/v2/push/send")
+EXPO_ACCESS_TOKEN = os.getenv("EXPO_ACCESS_TOKEN")
+PUSH_BATCH_SIZE = int(os.getenv("PUSH_BATCH_SIZE", "100"))
+PUSH_LINGER_SECONDS = float(os.getenv("PUSH_LINGER_SECONDS", "0.05"))
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "10000"))
+PUSH_MAX_ATTEMPTS = int(os.getenv("PUSH_MAX_ATTEMPTS", "4"))
+PUSH_BACKOFF_SECONDS = float(os.getenv("PUSH_BACKOFF_SECONDS", "1"))
+PUSH_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+SessionFactory = Callable[[], AsyncSession]
+
+
+class _RetryableError(Exception):
+    pass
+
+
+class PushDispatcher:
+    def __init__(
+        self,
+        url: str = EXPO_PUSH_URL,
+        session_factory: SessionFactory = AsyncSessionLocal,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        batch_size: int = PUSH_BATCH_SIZE,
+        linger: float = PUSH_LINGER_SECONDS,
+        max_attempts: int = PUSH_MAX_ATTEMPTS,
+        backoff: float = PUSH_BACKOFF_SECONDS,
+    ) -> None:
+        self.url = url
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.stats = {
+            "queued": 0, "sent": 0, "failed": 0, "dropped": 0,
+            "requests": 0, "retries": 0, "tokens_cleared": 0,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            headers = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+            if EXPO_ACCESS_TOKEN:
+                headers["Authorization"] = f"Bearer {EXPO_ACCESS_TOKEN}"
+            self._client = httpx.AsyncClient(transport=self._transport, timeout=PUSH_TIMEOUT, headers=headers)
+        return self._client
+
+    def enqueue(self, token: str, title: str, body: str, data: Optional[Dict[str, Any]] = None) -> bool:
+        """Met une notification en file (sans attendre l'envoi). False si la file est pleine."""
+        message = {"to": token, "title": title, "body": body, "sound": "default", "priority": "high"}
+        if data:
+            message["data"] = data
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning("File des notifications pleine : message pour %s abandonné", token)
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """Attend un message, puis complète le lot pendant au plus `linger` secondes."""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _post(self, batch: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Envoie un lot et renvoie les tickets Expo (None si le lot est abandonné)."""
+        client = self._get_client()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.stats["requests"] += 1
+                response = await client.post(self.url, json=batch)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise _RetryableError(f"HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    logger.error("Expo a refusé le lot (HTTP %s) : %s", response.status_code, response.text[:500])
+                    return None
+                return response.json()["data"]
+            except (httpx.RequestError, _RetryableError) as exc:
+                if attempt >= self.max_attempts:
+                    logger.error("Envoi de %s notifications abandonné après %s essais : %s", len(batch), attempt, exc)
+                    return None
+                self.stats["retries"] += 1
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                logger.warning("Envoi Expo échoué (%s), nouvel essai dans %.1f s", exc, delay)
+                await asyncio.sleep(delay)
+        return None
+
+    async def send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        tickets = await self._post(batch)
+        if tickets is None:
+            self.stats["failed"] += len(batch)
+            return
+        unregistered = []
+        for message, ticket in zip(batch, tickets):
+            if ticket.get("status") == "ok":
+                self.stats["sent"] += 1
+                continue
+            self.stats["failed"] += 1
+            if (ticket.get("details") or {}).get("error") == "DeviceNotRegistered":
+                unregistered.append(message["to"])
+            else:
+                logger.warning("Notification refusée pour %s : %s", message["to"], ticket.get("message"))
+        if unregistered:
+            await self._clear_tokens(unregistered)
+
+    async def _clear_tokens(self, tokens: List[str]) -> None:
+        """Efface en une requête les tokens qu'Expo ne connaît plus."""
+        User = auth_models.UserTable
+        async with self.session_factory() as db:
+            users = (await db.execute(
+                select(User.id, User.username).where(User.userPushToken.in_(tokens))
+            )).all()
+            if not users:
+                return
+            await db.execute(
+                update(User).where(User.id.in_([user_id for user_id, _ in users])).values(userPushToken=None)
+            )
+            await db.commit()
+        self.stats["tokens_cleared"] += len(users)
+        logger.info("%s push-tokens invalides effacés", len(users))
+        for user_id, username in users:
+            await user_cache.invalidate(user_id, username)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.send_batch(batch)
+            except Exception:  # noqa: BLE001 - la boucle d'envoi ne doit pas mourir
+                logger.exception("Envoi de %s notifications : erreur inattendue", len(batch))
+                self.stats["failed"] += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Envoie ce qui reste en file (au plus `timeout` secondes), puis ferme la connexion."""
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Arrêt : %s notifications non envoyées", self._queue.qsize())
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "queue_depth": self._queue.qsize()}
+
+
+_dispatcher: Optional[PushDispatcher] = None
+
+
+def get_dispatcher() -> PushDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = PushDispatcher()
+    return _dispatcher
+
+
+def enqueue(token: str, title: str, body: str, data: Optional[Dict[str, Any]] = None) -> bool:
+    return get_dispatcher().enqueue(token, title, body, data)
+
+
+def start() -> None:
+    """Démarrage de l'application : lance la tâche d'envoi."""
+    get_dispatcher().start()
+
+
+async def stop() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+        _dispatcher = None
+
+
+def get_stats() -> Dict[str, Any]:
+    """Compteurs de ce worker (pour le monitoring)."""
+    return get_dispatcher().get_stats()
@@ -0,0 +1,59 @@
+"""Accès partagé au client Redis de l'application.
+
+Le client est créé une seule fois au démarrage (`main._init_cache`) puis
+enregistré ici pour que les autres modules (verrous, caches, files d'attente)
+puissent le réutiliser sans ouvrir leur propre connexion. Quand Redis est
+indisponible (dev local sans Docker), `get_redis_client()` renvoie None et
+chaque appelant bascule sur son fonctionnement en mémoire.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("dznutri.redis")
+
+_redis_client: Optional[Any] = None
+
+
+def set_redis_client(client: Optional[Any]) -> None:
+    """Enregistre (ou efface avec None) le client Redis partagé."""
+    global _redis_client
+    _redis_client = client
+
+
+def get_redis_client() -> Optional[Any]:
+    """Retourne le client Redis partagé, ou None en mode mémoire."""
+    return _redis_client
+
+
+async def listen(
+    redis: Any,
+    channel: str,
+    on_message: Callable[[str], None],
+    on_disconnect: Optional[Callable[[], None]] = None,
+    retry_seconds: float = 5.0,
+) -> None:
+    """Tâche de fond : écoute un canal pub/sub, reconnecte si Redis coupe.
+
+    `on_disconnect` permet à l'appelant de se méfier de son cache local tant
+    que des messages d'invalidation ont pu être perdus.
+    """
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    on_message(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Écoute du canal %s interrompue : %s", channel, exc)
+            if on_disconnect is not None:
+                on_disconnect()
+            await asyncio.sleep(retry_seconds)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:  # noqa: BLE001
+                pass
@@ -1,32 +1,49 @@
 import logging
+from typing import Iterable, Optional
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_cache import FastAPICache
 
 from database import get_db
 
 logger = logging.getLogger("dznutri.admin")
 
 
-async def _invalidate_product_cache() -> None:
-    """Purge le cache produit après une écriture admin.
+async def _invalidate_product_cache(
+    barcode: str,
+    categories: Iterable[Optional[str]] = (),
+    subcategories: Iterable[Optional[str]] = (),
+) -> None:
+    """Purge le cache du produit touché par une écriture admin.
 
     Les réponses produit sont mises en cache 24h. Quand un admin approuve ou
-    modifie un produit, on vide le cache pour que les utilisateurs voient
-    immédiatement les données à jour. On protège l'appel : un souci de cache ne
-    doit jamais faire échouer l'action admin.
+    modifie un produit, on évince seulement ce produit, les alternatives de sa
+    (sous-)catégorie et la carte des catégories : le reste du cache reste
+    chaud. On protège l'appel : un souci de cache ne doit jamais faire échouer
+    l'action admin.
     """
     try:
-        await FastAPICache.clear()
+        await product_cache.invalidate_product(barcode, categories, subcategories)
     except Exception as exc:  # noqa: BLE001
         logger.warning("Invalidation du cache produit impossible: %s", exc)
 from auth import models as auth_models
 from auth import schemas as auth_schemas
 from auth import security as auth_security
 from auth import crud as auth_crud
+from auth import user_cache
 from bdproduitdz import crud as bd_crud
+from bdproduitdz import history_buffer
+from bdproduitdz import image_cache
+from bdproduitdz import negative_cache
+from bdproduitdz import off_fields
 from bdproduitdz import schemas as bd_schemas
+from bdproduitdz import scoring as bd_scoring
+from bdproduitdz import submission_jobs
 from utils import send_expo_push
+import executors
+import off_refresh
+import product_cache
+import push
+import singleflight
 
 router = APIRouter(tags=["Admin"])
 
@@ -66,7 +83,11 @@ async def approve_product_submission(
             submitting_user_id = None
 
         logger.info("Produit approuvé et créé : %s", approved_product.product_name)
-        await _invalidate_product_cache()
+        await _invalidate_product_cache(
+            approved_product.barcode,
+            [approved_product.category],
+            [approved_product.subcategory],
+        )
 
         # --- NOTIFICATION PUSH ---
         if submitting_user_id:
@@ -131,6 +152,45 @@ async def get_admin_profile(
     """
     return current_user
 
+@router.get("/api/admin/metrics")
+async def get_runtime_metrics(
+    db: AsyncSession = Depends(get_db),
+    current_user: auth_models.UserTable = Depends(auth_security.get_current_admin)
+):
+    """
+    Compteurs internes du worker qui répond (caches, coalescence des requêtes).
+    Avec plusieurs workers, chaque appel reflète un seul processus ; seule la
+    file des soumissions (jobs par statut) est globale.
+    """
+    return {
+        "submission_jobs": await submission_jobs.get_stats(db),
+        "image_cache": image_cache.get_stats(),
+        "scoring_memo": bd_scoring.get_score_memo_stats(),
+        "off_singleflight": singleflight.get_stats(),
+        "off_fetch": off_fields.get_stats(),
+        "off_negative_cache": negative_cache.get_stats(),
+        "off_refresh": off_refresh.get_stats(),
+        "additifs_version": bd_crud.get_additifs_version(),
+        "product_cache": product_cache.get_stats(),
+        "user_cache": user_cache.get_stats(),
+        "executors": executors.get_stats(),
+        "push": push.get_stats(),
+        "history_buffer": history_buffer.get_stats(),
+    }
+
+
+@router.post("/api/admin/additifs/invalidate-cache")
+async def invalidate_additifs_cache(
+    current_user: auth_models.UserTable = Depends(auth_security.get_current_admin)
+):
+    """
+    Force tous les workers à recharger la table des additifs (après une
+    modification directe de la table `additifs`). Les scores déjà stockés ne
+    sont pas recalculés : lancer script/update_scores.py si nécessaire.
+    """
+    await bd_crud.invalidate_additifs_cache()
+    return {"message": "Cache des additifs invalidé."}
+
 @router.put("/api/admin/product/{barcode}")
 async def update_product_admin(
     barcode: str, 
@@ -141,10 +201,19 @@ async def update_product_admin(
     """
     Met à jour un produit (Admin seulement) et recalcule le score.
     """
+    # Ancienne (sous-)catégorie : ses listes d'alternatives sont aussi à évincer.
+    existing = await bd_crud.getProduitByBarcode(db, barcode)
+    old_category = existing.category if existing else None
+    old_subcategory = existing.subcategory if existing else None
+
     updated_product = await bd_crud.update_product(db, barcode, product_update)
 
     if not updated_product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
 
-    await _invalidate_product_cache()
+    await _invalidate_product_cache(
+        barcode,
+        [old_category, updated_product.category],
+        [old_subcategory, updated_product.subcategory],
+    )
     return updated_product
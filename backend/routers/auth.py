@@ -12,6 +12,7 @@ from auth import schemas as auth_schemas
 from auth import security as auth_security
 from auth import crud as auth_crud
 from auth import jwt as auth_jwt
+from auth import user_cache
 from auth.email import send_password_reset_email
 from auth import hashing as auth_hashing
 from utils import generate_reset_code
@@ -57,7 +58,7 @@ async def auth_google(token: auth_schemas.GoogleToken, db: AsyncSession = Depend
             user = await auth_crud.create_user_from_google(db, user_info=idinfo)
         
         # 3. On génère le token
-        access_token = auth_jwt.create_access_token(data={"sub": user.username})
+        access_token = auth_jwt.create_user_token(user)
         return {"access_token": access_token, "token_type": "bearer"}
 
     except ValueError:
@@ -86,7 +87,7 @@ async def auth_facebook(token: auth_schemas.FacebookToken, db: AsyncSession = De
     if not user:
         user = await auth_crud.create_user_from_facebook(db, user_info=data)
 
-    access_token = auth_jwt.create_access_token(data={"sub": user.username})
+    access_token = auth_jwt.create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/auth/me")
@@ -112,7 +113,7 @@ async def login_admin(
 
 
     # Si tout est bon, on génère un token
-    access_token = auth_jwt.create_access_token(data={"sub": user_in_db.username})
+    access_token = auth_jwt.create_user_token(user_in_db)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/auth/register")
@@ -127,7 +128,7 @@ async def register(user: auth_schemas.UserCreate, db: AsyncSession = Depends(get
         
     new_user = await auth_crud.create_user(db, user.dict())
     
-    access_token = auth_jwt.create_access_token(data={"sub": new_user.username})
+    access_token = auth_jwt.create_user_token(new_user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/auth/login")
@@ -140,7 +141,7 @@ async def login(user: auth_schemas.UserLogin, db: AsyncSession = Depends(get_db)
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
 
         
-    access_token = auth_jwt.create_access_token(data={"sub": db_user.username})
+    access_token = auth_jwt.create_user_token(db_user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/auth/forgot-password")
@@ -180,7 +181,9 @@ async def reset_password(payload: auth_schemas.ResetPassword, db: AsyncSession =
         user.reset_code_expires_at = None
         db.add(user)
 
+        user_id, username = user.id, user.username
         await db.commit()
+        await user_cache.invalidate(user_id, username)
         
         return {"message": "Mot de passe réinitialisé avec succès"}
         
@@ -1,11 +1,12 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
-from typing import List
+from typing import List, Optional, Union
 
 from database import get_db
-from bdproduitdz import models, schemas, crud
+from bdproduitdz import models, schemas, crud, pagination
 from auth.security import get_current_user
 from auth import models as auth_models
 
@@ -65,18 +66,44 @@ async def check_favorite(
     favorite = result.scalars().first()
     return {"is_favorite": bool(favorite)}
 
-@router.get("/api/favorites", response_model=List[schemas.Product])
+@router.get("/api/favorites", response_model=Union[List[schemas.ProductSummary], List[schemas.Product]])
 async def get_favorites(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size (omit for the full list, legacy)"),
+    offset: int = Query(0, ge=0, description="Legacy pagination: prefer `cursor`"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    detail: schemas.ProductDetailLevel = Query("summary", description="'full' to include nutriments, ingredients and score details"),
     db: AsyncSession = Depends(get_db),
     current_user: auth_models.UserTable = Depends(get_current_user)
 ):
-    """List all favorite products."""
+    """
+    List favorite products, most recent first.
+    Fast path: pass `limit`, then follow the `X-Next-Cursor` response header.
+    """
     stmt = (
-        select(models.Product)
+        select(models.Product, models.Favorite.saved_at, models.Favorite.id)
         .join(models.Favorite, models.Favorite.product_id == models.Product.id)
         .where(models.Favorite.user_id == current_user.id)
-        .order_by(models.Favorite.saved_at.desc())
+        .options(*crud.product_load_options(detail))
+        .order_by(models.Favorite.saved_at.desc().nullsfirst(), models.Favorite.id.desc())
     )
+    if cursor:
+        try:
+            saved_at, favorite_id = pagination.decode_cursor(cursor, datetime, int)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        stmt = stmt.where(pagination.after_desc(
+            models.Favorite.saved_at, models.Favorite.id, saved_at, favorite_id
+        ))
+    elif offset:
+        stmt = stmt.offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
     result = await db.execute(stmt)
-    products = result.scalars().all()
-    return products
+    rows = result.all()
+    if limit is not None:
+        next_cursor = pagination.next_cursor(rows, limit, lambda r: r.saved_at, lambda r: r.id)
+        if next_cursor:
+            response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return schemas.serialize_products([row.Product for row in rows], detail)
@@ -1,13 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from auth import models as auth_models
 from auth import security as auth_security
 from bdproduitdz import crud as bd_crud
+from bdproduitdz import history_buffer
+from bdproduitdz import pagination
+from bdproduitdz import schemas as bd_schemas
 
 router = APIRouter(tags=["History"])
 
+# Déclarée avant /api/history/{product_id} : sinon "batch" serait pris pour un product_id.
+@router.post("/api/history/batch")
+async def save_scan_history_batch(
+    payload: bd_schemas.HistoryBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: auth_models.UserTable = Depends(auth_security.get_current_user)
+):
+    """
+    Enregistre en une requête les scans faits hors ligne (un seul INSERT ... ON CONFLICT).
+    Les produits inconnus sont ignorés ; `saved` = nombre de produits enregistrés.
+    """
+    saved = await bd_crud.add_scans_to_history(
+        db, user_id=current_user.id, scans=[(scan.product_id, scan.scanned_at) for scan in payload.scans]
+    )
+    return {"status": "success", "saved": saved}
+
 @router.post("/api/history/{product_id}")
 async def save_scan_history(
     
@@ -16,19 +38,42 @@ async def save_scan_history(
     current_user: auth_models.UserTable = Depends(auth_security.get_current_user)
 ):
     """
-    Endpoint pour sauvegarder un scan dans l'historique."""
-    await bd_crud.add_scan_to_history(db, user_id=current_user.id, product_id=product_id)
+    Endpoint pour sauvegarder un scan dans l'historique.
+    HISTORY_WRITE_BEHIND=1 : le scan est écrit en différé, par lots (bdproduitdz/history_buffer.py).
+    """
+    if history_buffer.is_enabled():
+        history_buffer.record(current_user.id, product_id)
+    else:
+        await bd_crud.add_scan_to_history(db, user_id=current_user.id, product_id=product_id)
     return {"status": "success", "message": "Scan sauvegardé"}
 
 @router.get("/api/history")
 async def get_scan_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Curseur reçu dans l'en-tête X-Next-Cursor"),
+    detail: bd_schemas.ProductDetailLevel = Query("summary", description="'full' : inclut nutriments, additifs et détail du score"),
     db: AsyncSession = Depends(get_db),
     current_user: auth_models.UserTable = Depends(auth_security.get_current_user)
 ):
     """
     Endpoint sauvegardant l'historique de l'utilisateur.
+    Page suivante : repasser la valeur de l'en-tête `X-Next-Cursor` dans `cursor`.
     """
-    history = await bd_crud.get_user_history(db, user_id=current_user.id)
+    try:
+        after = pagination.decode_cursor(cursor, datetime, int) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await history_buffer.flush_user(current_user.id)
+    history = await bd_crud.get_user_history(
+        db, user_id=current_user.id, limit=limit, after=after, detail=detail
+    )
+    next_cursor = pagination.next_cursor(
+        history, limit, lambda h: h["scanned_at"], lambda h: h["history_id"]
+    )
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
     return history
 
 @router.delete("/api/history/product/{product_id}") 
@@ -40,6 +85,7 @@ async def delete_history_item(
     """
     Endpoint pour supprimer un produit de l'historique de l'utilisateur.
     """
+    await history_buffer.flush_user(current_user.id)
     try:
         # On passe le product_id à la fonction CRUD
         await bd_crud.delete_scan_from_history(
@@ -58,6 +104,7 @@ async def get_history_stats(
     """
     Endpoint sécurisé pour récupérer les statistiques de l'historique de l'utilisateur.
     """
+    await history_buffer.flush_user(current_user.id)
     stats = await bd_crud.get_user_history_stats(db, user_id=current_user.id)
 
     return stats
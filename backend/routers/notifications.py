@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
 from database import get_db
 from auth import models as auth_models
 from auth import security as auth_security
 from bdproduitdz import crud as bd_crud
 from bdproduitdz import schemas as bd_schemas
+from bdproduitdz import pagination
 
 router = APIRouter(
     prefix="/api/notifications",
@@ -15,13 +17,29 @@ router = APIRouter(
 
 @router.get("", response_model=List[bd_schemas.NotificationResponse])
 async def get_my_notifications(
+    response: Response,
     unread_only: bool = False,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0, description="Ancien mode de pagination : préférer `cursor`"),
+    cursor: Optional[str] = Query(None, description="Curseur reçu dans l'en-tête X-Next-Cursor"),
     db: AsyncSession = Depends(get_db),
     current_user: auth_models.UserTable = Depends(auth_security.get_current_user)
 ):
-    """Récupère les notifications de l'utilisateur connecté."""
-    notifications = await bd_crud.get_user_notifications(db, user_id=current_user.id, unread_only=unread_only, limit=limit)
+    """Récupère les notifications de l'utilisateur connecté (pagination par curseur)."""
+    try:
+        after = pagination.decode_cursor(cursor, datetime, int) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    notifications = await bd_crud.get_user_notifications(
+        db, user_id=current_user.id, unread_only=unread_only,
+        limit=limit, offset=0 if after else offset, after=after,
+    )
+    next_cursor = pagination.next_cursor(
+        notifications, limit, lambda n: n.created_at, lambda n: n.id
+    )
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
     return notifications
 
 @router.put("/{notification_id}/read", response_model=bool)
@@ -1,8 +1,14 @@
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import time
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 import certifi
+import orjson
 
 logger = logging.getLogger("dznutri.products")
 
@@ -11,12 +17,19 @@ from bdproduitdz import crud as bd_crud
 from bdproduitdz import schemas as bd_schemas
 from bdproduitdz import scoring as bd_scoring
 from bdproduitdz import models as bd_models
+from bdproduitdz import negative_cache, off_fields
 
 router = APIRouter(tags=["Products"])
 
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from fastapi_cache.decorator import cache
 
+import off_refresh
+import product_cache
+from circuit_breaker import CLOSED, CircuitBreaker
+import singleflight
+
 
 # --- Client HTTP partagé pour Open Food Facts ---
 # Réutiliser un seul client (au lieu d'en créer un par requête) permet de
@@ -25,6 +38,25 @@ from fastapi_cache.decorator import cache
 _off_client: httpx.AsyncClient | None = None
 
 OFF_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+OFF_PRODUCT_URL = "https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
+
+# --- Budget de latence et disjoncteur ---
+# Une recherche OFF (réponse projetée + éventuel document complet) doit tenir
+# en OFF_DEADLINE_SECONDS, au lieu d'attendre OFF_TIMEOUT à chaque appel.
+OFF_DEADLINE_SECONDS = float(os.getenv("OFF_DEADLINE_SECONDS", "4"))
+# Requête « couverte » : sans réponse après OFF_HEDGE_AFTER_MS, une seconde
+# requête identique part et la première réponse gagne (0 = désactivé).
+OFF_HEDGE_AFTER_MS = float(os.getenv("OFF_HEDGE_AFTER_MS", "0"))
+# Pendant une panne d'OFF, les recherches échouent tout de suite (503) : voir circuit_breaker.py.
+off_breaker = CircuitBreaker(
+    "openfoodfacts",
+    window_seconds=float(os.getenv("OFF_BREAKER_WINDOW_SECONDS", "60")),
+    min_calls=int(os.getenv("OFF_BREAKER_MIN_CALLS", "10")),
+    error_rate=float(os.getenv("OFF_BREAKER_ERROR_RATE", "0.5")),
+    p95_ms=float(os.getenv("OFF_BREAKER_P95_MS", "3000")),
+    open_seconds=float(os.getenv("OFF_BREAKER_OPEN_SECONDS", "30")),
+)
+_hedge_stats = {"hedged": 0, "hedge_wins": 0}
 
 
 def get_off_client() -> httpx.AsyncClient:
@@ -70,95 +102,219 @@ def is_product_suspicious(product_data: dict) -> bool:
 
     return False
 
+async def _hedged_get(url: str, params: Optional[dict], timeout: float, hedge: bool) -> httpx.Response:
+    """GET avec délai maximal ; si `hedge`, relance une requête identique après OFF_HEDGE_AFTER_MS.
+
+    La première réponse reçue gagne, l'autre requête est annulée. Lève
+    asyncio.TimeoutError quand le délai est écoulé.
+    """
+    client = get_off_client()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    hedge_at = loop.time() + OFF_HEDGE_AFTER_MS / 1000 if hedge and OFF_HEDGE_AFTER_MS > 0 else None
+    tasks = [asyncio.ensure_future(client.get(url, params=params))]
+    pending = set(tasks)
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            wake_at = min(deadline, hedge_at) if hedge_at is not None and len(tasks) == 1 else deadline
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        _hedge_stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+            if not done:
+                if loop.time() >= deadline:
+                    raise asyncio.TimeoutError()
+                _hedge_stats["hedged"] += 1
+                tasks.append(asyncio.ensure_future(client.get(url, params=params)))
+                pending.add(tasks[-1])
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _get_off_document(barcode: str, projected: bool, deadline: float) -> Optional[dict]:
+    """Un appel OFF, dans le budget `deadline` (loop.time()) et derrière le disjoncteur."""
+    remaining = deadline - asyncio.get_running_loop().time()
+    if remaining <= 0 or not off_breaker.allow():
+        raise HTTPException(status_code=503, detail="Open Food Facts indisponible")
+    params = {"fields": off_fields.FIELDS_PARAM} if projected else None
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = await _hedged_get(
+            OFF_PRODUCT_URL.format(barcode=barcode), params, remaining,
+            hedge=off_breaker.state == CLOSED,  # pas de requête en double pendant un essai
+        )
+        # 404 = produit inconnu d'OFF : réponse normale. 429 et 5xx : OFF en difficulté.
+        ok = response.status_code != 429 and response.status_code < 500
+        off_fields.record_fetch(len(response.content), full=not projected)
+        if response.status_code not in (200, 404):
+            # 429/5xx (échec compté par le disjoncteur, finally), 403 d'un pare-feu... :
+            # le corps n'est pas une fiche, et surtout pas la preuve que le produit
+            # n'existe pas (le cache négatif le retiendrait des heures).
+            raise HTTPException(status_code=503, detail="Open Food Facts indisponible")
+        return off_fields.decode_product(response.content)
+    except asyncio.CancelledError:
+        off_breaker.release()
+        started = None
+        raise
+    except (httpx.RequestError, orjson.JSONDecodeError, asyncio.TimeoutError):
+        raise HTTPException(status_code=503, detail="Erreur de communication avec Open Food Facts")
+    finally:
+        if started is not None:
+            off_breaker.record(time.perf_counter() - started, ok)
+
+
+async def _fetch_off_product(barcode: str) -> Optional[dict]:
+    """
+    Récupère la fiche Open Food Facts (None si OFF ne connaît pas le produit).
+
+    Seuls les champs utilisés sont demandés (`fields=`, voir bdproduitdz/off_fields.py) :
+    quelques Ko au lieu de 100 à 400 Ko. Le document complet n'est téléchargé
+    que si un champ indispensable manque dans la réponse projetée.
+
+    Les deux appels partagent un budget de OFF_DEADLINE_SECONDS ; 503 si le
+    budget est épuisé ou si le disjoncteur OFF est ouvert.
+    """
+    deadline = asyncio.get_running_loop().time() + OFF_DEADLINE_SECONDS
+    product = await _get_off_document(barcode, projected=True, deadline=deadline)
+    if product is not None and off_fields.missing_required(product):
+        logger.debug("Fiche OFF %s incomplète en projection, téléchargement complet.", barcode)
+        product = await _get_off_document(barcode, projected=False, deadline=deadline) or product
+    return product
+
+
+def get_off_health() -> dict:
+    """État du disjoncteur OFF et des requêtes couvertes (endpoint /health)."""
+    return {**off_breaker.snapshot(), **_hedge_stats}
+
+
+async def _report_if_suspicious(db: AsyncSession, barcode: str, off_product_data: dict) -> None:
+    """Crée un report automatique (une seule fois) si la fiche OFF est incomplète."""
+    if not is_product_suspicious(off_product_data):
+        return
+    logger.info("Produit %s suspect -> création d'un report automatique.", barcode)
+
+    # Vérifier si un report existe déjà pour éviter les doublons
+    existing_report = await db.execute(
+        select(bd_models.Report).where(
+            bd_models.Report.barcode == barcode,
+            bd_models.Report.type == bd_models.ReportType.AUTO
+        )
+    )
+
+    if not existing_report.scalars().first():
+        # On crée le report via le modèle directement (plus rapide ici)
+        auto_report = bd_models.Report(
+            barcode=barcode,
+            type=bd_models.ReportType.AUTO, # "automatiqueReport"
+            description="Données incomplètes ou suspectes détectées lors du scan (Calories/Additifs manquants).",
+            status="pending"
+        )
+        db.add(auto_report)
+        await db.commit()
+
+
+async def _build_product_from_off(db: AsyncSession, barcode: str, off_product_data: dict) -> bd_schemas.ProductCreate:
+    """Calcule le score d'une fiche OFF et la convertit en ProductCreate."""
+    scoringGlobal = await bd_scoring.calculate_score(db, off_product_data)
+    logger.debug("Score calculé pour %s : %s", barcode, scoringGlobal.get('score'))
+
+    await _report_if_suspicious(db, barcode, off_product_data)
+
+    return off_fields.to_product_create(barcode, off_product_data, scoringGlobal)
+
+
+async def _fetch_and_store_off_product(db: AsyncSession, barcode: str) -> dict:
+    """
+    Récupère un produit sur Open Food Facts, calcule son score, signale à
+    l'admin s'il est incomplet et le sauvegarde. Lève 404/503 sinon.
+
+    Appelé une seule fois par code-barres même sous forte concurrence
+    (voir singleflight.run_once dans get_product_by_barcode).
+    """
+    # Un autre worker/leader a pu créer le produit entre-temps.
+    db_product = await bd_crud.getProduitByBarcode(db, barcode=barcode)
+    if db_product:
+        return {"source": "local_db", "product": db_product}
+
+    logger.debug("Produit %s non trouvé localement, recherche Open Food Facts...", barcode)
+    off_product_data = await _fetch_off_product(barcode)
+    if off_product_data is None:
+        # Le produit n'est trouvé nulle part : les prochains scans répondront 404 sans appeler OFF.
+        await negative_cache.remember(barcode)
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
+
+    logger.debug("Produit %s trouvé sur Open Food Facts.", barcode)
+    product_to_create = await _build_product_from_off(db, barcode, off_product_data)
+
+    # On appelle le CRUD pour créer le produit dans notre base de données
+    try:
+        created_product = await bd_crud.create_product(db, product=product_to_create)
+    except IntegrityError:
+        # Course perdue contre une autre instance (index unique sur barcode) :
+        # on relit simplement la ligne gagnante.
+        await db.rollback()
+        existing = await bd_crud.getProduitByBarcode(db, barcode=product_to_create.barcode)
+        if existing is None:
+            raise
+        return {"source": "local_db", "product": existing}
+
+    return {"source": "openfoodfacts_saved", "product": created_product}
+
+
 # --- VOTRE ENDPOINT MIS À JOUR ---
 @router.get("/api/product/{barcode}")
-@cache(expire=86400) # Cache de 24 heures
+@cache(expire=86400, namespace="product", key_builder=product_cache.barcode_key_builder) # Cache de 24 heures
 async def get_product_by_barcode(barcode: str, db: AsyncSession = Depends(get_db)):
     """
     Cherche un produit. D'abord en local, sinon sur Open Food Facts.
     Si trouvé sur OFF : Calcule le score, signale à l'admin si incomplet, sauvegarde et retourne.
+
+    Les scans simultanés d'un même code-barres inconnu sont coalescés : un seul
+    fetch OFF + scoring + insertion, dont le résultat est partagé.
+
+    Un code-barres récemment trouvé ni en base ni sur OFF répond 404 sans
+    appeler OFF (bdproduitdz/negative_cache.py). La base est lue avant ce
+    cache : un produit importé ou approuvé entre-temps est servi même si
+    l'invalidation du cache n'a pas atteint ce worker.
     """
-    
     # 1. On cherche D'ABORD dans la base de données locale
     db_product = await bd_crud.getProduitByBarcode(db, barcode=barcode)
     
+    await product_cache.tag_current_response(barcode=barcode)
     if db_product:
         logger.debug("Produit %s trouvé en base locale.", barcode)
+        # Fiche OFF ancienne : servie telle quelle, relue sur OFF en arrière-plan.
+        off_refresh.schedule(db_product)
         return {"source": "local_db", "product": db_product}
 
-    # 2. Si non trouvé, on cherche sur Open Food Facts
-    logger.debug("Produit %s non trouvé localement, recherche Open Food Facts...", barcode)
-    off_api_url = f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
-
-    client = get_off_client()
-    try:
-        response = await client.get(off_api_url)
-    except httpx.RequestError:
-        raise HTTPException(status_code=503, detail="Erreur de communication avec Open Food Facts")
-
-    data = response.json()
+    if await negative_cache.is_unknown(barcode):
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
 
-    if data.get("status") == 1:
-        logger.debug("Produit %s trouvé sur Open Food Facts.", barcode)
-        off_product_data = data.get("product")
-
-        # 3. On calcule le score
-        scoringGlobal = await bd_scoring.calculate_score(db, off_product_data)
-        custom_score = scoringGlobal.get('score')
-        detail_custom_score = scoringGlobal.get('details')
-        logger.debug("Score calculé pour %s : %s", barcode, custom_score)
-
-        # --- SIGNALEMENT AUTOMATIQUE (VERSION TABLE REPORTS) ---
-        if is_product_suspicious(off_product_data):
-            logger.info("Produit %s suspect -> création d'un report automatique.", barcode)
-            
-            # Vérifier si un report existe déjà pour éviter les doublons
-            existing_report = await db.execute(
-                select(bd_models.Report).where(
-                    bd_models.Report.barcode == barcode,
-                    bd_models.Report.type == bd_models.ReportType.AUTO
-                )
-            )
-            
-            if not existing_report.scalars().first():
-                # On crée le report via le modèle directement (plus rapide ici)
-                auto_report = bd_models.Report(
-                    barcode=barcode,
-                    type=bd_models.ReportType.AUTO, # "automatiqueReport"
-                    description="Données incomplètes ou suspectes détectées lors du scan (Calories/Additifs manquants).",
-                    status="pending"
-                )
-                db.add(auto_report)
-                await db.commit()
-        # -------------------------------------------------------
-
-        # 5. On prépare les données pour les sauvegarder dans notre table 'products' 
-        product_to_create = bd_schemas.ProductCreate(
-            barcode=off_product_data.get('code', barcode),
-            product_name=off_product_data.get('product_name_fr', off_product_data.get('product_name')),
-            brand=off_product_data.get('brands'),
-            nutriments=off_product_data.get('nutriments'),
-            image_url=off_product_data.get('image_url'),
-            ingredients_text=off_product_data.get('ingredients_text'),
-
-            nutriscore_grade=off_product_data.get('nutriscore_grade'),
-            nova_group=off_product_data.get('nova_group'),
-            additives_tags=off_product_data.get('additives_tags', []),
-            ecoscore_grade=off_product_data.get('ecoscore_grade'),
-            
-            custom_score=custom_score,
-            detail_custom_score=detail_custom_score,
-            category=off_product_data.get('pnns_groups_1', off_product_data.get('categories', '').split(',')[0]),
-            subcategory=off_product_data.get('pnns_groups_2', off_product_data.get('categories', '').split(',')[1] if len(off_product_data.get('categories', '').split(',')) > 1 else None)
-        )
-        
-        # 6. On appelle le CRUD pour créer le produit dans notre base de données
-        created_product = await bd_crud.create_product(db, product=product_to_create)
-        
-        return {"source": "openfoodfacts_saved", "product": created_product}
+    # 2. Si non trouvé, on cherche sur Open Food Facts (une seule fois par code-barres)
+    async def _recheck_local():
+        found = await bd_crud.getProduitByBarcode(db, barcode=barcode)
+        if found:
+            return {"source": "local_db", "product": found}
+        # Le leader d'un autre worker a eu un 404 d'OFF (et l'a noté) : on ne
+        # refait pas l'appel, c'est le troupeau que le single-flight évite.
+        if await negative_cache.is_unknown(barcode):
+            raise HTTPException(status_code=404, detail="Produit non trouvé")
+        return None
 
-    # 7. Si le produit n'est trouvé nulle part
-    raise HTTPException(status_code=404, detail="Produit non trouvé")
+    return await singleflight.run_once(
+        f"off-product:{barcode}",
+        lambda: _fetch_and_store_off_product(db, barcode),
+        recheck=_recheck_local,
+    )
 
 @router.put("/testapi") #Juste pour voir la structure de l'API d'OpenFoodFacts
 async def test_api(barcode: str):
@@ -175,11 +331,96 @@ async def test_api(barcode: str):
     return {"message": data}
 
 @router.get("/api/product/{barcode}/alternatives")
-@cache(expire=86400) # Cache de 24 heures pour les alternatives
-async def get_product_alternatives(barcode: str, db: AsyncSession = Depends(get_db)):
+@cache(expire=86400, namespace="alternatives", key_builder=product_cache.barcode_key_builder) # Cache de 24 heures pour les alternatives
+async def get_product_alternatives(
+    barcode: str,
+    detail: bd_schemas.ProductDetailLevel = Query("summary", description="'full' : fiches complètes"),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Retourne une liste de produits alternatifs (meilleur score, même catégorie).
     """
-    alternatives = await bd_crud.get_better_alternatives(db, barcode=barcode)
-    return {"alternatives": alternatives}
+    alternatives = await bd_crud.get_better_alternatives(db, barcode=barcode, detail=detail)
+    # La liste dépend de la sous-catégorie (à défaut, de la catégorie) du produit :
+    # elle est invalidée quand un produit de cette (sous-)catégorie change.
+    ref_product = await bd_crud.getProduitByBarcode(db, barcode)
+    if ref_product is not None:
+        await product_cache.tag_current_response(
+            barcode=barcode,
+            subcategory=ref_product.subcategory,
+            category=None if ref_product.subcategory else ref_product.category,
+        )
+    else:
+        await product_cache.tag_current_response(barcode=barcode)
+    return {"alternatives": bd_schemas.serialize_products(alternatives, detail)}
+
+
+
+# --- Recherche groupée (synchro historique/favoris, file de scans hors-ligne) ---
+# Nombre maximal de requêtes OFF simultanées pour un même lot : on reste poli
+# avec Open Food Facts et on ne monopolise pas le pool de connexions httpx.
+OFF_BATCH_CONCURRENCY = int(os.getenv("OFF_BATCH_CONCURRENCY", "8"))
+_OFF_UNAVAILABLE = object()  # marqueur : OFF injoignable pour ce code-barres
+
+
+@router.post("/api/products/batch")
+async def get_products_batch(payload: bd_schemas.ProductBatchRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Résout une liste de codes-barres en un seul aller-retour.
+
+    - Tous les produits déjà connus sont lus en UNE requête SQL.
+    - Les absents sont cherchés sur Open Food Facts en parallèle (concurrence
+      bornée), notés, puis insérés en un seul INSERT ... ON CONFLICT DO NOTHING.
+    Retourne {"products": {barcode: produit}, "not_found": [...], "unavailable": [...]}.
+    """
+    # Dédoublonnage en gardant l'ordre d'origine.
+    barcodes = list(dict.fromkeys(b.strip() for b in payload.barcodes if b and b.strip()))
+
+    local = await bd_crud.get_products_by_barcodes(db, barcodes)
+    for product in local.values():
+        off_refresh.schedule(product)
+    products: Dict[str, object] = dict(local)
+    not_found: List[str] = []
+    misses = []
+    for barcode in (b for b in barcodes if b not in products):
+        (not_found if await negative_cache.is_unknown(barcode) else misses).append(barcode)
+    unavailable: List[str] = []
+
+    if misses:
+        semaphore = asyncio.Semaphore(OFF_BATCH_CONCURRENCY)
+
+        async def _fetch(barcode: str):
+            async with semaphore:
+                try:
+                    return barcode, await _fetch_off_product(barcode)
+                except HTTPException:
+                    return barcode, _OFF_UNAVAILABLE
+
+        fetched = await asyncio.gather(*(_fetch(b) for b in misses))
+
+        # Le scoring partage la session DB : il reste séquentiel (CPU, pas d'I/O réseau).
+        to_create: List[bd_schemas.ProductCreate] = []
+        for barcode, off_product_data in fetched:
+            if off_product_data is _OFF_UNAVAILABLE:
+                unavailable.append(barcode)
+            elif off_product_data is None:
+                not_found.append(barcode)
+                await negative_cache.remember(barcode)
+            else:
+                to_create.append(await _build_product_from_off(db, barcode, off_product_data))
+
+        if to_create:
+            await bd_crud.bulk_insert_products(db, to_create)
+            # Une seule relecture couvre aussi les lignes insérées par un scan concurrent.
+            created = await bd_crud.get_products_by_barcodes(db, [p.barcode for p in to_create])
+            products.update(created)
+            # OFF peut renvoyer un code normalisé différent de celui demandé.
+            for barcode in misses:
+                if barcode not in products and barcode not in not_found and barcode not in unavailable:
+                    not_found.append(barcode)
 
+    return {
+        "products": {b: products[b] for b in barcodes if b in products},
+        "not_found": not_found,
+        "unavailable": unavailable,
+    }
@@ -1,45 +1,43 @@
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, desc, func, distinct
-from typing import List, Optional
+from sqlalchemy import select, distinct
+from typing import List, Optional, Union
 
 from fastapi_cache.decorator import cache
 
 from database import get_db
-from bdproduitdz import models, schemas
+import product_cache
+from bdproduitdz import crud, models, schemas, pagination, text_search
 
 router = APIRouter(tags=["Search"])
 
-@router.get("/api/search", response_model=List[schemas.Product])
+@router.get("/api/search", response_model=Union[List[schemas.ProductSummary], List[schemas.Product]])
 async def search_products(
+    response: Response,
     q: Optional[str] = Query(None, description="Search term (product name, brand, barcode)"),
     category: Optional[str] = Query(None, description="Filter by category"),
     subcategory: Optional[str] = Query(None, description="Filter by subcategory"),
     min_score: Optional[int] = Query(None, description="Minimum score"),
     max_score: Optional[int] = Query(None, description="Maximum score"),
     verified_only: bool = Query(False, description="Show only verified products"),
-    limit: int = 20,
-    offset: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, description="Legacy pagination: prefer `cursor`"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header (without `q`)"),
+    detail: schemas.ProductDetailLevel = Query("summary", description="'full' to include nutriments, ingredients and score details"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Advanced search with filters.
+    Without `q`, results are ordered by (custom_score, id): follow the
+    `X-Next-Cursor` response header for constant-time deep pages.
+    With `q`, results are ranked by relevance and paginated with `offset`.
     """
-    stmt = select(models.Product)
+    # Les listes n'affichent que nom, marque, image et score : on ne charge
+    # les colonnes lourdes qu'avec detail=full.
+    stmt = select(models.Product).options(*crud.product_load_options(detail))
 
-    # 1. Text Search
-    if q:
-        search_term = f"%{q}%"
-        stmt = stmt.where(
-            or_(
-                models.Product.product_name.ilike(search_term),
-                models.Product.brand.ilike(search_term),
-                models.Product.barcode.ilike(search_term)
-            )
-        )
-
-    # 2. Filters
+    # 1. Filters
     if category:
         stmt = stmt.where(models.Product.category == category)
     
@@ -55,19 +53,41 @@ async def search_products(
     if verified_only:
         stmt = stmt.where(models.Product.is_verified == True)
 
-    # 3. Sorting (Default by Score DESC)
-    stmt = stmt.order_by(desc(models.Product.custom_score))
+    # 2. Text Search : classée par similarité puis score (index trigram en prod)
+    if q:
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor is not supported with q, use offset")
+        products = await text_search.search_products(db, stmt, q, limit, offset)
+        return schemas.serialize_products(products, detail)
+
+    # 3. Sorting (Default by Score DESC, id pour un ordre stable)
+    stmt = stmt.order_by(
+        models.Product.custom_score.desc().nullslast(), models.Product.id.desc()
+    )
 
-    # 4. Pagination
-    stmt = stmt.limit(limit).offset(offset)
+    # 4. Pagination : curseur (keyset) ou offset (compatibilité)
+    if cursor:
+        try:
+            score, last_id = pagination.decode_cursor(cursor, int, int)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        stmt = stmt.where(pagination.after_desc_nulls_last(
+            models.Product.custom_score, models.Product.id, score, last_id
+        ))
+    else:
+        stmt = stmt.offset(offset)
+    stmt = stmt.limit(limit)
 
     result = await db.execute(stmt)
     products = result.scalars().all()
 
-    return products
+    next_cursor = pagination.next_cursor(products, limit, lambda p: p.custom_score, lambda p: p.id)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return schemas.serialize_products(products, detail)
 
 @router.get("/api/categories")
-@cache(expire=3600)  # Les catégories changent rarement : cache 1h (purgé sur écriture admin)
+@cache(expire=3600, namespace="categories", key_builder=product_cache.static_key_builder)  # Les catégories changent rarement : cache 1h (purgé sur écriture admin)
 async def get_categories(db: AsyncSession = Depends(get_db)):
     """
     Get all categories and their subcategories.
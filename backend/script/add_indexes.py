@@ -24,11 +24,12 @@ INDEXES = [
     # produits : recherche/alternatives par catégorie triées par score
     ("ix_products_category_score", "produits", "(category, custom_score)"),
     ("ix_products_subcategory_score", "produits", "(subcategory, custom_score)"),
-    # scan_history : liste de l'historique + upsert/suppression
+    # scan_history : liste de l'historique. (user_id, product_id) est couvert par
+    # la contrainte unique uq_scan_history_user_product (migration b7d4e1f0a2c6).
     ("ix_scan_history_user_scanned", "scan_history", "(user_id, scanned_at)"),
-    ("ix_scan_history_user_product", "scan_history", "(user_id, product_id)"),
     # favorites : toggle/check/liste
     ("ix_favorites_user_product", "favorites", "(user_id, product_id)"),
+    ("ix_favorites_user_saved", "favorites", "(user_id, saved_at)"),
     # notifications : liste + compteur de non-lues
     ("ix_notifications_user_created", "notifications", "(user_id, created_at)"),
     ("ix_notifications_user_read", "notifications", "(user_id, read)"),
@@ -0,0 +1,144 @@
+"""Benchmark : détection des additifs dans un texte OCR, par soumission.
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\bench_additives_parser.py [--additifs 400] [--rounds 200] [--from-db]
+
+Compare, sur le corpus tests/fixtures/ocr_ingredients.txt :
+- `ancien`  : l'ancienne boucle (un re.search par nom d'additif, regex des
+  codes recompilée à chaque appel, table relue à chaque soumission — la
+  lecture de la table n'est PAS comptée ici) ;
+- `matcher` : AdditiveMatcher précompilé (une seule passe par texte).
+Sans --from-db, la table des additifs est synthétique (noms réalistes +
+codes E100..E1521) ; aucune base de données n'est nécessaire.
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from bdproduitdz.additives_parser import AdditiveMatcher  # noqa: E402
+
+CORPUS = os.path.join(project_root, "tests", "fixtures", "ocr_ingredients.txt")
+
+NAMES = [
+    "Acide citrique", "Acide ascorbique", "Acide phosphorique", "Gomme xanthane",
+    "Gomme de guar", "Nitrite de sodium", "Sorbate de potassium", "Benzoate de sodium",
+    "Glutamate monosodique", "Lécithine de soja", "Carraghénanes", "Aspartame",
+    "Acésulfame K", "Caramel au sulfite d'ammonium", "Bêta-carotène", "Carmin",
+    "Diphosphate disodique", "Carbonate de sodium", "Mono- et diglycérides d'acides gras",
+    "EDTA calcique disodique", "Érythorbate de sodium", "Tartrazine", "Dioxyde de titane",
+]
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        lines = [line for line in f if not line.startswith("#")]
+    return [block.strip() for block in "".join(lines).split("\n---\n") if block.strip()]
+
+
+def synthetic_additifs(n: int):
+    rows = []
+    for i in range(n):
+        number = 100 + (i * 1421) // max(n, 1)
+        name = NAMES[i] if i < len(NAMES) else f"Additif synthétique {i} ({number})"
+        rows.append(SimpleNamespace(
+            id=i + 1, e_number=f"E{number}{'abcd'[i % 4] if i % 7 == 0 else ''}",
+            name=name, danger_level=i % 4, sin_number=None, ins_number=None,
+        ))
+    return rows
+
+
+async def db_additifs():
+    from sqlalchemy import select
+
+    from bdproduitdz import models
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(models.Additif))).scalars().all()
+
+
+def legacy_find(known_additives, ocr_text):
+    """Copie de l'ancienne implémentation (hors requête SQL)."""
+    code_map = {}
+    name_check_list = []
+    for add in known_additives:
+        if not add.e_number:
+            continue
+        code = add.e_number.upper()
+        code_map[code] = add
+        number_part = code[1:] if code.startswith("E") else code
+        code_map[f"SIN{number_part}"] = add
+        code_map[f"INS{number_part}"] = add
+        if add.name:
+            name_check_list.append(add)
+
+    pattern = r'\b(?:E|SIN|INS|SIN\.|INS\.)\s*[-]?\s*(\d{3,4}[a-z]?)\b'
+    found, found_ids = [], set()
+    for match in re.finditer(pattern, ocr_text, re.IGNORECASE):
+        number_part = match.group(1).upper()
+        for key in (f"E{number_part}", f"SIN{number_part}", f"INS{number_part}"):
+            if key in code_map:
+                if code_map[key].id not in found_ids:
+                    found.append(code_map[key])
+                    found_ids.add(code_map[key].id)
+                break
+    for additif in name_check_list:
+        if additif.id in found_ids:
+            continue
+        if re.search(r'\b' + re.escape(additif.name) + r'\b', ocr_text, re.IGNORECASE):
+            found.append(additif)
+            found_ids.add(additif.id)
+    return found
+
+
+def measure(label, fn, corpus, rounds):
+    timings = []
+    for _ in range(rounds):
+        for text in corpus:
+            start = time.perf_counter()
+            fn(text)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"{label:<10} médiane {statistics.median(timings):8.1f} µs   p95 {p95:8.1f} µs / soumission")
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--additifs", type=int, default=400)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--from-db", action="store_true", help="utiliser la vraie table `additifs`")
+    args = parser.parse_args()
+
+    additifs = asyncio.run(db_additifs()) if args.from_db else synthetic_additifs(args.additifs)
+    corpus = load_corpus()
+
+    start = time.perf_counter()
+    matcher = AdditiveMatcher(additifs)
+    build_ms = (time.perf_counter() - start) * 1e3
+    print(f"{len(additifs)} additifs, {len(corpus)} textes OCR, {args.rounds} tours")
+    print(f"construction du matcher : {build_ms:.1f} ms (une fois par version de la table)")
+
+    old = measure("ancien", lambda text: legacy_find(additifs, text), corpus, args.rounds)
+    new = measure("matcher", matcher.find, corpus, args.rounds)
+    print(f"gain : x{old / new:.1f}")
+
+    missed = [
+        (i, sorted({a.id for a in legacy_find(additifs, t)} - {a.id for a in matcher.find(t)}))
+        for i, t in enumerate(corpus)
+    ]
+    missed = [m for m in missed if m[1]]
+    print("additifs trouvés par l'ancien code mais pas par le matcher :", missed or "aucun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Microbenchmark : parsing du tableau nutritionnel d'un texte OCR.
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\bench_nutrition_parser.py [--rounds 200] [--long 40] [--write-golden]
+
+Compare, sur le corpus tests/fixtures/ocr_nutrition.txt :
+- `ancien`  : l'ancien parser (regex construites dans les boucles, splitlines()
+  rappelé pour chaque label et chaque ligne) ;
+- `compilé` : bdproduitdz.parser (regex compilées à l'import, texte indexé une fois).
+`--long N` mesure aussi deux longs dumps OCR, dont un qui passe par le repli
+ligne par ligne (quadratique dans l'ancien code).
+`--write-golden` régénère tests/fixtures/ocr_nutrition.golden.json : relire le
+diff avant de le committer.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Any, Dict, Optional
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from bdproduitdz import parser as nutrition_parser  # noqa: E402
+
+FIXTURES = os.path.join(project_root, "tests", "fixtures")
+CORPUS = os.path.join(FIXTURES, "ocr_nutrition.txt")
+GOLDEN = os.path.join(FIXTURES, "ocr_nutrition.golden.json")
+
+LEGACY_LABELS = dict(nutrition_parser.LABELS, saturated_fat_100g=[r"dont satur.{1,3}es", r"acides gras satur.{0,10}"])
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        lines = [line for line in f if not line.startswith("#")]
+    return [block.strip() for block in "".join(lines).split("\n---\n") if block.strip()]
+
+
+def _legacy_near_label(text: str, patterns: list) -> Optional[float]:
+    for label_pat in patterns:
+        pat = rf"{label_pat}[^0-9\r\n]{{0,40}}?(\d+[\d.,]*)\s*(mg|g|kcal|kj)?"
+        m = re.search(pat, text, re.I | re.UNICODE)
+        if m:
+            val = nutrition_parser.to_float(m.group(1))
+            if (m.group(2) or "").lower() == "mg" and val is not None:
+                val = val / 1000.0
+            return val
+    return None
+
+
+def legacy_parse(ocr_text: str) -> Dict[str, Any]:
+    """Copie de l'ancienne implémentation (mêmes étapes, mêmes appels répétés)."""
+    text = ocr_text.replace("\xa0", " ").replace("\u200b", "").strip()
+    flat = " ".join([ln.strip() for ln in text.splitlines() if ln.strip()])
+    results: Dict[str, Any] = {}
+    energy = nutrition_parser.find_energy(flat)
+    if energy is not None:
+        results["energy_kcal_100g"] = round(energy, 2)
+    for key, patterns in LEGACY_LABELS.items():
+        val = _legacy_near_label(flat, patterns)
+        if val is not None:
+            results[key] = round(val, 3)
+    if any(k not in results for k in nutrition_parser.LINE_FALLBACK_KEYS):
+        for i, line in enumerate(text.splitlines()):
+            line = line.strip()
+            for key, patterns in LEGACY_LABELS.items():
+                if key in results:
+                    continue
+                for pat in patterns:
+                    if re.search(pat, line, re.I):
+                        m = re.search(r"(\d+[\d.,]*)\s*(mg|g|kcal|kj)?", line)
+                        if not m and i + 1 < len(text.splitlines()):
+                            m = re.search(r"(\d+[\d.,]*)\s*(mg|g|kcal|kj)?", text.splitlines()[i + 1])
+                        if m:
+                            val = nutrition_parser.to_float(m.group(1))
+                            if (m.group(2) or "").lower() == "mg" and val is not None:
+                                val = val / 1000.0
+                            results[key] = val
+    if "salt_100g" not in results:
+        sodium_val = _legacy_near_label(flat, LEGACY_LABELS["sodium_100g"])
+        if sodium_val is not None:
+            results["sodium_100g"] = round(sodium_val, 4)
+            results["salt_100g"] = round(sodium_val * 2.5, 4)
+    return results
+
+
+def measure(label, fn, texts, rounds):
+    timings = []
+    for _ in range(rounds):
+        for text in texts:
+            start = time.perf_counter()
+            fn(text)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"  {label:<8} médiane {statistics.median(timings):9.1f} µs   p95 {p95:9.1f} µs")
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--long", type=int, default=40, help="taille du long dump OCR (nb de copies du corpus)")
+    parser.add_argument("--write-golden", action="store_true")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    if args.write_golden:
+        golden = [nutrition_parser.parse_nutritional_info_improved(text) for text in corpus]
+        with open(GOLDEN, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"{GOLDEN} régénéré ({len(golden)} textes)")
+        return
+
+    print(f"{len(corpus)} textes OCR, {args.rounds} tours")
+    old = measure("ancien", legacy_parse, corpus, args.rounds)
+    new = measure("compilé", nutrition_parser.parse_nutritional_info_improved, corpus, args.rounds)
+    print(f"  gain : x{old / new:.1f}")
+
+    # Long dump où tous les labels sont trouvés d'emblée, puis long dump qui passe
+    # par le repli ligne par ligne (fibres sans valeur sur de nombreuses lignes).
+    dumps = {
+        "tableaux": "\n".join(corpus * args.long),
+        "repli": "\n".join([corpus[1]] + ["fibres vegetales, sucres, sel, proteines de lait"] * (50 * args.long)),
+    }
+    for name, dump in dumps.items():
+        print(f"dump OCR « {name} » de {len(dump.splitlines())} lignes, 5 tours")
+        old = measure("ancien", legacy_parse, [dump], 5)
+        new = measure("compilé", nutrition_parser.parse_nutritional_info_improved, [dump], 5)
+        print(f"  gain : x{old / new:.1f}")
+
+    for i, text in enumerate(corpus):
+        before, after = legacy_parse(text), nutrition_parser.parse_nutritional_info_improved(text)
+        if before != after:
+            print(f"texte {i} : ancien {before}\n{'':9}nouveau {after}")
+
+
+if __name__ == "__main__":
+    main()
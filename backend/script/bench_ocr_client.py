@@ -0,0 +1,73 @@
+"""Benchmark : latence OCR par soumission, avant/après le client Vision partagé.
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\bench_ocr_client.py [--submissions 50] [--latency 0.08]
+
+Tourne contre bdproduitdz.fake_vision (vrai client google-cloud-vision, vrai
+transport gRPC, serveur local) ; `--latency` simule le temps de traitement
+de Google par appel. Une soumission = photo ingrédients + photo nutrition.
+- `avant` : un client (donc un canal gRPC) créé par image, deux appels en
+  parallèle (ancien comportement ; la relecture du fichier de clé n'est pas
+  comptée) ;
+- `après` : client partagé, un seul batch_annotate_images par soumission.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from google.cloud import vision  # noqa: E402
+
+from bdproduitdz import ocr  # noqa: E402
+from bdproduitdz.fake_vision import FakeVisionServer  # noqa: E402
+
+
+def _legacy_detect(server: FakeVisionServer, url: str) -> str:
+    client = server.client()  # ancien code : from_service_account_json à chaque image
+    image = vision.Image()
+    image.source.image_uri = url
+    response = client.text_detection(image=image)
+    return response.text_annotations[0].description if response.text_annotations else ""
+
+
+def measure(label, fn, n):
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"  {label:<6} médiane {statistics.median(timings):7.1f} ms   p95 {p95:7.1f} ms / soumission")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.08, help="latence simulée de Vision par appel (s)")
+    args = parser.parse_args()
+
+    urls = {i: (f"https://img/{i}/ingredients.jpg", f"https://img/{i}/nutrition.jpg") for i in range(args.submissions)}
+    texts = {url: "Ingrédients : eau, sucre, E330" for pair in urls.values() for url in pair}
+
+    with FakeVisionServer(texts, latency=args.latency) as server, ThreadPoolExecutor(max_workers=2) as pool:
+        print(f"{args.submissions} soumissions, latence Vision simulée {args.latency * 1000:.0f} ms/appel")
+
+        calls = server.calls
+        measure("avant", lambda i: list(pool.map(lambda url: _legacy_detect(server, url), urls[i])), args.submissions)
+        print(f"         {server.calls - calls} appels Vision")
+
+        ocr.set_client(server.client())
+        calls = server.calls
+        measure("après", lambda i: ocr.detect_text_batch(list(urls[i])), args.submissions)
+        print(f"         {server.calls - calls} appels Vision")
+        ocr.set_client(None)
+
+
+if __name__ == "__main__":
+    main()
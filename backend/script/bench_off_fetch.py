@@ -0,0 +1,122 @@
+"""Benchmark : octets transférés et temps de décodage par miss Open Food Facts.
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\bench_off_fetch.py [--fixtures DIR] [--repeat 200]
+    .venv\\Scripts\\python.exe script\\bench_off_fetch.py --record 6130234000154 6133...
+
+Compare, pour chaque fiche enregistrée :
+- `avant` : document complet, `response.json()` (json de la stdlib) ;
+- `après` : réponse projetée (`fields=` OFF_FIELDS, comme le serveur OFF la
+  renvoie), décodée par off_fields.decode_product (orjson + dict réduit).
+
+`--record` télécharge de vraies fiches complètes dans le dossier de fixtures
+(réseau requis). Sans fiche enregistrée, le benchmark utilise
+tests/fixtures/off_product_full.json grossie en document synthétique
+(langues, images, analyse des ingrédients) : voir `_inflate`.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+import httpx  # noqa: E402
+import orjson  # noqa: E402
+
+from bdproduitdz import off_fields  # noqa: E402
+
+DEFAULT_FIXTURES = Path(project_root) / "tests" / "fixtures" / "off_recorded"
+TEMPLATE = Path(project_root) / "tests" / "fixtures" / "off_product_full.json"
+LANGS = ["ar", "en", "es", "de", "it", "nl", "pt", "pl", "ru", "tr", "zh", "ja", "ko", "sv", "da", "fi",
+         "cs", "el", "hu", "ro", "bg", "hr", "sk", "sl", "lt", "lv", "et", "he", "th", "vi", "id", "ms"]
+
+
+def _record(barcodes, directory: Path) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    with httpx.Client(headers={"User-Agent": "DZnutri/1.0 (dznutriment@gmail.com)"}, timeout=30) as client:
+        for barcode in barcodes:
+            response = client.get(f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json")
+            (directory / f"{barcode}.json").write_bytes(response.content)
+            print(f"{barcode} : {len(response.content) / 1024:.0f} Ko enregistrés")
+
+
+def _inflate(document: dict) -> dict:
+    """Document synthétique (~80 Ko, plutôt moins qu'une vraie fiche OFF complète)."""
+    product = dict(document["product"])
+    for lang in LANGS:
+        product[f"product_name_{lang}"] = f"{product['product_name']} ({lang})"
+        product[f"ingredients_text_{lang}"] = product["ingredients_text"] * 2
+        product[f"ingredients_text_with_allergens_{lang}"] = product["ingredients_text"] * 2
+    images = dict(product["images"])
+    for i in range(2, 40):
+        images[str(i)] = images["1"]
+        for kind in ("front", "ingredients", "nutrition", "packaging"):
+            images[f"{kind}_{LANGS[i % len(LANGS)]}_{i}"] = images["front_fr"]
+    product["images"] = images
+    product["ingredients"] = [
+        {**ingredient, "ciqual_food_code": "2013", "ecobalyse_code": "x" * 20, "percent_max": 100, "percent_min": 0,
+         "ingredients": [dict(ingredient, rank=None) for _ in range(3)]}
+        for ingredient in product["ingredients"] * 8
+    ]
+    product["ecoscore_data"] = {
+        "adjustments": {lang: {"value": 0, "warning": "origins_are_100_percent_unknown"} for lang in LANGS},
+        "agribalyse": {f"co2_{step}": 0.1 for step in ("agriculture", "consumption", "distribution", "packaging", "processing", "transportation")},
+    }
+    product["nutriments"] = {
+        **product["nutriments"],
+        **{f"{key}_{suffix}": value for key, value in product["nutriments"].items()
+           for suffix in ("serving", "unit", "value", "prepared_100g", "label") if not key.endswith("_100g")},
+    }
+    return {**document, "product": product}
+
+
+def _project(document: dict) -> bytes:
+    fields = set(off_fields.OFF_FIELDS)
+    product = {k: v for k, v in document["product"].items() if k in fields}
+    return orjson.dumps({**document, "product": product})
+
+
+def _time_us(fn, payload: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--record", nargs="+", metavar="BARCODE", help="enregistre ces fiches depuis OFF")
+    args = parser.parse_args()
+
+    if args.record:
+        _record(args.record, args.fixtures)
+        return
+
+    recorded = sorted(args.fixtures.glob("*.json")) if args.fixtures.is_dir() else []
+    if recorded:
+        documents = {path.stem: json.loads(path.read_bytes()) for path in recorded}
+        print(f"{len(documents)} fiches enregistrées ({args.fixtures})")
+    else:
+        documents = {"synthétique": _inflate(json.loads(TEMPLATE.read_bytes()))}
+        print("Aucune fiche enregistrée : document synthétique (voir --record)")
+
+    print(f"{'fiche':<16} {'octets avant':>13} {'octets après':>13} {'json complet':>13} {'orjson projeté':>15}")
+    for name, document in documents.items():
+        full = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        projected = _project(document)
+        before = _time_us(json.loads, full, args.repeat)
+        after = _time_us(off_fields.decode_product, projected, args.repeat)
+        print(f"{name:<16} {len(full):>13,} {len(projected):>13,} {before:>10.0f} µs {after:>12.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark : taux de hit du cache produit avant/après une rafale d'approbations admin.
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\bench_product_cache.py [--products 5000] [--approvals 50]
+
+Simule le trafic de lecture (pages produit + alternatives, popularité en loi
+de puissance) sur le backend mémoire de fastapi-cache, puis une rafale
+d'approbations admin, et compare :
+- `clear`  : l'ancien comportement (FastAPICache.clear() à chaque écriture) ;
+- `cible`  : product_cache.invalidate_product (produit + (sous-)catégorie).
+Aucune base de données n'est nécessaire.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from fastapi_cache import FastAPICache  # noqa: E402
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+
+import product_cache  # noqa: E402
+
+PREFIX = "dznutri-cache"
+
+
+def _catalogue(n_products: int, n_subcategories: int):
+    products = []
+    for i in range(n_products):
+        sub = i % n_subcategories
+        products.append({
+            "barcode": f"613{i:010d}",
+            "category": f"cat-{sub // 5}",
+            "subcategory": f"sub-{sub}",
+        })
+    return products
+
+
+async def _read(product: dict, endpoint: str, backend: InMemoryBackend) -> bool:
+    """Une lecture : True si HIT ; sinon on « calcule » et on met en cache (MISS)."""
+    key = product_cache.barcode_key_builder(
+        None, f"{PREFIX}:{endpoint}", kwargs={"barcode": product["barcode"]}
+    )
+    if await backend.get(key) is not None:
+        return True
+    await backend.set(key, b"{}", 86400)
+    if endpoint == "alternatives":
+        await product_cache.tag_current_response(
+            barcode=product["barcode"], subcategory=product["subcategory"]
+        )
+    else:
+        await product_cache.tag_current_response(barcode=product["barcode"])
+    return False
+
+
+async def _traffic(products, n_requests: int, backend, rng: random.Random) -> float:
+    hits = 0
+    for _ in range(n_requests):
+        # Popularité très inégale : quelques produits concentrent les scans.
+        idx = min(int(rng.paretovariate(1.2)) - 1, len(products) - 1)
+        endpoint = "product" if rng.random() < 0.7 else "alternatives"
+        hits += await _read(products[idx * 7919 % len(products)], endpoint, backend)
+    return hits / n_requests
+
+
+async def _run(mode: str, args) -> tuple:
+    InMemoryBackend._store.clear()
+    product_cache._local_tags.clear()
+    backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=PREFIX)
+    products = _catalogue(args.products, args.subcategories)
+    rng = random.Random(args.seed)
+
+    await _traffic(products, args.requests, backend, rng)  # chauffe
+    before = await _traffic(products, args.requests, backend, rng)
+
+    for product in rng.sample(products, args.approvals):
+        if mode == "clear":
+            await FastAPICache.clear()
+        else:
+            await product_cache.invalidate_product(
+                product["barcode"], [product["category"]], [product["subcategory"]]
+            )
+
+    # Fenêtre courte juste après la rafale : c'est là que l'avalanche frappe Postgres.
+    after = await _traffic(products, args.window, backend, rng)
+    FastAPICache.reset()
+    return before, after
+
+
+async def main(args) -> None:
+    print(
+        f"{args.products} produits, {args.approvals} approbations, "
+        f"{args.requests} lectures de chauffe, {args.window} lectures après la rafale\n"
+    )
+    print(f"{'mode':<8}{'hit avant':>12}{'hit après':>12}")
+    for mode in ("clear", "cible"):
+        before, after = await _run(mode, args)
+        print(f"{mode:<8}{before:>12.1%}{after:>12.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--subcategories", type=int, default=100)
+    parser.add_argument("--approvals", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--window", type=int, default=2000, help="lectures mesurées après la rafale")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
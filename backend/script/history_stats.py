@@ -0,0 +1,60 @@
+"""Backfill et vérification de user_history_stats (compteurs de /api/history/stats).
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\history_stats.py backfill
+    .venv\\Scripts\\python.exe script\\history_stats.py check [--fix]
+
+- `backfill` : recalcule toute la table depuis scan_history (un INSERT ... SELECT
+  GROUP BY). À lancer une fois après la migration, sans risque à relancer.
+- `check` : compare chaque ligne aux compteurs recalculés et liste les écarts
+  (code de sortie 1 s'il y en a) ; `--fix` reconstruit les lignes fautives.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from database import AsyncSessionLocal, engine  # noqa: E402
+from auth import models as auth_models  # noqa: E402,F401 - enregistre UserTable pour les relations
+from bdproduitdz import history_stats  # noqa: E402
+
+
+async def backfill() -> int:
+    async with AsyncSessionLocal() as db:
+        rows = await history_stats.rebuild(db)
+    print(f"user_history_stats reconstruite ({rows} utilisateurs).")
+    return 0
+
+
+async def check(fix: bool) -> int:
+    async with AsyncSessionLocal() as db:
+        mismatches = await history_stats.check(db)
+        for user_id, expected, stored in mismatches:
+            diff = {k: (stored[k], expected[k]) for k in expected if stored[k] != expected[k]}
+            print(f"user {user_id} : (stocké, attendu) {diff}")
+        if not mismatches:
+            print("user_history_stats est cohérente.")
+            return 0
+        print(f"{len(mismatches)} utilisateurs incohérents.")
+        if fix:
+            await history_stats.rebuild(db, [user_id for user_id, _, _ in mismatches])
+            print("Lignes reconstruites.")
+            return 0
+        return 1
+
+
+async def main(args) -> int:
+    try:
+        return await (backfill() if args.command == "backfill" else check(args.fix))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["backfill", "check"])
+    parser.add_argument("--fix", action="store_true", help="check : reconstruit les lignes incohérentes")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,203 @@
+"""Importe un export Open Food Facts (JSONL ou CSV, gzip ou non) dans `produits`.
+
+    cd backend
+    .venv\\Scripts\\python.exe script\\import_off_dump.py openfoodfacts-products.jsonl.gz --country algeria
+    .venv\\Scripts\\python.exe script\\import_off_dump.py en.openfoodfacts.org.products.csv.gz --prefix 613 --update
+
+- Lecture en flux (bdproduitdz/off_dump.py) : le dump de plusieurs Go n'est
+  jamais chargé en mémoire, chaque fiche est réduite aux champs utiles.
+- Filtres `--country`, `--prefix`, `--category` (répétables) : tous les
+  critères donnés doivent être vérifiés, une valeur suffit par critère.
+- Même mapping que /api/product/{barcode} (off_fields.to_product_create) et
+  scoring par lots NumPy (batch_scoring.score_products).
+- Chargement PostgreSQL : COPY binaire (asyncpg) dans une table temporaire,
+  puis INSERT ... SELECT ... ON CONFLICT (barcode) dans `produits`, une
+  transaction par lot. Sans `--update`, les produits déjà en base ne sont pas
+  touchés ; avec `--update`, seules les fiches venues d'OFF (source), non
+  vérifiées et non ajoutées par un utilisateur sont réécrites (puis user_history_stats est reconstruite).
+- Reprise : après chaque lot validé, le nombre d'enregistrements traités est
+  écrit dans `<dump>.checkpoint.json` ; relancer la même commande reprend là.
+  `--restart` repart du début. Un gzip ne se parcourt pas à rebours : les
+  enregistrements déjà traités sont relus, mais pas décodés.
+- Les codes-barres insérés sont retirés du cache négatif des workers
+  (bdproduitdz/negative_cache.py) si Redis (REDIS_URL) est joignable. Sans
+  Redis, rien de grave : l'API lit la base avant ce cache.
+- Débit affiché après chaque lot (enregistrements lus/s et produits chargés/s).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import text  # noqa: E402
+
+from database import AsyncSessionLocal, engine  # noqa: E402
+from auth import models as auth_models  # noqa: E402,F401 - enregistre UserTable pour les relations
+from bdproduitdz import crud, history_stats, negative_cache, off_dump  # noqa: E402
+from redis_client import set_redis_client  # noqa: E402
+
+DEFAULT_BATCH_SIZE = 5000
+STAGING_TABLE = "produits_import"
+
+_COLUMNS = ", ".join(off_dump.COPY_COLUMNS)
+_CREATE_STAGING = (
+    f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} AS "
+    f"SELECT {_COLUMNS} FROM produits WITH NO DATA"
+)
+# (xmax = 0) : ligne insérée (et non mise à jour) par cet INSERT ... ON CONFLICT.
+_MERGE = (
+    f"INSERT INTO produits ({_COLUMNS}, is_verified) "
+    f"SELECT {_COLUMNS}, false FROM {STAGING_TABLE} "
+    "ON CONFLICT (barcode) {action} RETURNING barcode, (xmax = 0) AS inserted"
+)
+_UPDATE_ACTION = (
+    "DO UPDATE SET "
+    + ", ".join(f"{c} = EXCLUDED.{c}" for c in off_dump.COPY_COLUMNS if c != "barcode")
+    + ", updated_at = now() "
+    "WHERE produits.source = 'openfoodfacts' AND produits.is_verified IS NOT TRUE AND produits.user_id IS NULL"
+)
+
+
+def _load_checkpoint(path: str, dump: str, restart: bool) -> dict:
+    fresh = {"dump": os.path.abspath(dump), "records": 0, "inserted": 0, "updated": 0, "rejected": 0}
+    if restart or not os.path.exists(path):
+        return fresh
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("dump") != fresh["dump"]:
+        sys.exit(f"{path} concerne un autre dump ({checkpoint.get('dump')}) : --restart ou --checkpoint")
+    return {**fresh, **checkpoint}
+
+
+def _save_checkpoint(path: str, checkpoint: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)  # atomique : jamais de checkpoint à moitié écrit
+
+
+async def _store_unknown_additifs(unknown) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            await crud.store_or_increment_pending_additifs(db, list(unknown), occurrences=dict(unknown))
+            await db.commit()
+    except Exception as e:
+        print(f"Erreur sauvegarde additifs inconnus : {e}")
+
+
+async def _connect_redis():
+    """Client Redis des workers, pour purger leur cache négatif (None si injoignable)."""
+    try:
+        from redis import asyncio as aioredis
+
+        redis = aioredis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True, socket_connect_timeout=2
+        )
+        await redis.ping()
+    except Exception as exc:  # noqa: BLE001
+        print(f"Redis injoignable, cache négatif non purgé (l'API lit la base avant ce cache) : {exc}")
+        return None
+    set_redis_client(redis)
+    return redis
+
+
+async def _load_batch(conn, rows, update: bool) -> tuple:
+    """COPY du lot dans la table temporaire puis fusion dans `produits`. Retourne (codes insérés, mis à jour)."""
+    await conn.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+    raw = (await conn.get_raw_connection()).driver_connection
+    await raw.copy_records_to_table(STAGING_TABLE, records=rows, columns=off_dump.COPY_COLUMNS)
+    merged = (await conn.execute(text(_MERGE.format(action=_UPDATE_ACTION if update else "DO NOTHING")))).all()
+    inserted = [row.barcode for row in merged if row.inserted]
+    return inserted, len(merged) - len(inserted)
+
+
+async def run(args) -> None:
+    checkpoint_path = args.checkpoint or f"{args.dump}.checkpoint.json"
+    checkpoint = _load_checkpoint(checkpoint_path, args.dump, args.restart)
+    if checkpoint["records"]:
+        print(f"Reprise après {checkpoint['records']} enregistrements ({checkpoint_path}).")
+
+    keep = off_dump.make_filter(args.country, args.prefix, args.category)
+    redis = None if args.dry_run else await _connect_redis()
+    async with AsyncSessionLocal() as db:
+        penalty_map = await crud.get_additifs_penalty(db, force_refresh=True)
+
+    started = time.perf_counter()
+    read = loaded = 0
+    records = checkpoint["records"]
+    batch = []
+
+    async with engine.connect() as conn:
+        if not args.dry_run:
+            await conn.execute(text(_CREATE_STAGING))
+            await conn.commit()
+
+        async def flush() -> None:
+            nonlocal loaded
+            rows, unknown, rejected = off_dump.prepare_batch(batch, penalty_map)
+            inserted, updated = [], 0
+            if not args.dry_run and rows:
+                inserted, updated = await _load_batch(conn, rows, args.update)
+                await conn.commit()
+                await negative_cache.forget(inserted)
+            if unknown and not args.dry_run:
+                await _store_unknown_additifs(unknown)
+            loaded += len(rows)
+            checkpoint.update(
+                records=records,
+                inserted=checkpoint["inserted"] + len(inserted),
+                updated=checkpoint["updated"] + updated,
+                rejected=checkpoint["rejected"] + rejected,
+            )
+            if not args.dry_run:
+                _save_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{records} enregistrements : +{len(inserted)} insérés, {updated} mis à jour, {rejected} rejetés "
+                f"({read / elapsed:.0f} lus/s, {loaded / elapsed:.0f} produits/s)"
+            )
+            batch.clear()
+
+        for records, product in off_dump.iter_products(args.dump, skip=checkpoint["records"]):
+            read += 1
+            if product is None:
+                checkpoint["rejected"] += 1
+            elif keep(product):
+                batch.append(product)
+                if len(batch) >= args.batch_size:
+                    await flush()
+        await flush()
+
+    if args.update and checkpoint["updated"] and not args.dry_run:
+        # Des scores de produits déjà scannés ont pu changer.
+        async with AsyncSessionLocal() as db:
+            await history_stats.rebuild(db)
+
+    await engine.dispose()
+    if redis is not None:
+        await redis.aclose()
+    elapsed = time.perf_counter() - started
+    print(
+        f"\nTerminé en {elapsed:.1f} s : {checkpoint['inserted']} produits insérés, "
+        f"{checkpoint['updated']} mis à jour, {checkpoint['rejected']} fiches rejetées "
+        f"({read / elapsed:.0f} enregistrements/s)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dump", help="export OFF : .jsonl[.gz] ou .csv[.gz]")
+    parser.add_argument("--country", action="append", default=[], help="ex. algeria ou en:algeria")
+    parser.add_argument("--prefix", action="append", default=[], help="préfixe de code-barres, ex. 613")
+    parser.add_argument("--category", action="append", default=[], help="ex. en:beverages")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--update", action="store_true", help="réécrit les fiches OFF non vérifiées déjà en base")
+    parser.add_argument("--checkpoint", help="fichier de reprise (défaut : <dump>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore le checkpoint existant")
+    parser.add_argument("--dry-run", action="store_true", help="lit, filtre et score sans rien écrire")
+    asyncio.run(run(parser.parse_args()))
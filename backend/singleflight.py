@@ -0,0 +1,166 @@
+"""Coalescence des appels concurrents identiques (« single-flight »).
+
+Quand des centaines d'utilisateurs scannent en même temps un code-barres
+inconnu, chaque requête déclencherait sa propre récupération Open Food Facts,
+son propre calcul de score et sa propre insertion (qui finissent en doublons
+sur l'index unique `produits.barcode`). Ici, la première requête pour une clé
+devient le « leader » : les suivantes attendent son résultat au lieu de refaire
+le travail.
+
+Deux niveaux :
+- `SingleFlight` : registre en mémoire, par worker (asyncio).
+- `run_once` : ajoute un verrou Redis (SET NX PX) pour coordonner plusieurs
+  workers/instances. Sans Redis, on se limite à la coalescence par worker.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from redis_client import get_redis_client
+
+logger = logging.getLogger("dznutri.singleflight")
+
+# Durée de vie du verrou Redis : doit couvrir un fetch OFF (timeout 10 s) +
+# scoring + insertion. Si le leader meurt, le verrou expire tout seul.
+LOCK_TTL_MS = int(os.getenv("SINGLEFLIGHT_LOCK_TTL_MS", "15000"))
+LOCK_POLL_SECONDS = 0.1
+
+# Suppression du verrou seulement s'il nous appartient encore (token identique).
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderCancelled(Exception):
+    """Le leader a été annulé (client déconnecté) : les suiveurs doivent réessayer."""
+
+
+class SingleFlight:
+    """Registre des appels en cours, indexé par clé (un par worker)."""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Exécute `fn` une seule fois par clé ; les appels concurrents partagent son résultat.
+
+        Les exceptions du leader (ex. HTTPException 404/503) sont propagées à
+        tous les suiveurs. Si le leader est annulé, les suiveurs relancent
+        l'appel et l'un d'eux devient le nouveau leader.
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.stats["followers"] += 1
+            try:
+                return await asyncio.shield(future)
+            except LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["leaders"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled(key))
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+            # Évite l'avertissement « exception was never retrieved » sans suiveur.
+            if future.done() and not future.cancelled():
+                future.exception()
+
+
+_local = SingleFlight()
+
+
+async def _acquire_redis_lock(redis: Any, lock_key: str, token: str) -> bool:
+    try:
+        return bool(await redis.set(lock_key, token, nx=True, px=LOCK_TTL_MS))
+    except Exception as exc:  # noqa: BLE001 - Redis en panne : on travaille sans verrou
+        logger.warning("Verrou Redis %s indisponible : %s", lock_key, exc)
+        return True
+
+
+async def _release_redis_lock(redis: Any, lock_key: str, token: str) -> None:
+    try:
+        await redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Libération du verrou Redis %s impossible : %s", lock_key, exc)
+
+
+async def _run_with_redis_lock(
+    key: str,
+    fn: Callable[[], Awaitable[Any]],
+    recheck: Optional[Callable[[], Awaitable[Any]]],
+) -> Any:
+    redis = get_redis_client()
+    if redis is None:
+        return await fn()
+
+    lock_key = f"dznutri-lock:{key}"
+    token = uuid.uuid4().hex
+    if await _acquire_redis_lock(redis, lock_key, token):
+        try:
+            return await fn()
+        finally:
+            await _release_redis_lock(redis, lock_key, token)
+
+    # Un autre worker est leader : on attend qu'il publie son résultat
+    # (via `recheck`, ex. relecture en base) ou que son verrou disparaisse.
+    deadline = asyncio.get_running_loop().time() + LOCK_TTL_MS / 1000.0
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+        if recheck is not None:
+            result = await recheck()
+            if result is not None:
+                return result
+        try:
+            if not await redis.exists(lock_key):
+                break
+        except Exception:  # noqa: BLE001
+            break
+
+    if recheck is not None:
+        result = await recheck()
+        if result is not None:
+            return result
+    # Le leader n'a rien produit (produit introuvable, erreur OFF...) : on fait
+    # le travail nous-mêmes plutôt que de renvoyer une erreur inventée.
+    return await fn()
+
+
+async def run_once(
+    key: str,
+    fn: Callable[[], Awaitable[Any]],
+    recheck: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> Any:
+    """Coalesce `fn` par clé dans ce worker, et entre workers si Redis est disponible.
+
+    `recheck` est appelé par les workers non-leaders pendant l'attente : s'il
+    renvoie autre chose que None, ce résultat est utilisé directement ; une
+    exception qu'il lève (échec connu du leader, ex. 404) est propagée.
+    """
+    return await _local.do(key, lambda: _run_with_redis_lock(key, fn, recheck))
+
+
+def get_stats() -> Dict[str, int]:
+    """Compteurs leaders/suiveurs de ce worker (pour le monitoring)."""
+    return dict(_local.stats)
@@ -39,3 +39,13 @@ async def setup_database():
 async def client():
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
+
+@pytest_asyncio.fixture
+async def db_session():
+    async with TestingSessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def session_factory():
+    """Fabrique de sessions de test (pour le code qui ouvre ses propres sessions)."""
+    return TestingSessionLocal
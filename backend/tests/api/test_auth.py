@@ -5,7 +5,9 @@ from httpx import AsyncClient
 async def test_health_check(client: AsyncClient):
     response = await client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy", "service": "dznutri-api"}
+    body = response.json()
+    assert {k: body[k] for k in ("status", "service")} == {"status": "healthy", "service": "dznutri-api"}
+    assert body["open_food_facts"]["state"] == "closed"
 
 @pytest.mark.asyncio
 async def test_register_and_login(client: AsyncClient):
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from auth.models import UserTable
+from bdproduitdz import history_buffer, history_stats
+from bdproduitdz.models import Product, ScanHistory
+
+
+async def _login(client: AsyncClient, username: str) -> dict:
+    register = await client.post("/auth/register", json={
+        "email": f"{username}@example.com", "username": username,
+        "password": "testpassword123", "confirm_password": "testpassword123",
+    })
+    return {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+
+async def _products(db_session, prefix: str, count: int, scores=None):
+    scores = scores or [60] * count
+    products = [Product(barcode=f"{prefix}{i:02d}", product_name=f"P{i}", custom_score=s) for i, s in enumerate(scores)]
+    db_session.add_all(products)
+    await db_session.commit()
+    return [p.id for p in (await db_session.execute(
+        select(Product).where(Product.barcode.like(f"{prefix}%")).order_by(Product.barcode)
+    )).scalars()]
+
+
+async def _rows(session_factory, product_ids):
+    async with session_factory() as db:
+        return (await db.execute(
+            select(ScanHistory).where(ScanHistory.product_id.in_(product_ids)).order_by(ScanHistory.product_id)
+        )).scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_rescan_updates_the_single_history_row(client: AsyncClient, db_session, session_factory):
+    headers = await _login(client, "historyupsert")
+    [product_id] = await _products(db_session, "61300000040", 1)
+
+    for _ in range(3):
+        response = await client.post(f"/api/history/{product_id}", headers=headers)
+        assert response.status_code == 200
+
+    rows = await _rows(session_factory, [product_id])
+    assert len(rows) == 1 and rows[0].scanned_at is not None
+
+    # Horloge de la base en retard sur l'UTC du client (base non UTC) : le scan
+    # en direct prend now() de la base et remonte quand même le produit.
+    ahead = datetime.utcnow() + timedelta(hours=3)
+    async with session_factory() as db:
+        await db.execute(ScanHistory.__table__.update().where(ScanHistory.product_id == product_id).values(scanned_at=ahead))
+        await db.commit()
+    await client.post(f"/api/history/{product_id}", headers=headers)
+    [row] = await _rows(session_factory, [product_id])
+    assert row.scanned_at < ahead
+
+
+@pytest.mark.asyncio
+async def test_offline_batch_upserts_and_never_moves_entries_back(client: AsyncClient, db_session, session_factory):
+    headers = await _login(client, "historybatch")
+    first, second = await _products(db_session, "61300000041", 2)
+    old = datetime(2026, 1, 1, 12, 0)
+
+    response = await client.post("/api/history/batch", headers=headers, json={"scans": [
+        {"product_id": first, "scanned_at": old.isoformat()},
+        {"product_id": first, "scanned_at": (old + timedelta(hours=1)).isoformat()},
+        {"product_id": second, "scanned_at": (old + timedelta(hours=2)).isoformat() + "+02:00"},
+        {"product_id": 999999},
+    ]})
+    assert response.status_code == 200 and response.json()["saved"] == 2
+
+    rows = await _rows(session_factory, [first, second])
+    assert [r.scanned_at for r in rows] == [old + timedelta(hours=1), old]
+
+    # Un vieux scan rejoué ne fait pas redescendre l'entrée.
+    await client.post("/api/history/batch", headers=headers, json={"scans": [
+        {"product_id": first, "scanned_at": old.isoformat()},
+    ]})
+    rows = await _rows(session_factory, [first])
+    assert [r.scanned_at for r in rows] == [old + timedelta(hours=1)]
+
+    history = (await client.get("/api/history", headers=headers)).json()
+    assert [h["id"] for h in history] == [first, second]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_buffers_scans_and_reads_see_them(client: AsyncClient, db_session, session_factory, monkeypatch):
+    buffer = history_buffer.HistoryBuffer(session_factory, interval_ms=60_000)
+    monkeypatch.setattr(history_buffer, "HISTORY_WRITE_BEHIND", True)
+    monkeypatch.setattr(history_buffer, "_buffer", buffer)
+    reader, other = await _login(client, "bufferreader"), await _login(client, "bufferother")
+    first, second = await _products(db_session, "61300000042", 2)
+
+    for product_id in (first, second, first):
+        assert (await client.post(f"/api/history/{product_id}", headers=reader)).status_code == 200
+    await client.post(f"/api/history/{second}", headers=other)
+
+    assert await _rows(session_factory, [first, second]) == []
+    assert buffer.get_stats()["pending"] == 3
+
+    # La lecture écrit d'abord les scans en attente de ce seul utilisateur.
+    history = (await client.get("/api/history", headers=reader)).json()
+    assert [h["id"] for h in history] == [first, second]
+    assert buffer.get_stats()["pending"] == 1
+
+    # Arrêt de l'application : le reste du tampon est écrit.
+    await history_buffer.stop()
+    assert len(await _rows(session_factory, [first, second])) == 3
+
+
+@pytest.mark.asyncio
+async def test_stats_are_maintained_incrementally(client: AsyncClient, db_session, session_factory):
+    headers = await _login(client, "historystats")
+    ids = await _products(db_session, "61300000043", 5, scores=[90, 60, 30, 10, None])
+
+    for product_id in ids + ids[:2]:  # deux re-scans : pas de double comptage
+        await client.post(f"/api/history/{product_id}", headers=headers)
+    stats = (await client.get("/api/history/stats", headers=headers)).json()
+    assert stats == {
+        "total_scans": 5,
+        "average_score": 48,
+        "distribution": {"excellent": 1, "bon": 1, "mediocre": 1, "mauvais": 1},
+    }
+
+    await client.delete(f"/api/history/product/{ids[0]}", headers=headers)
+    async with session_factory() as db:
+        # Le produit à 10 passe à 80 (ex : correction de la fiche par un admin).
+        await history_stats.shift_product_score(db, ids[3], 10, 80)
+        await db.commit()
+    stats = (await client.get("/api/history/stats", headers=headers)).json()
+    assert stats["total_scans"] == 4 and stats["average_score"] == 57
+    assert stats["distribution"] == {"excellent": 1, "bon": 1, "mediocre": 1, "mauvais": 0}
+
+    # Le vérificateur compare au recalcul complet (ici : le score en base est resté à 10).
+    async with session_factory() as db:
+        user_id = (await db.execute(select(UserTable.id).where(UserTable.username == "historystats"))).scalar_one()
+        [(_, expected, stored)] = [m for m in await history_stats.check(db) if m[0] == user_id]
+        assert (expected["mauvais"], stored["mauvais"]) == (1, 0)
+        await history_stats.rebuild(db, [user_id])
+        assert not [m for m in await history_stats.check(db) if m[0] == user_id]
+    stats = (await client.get("/api/history/stats", headers=headers)).json()
+    assert stats["distribution"]["mauvais"] == 1
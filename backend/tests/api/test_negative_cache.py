@@ -0,0 +1,129 @@
+import httpx
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bdproduitdz import crud as bd_crud
+from bdproduitdz import negative_cache
+from bdproduitdz.models import Product, Submission
+from bdproduitdz.schemas import AdminProductApproval
+from circuit_breaker import CircuitBreaker
+import singleflight
+from routers import products as products_router
+
+
+@pytest.fixture
+def off_calls(monkeypatch):
+    negative_cache.clear()
+    FastAPICache.init(InMemoryBackend(), prefix="dznutri-cache")
+    calls = []
+
+    async def fake_fetch(barcode):
+        calls.append(barcode)
+        return None
+
+    monkeypatch.setattr(products_router, "_fetch_off_product", fake_fetch)
+    yield calls
+    negative_cache.clear()
+    InMemoryBackend._store.clear()
+    FastAPICache.reset()
+
+
+@pytest.mark.asyncio
+async def test_unknown_barcode_is_remembered_until_a_submission_is_approved(client: AsyncClient, db_session, off_calls):
+    barcode = "6130000000905"
+
+    for _ in range(3):
+        response = await client.get(f"/api/product/{barcode}")
+        assert response.status_code == 404
+    assert off_calls == [barcode]
+
+    # La synchro groupée profite du même cache.
+    response = await client.post("/api/products/batch", json={"barcodes": [barcode]})
+    assert response.json()["not_found"] == [barcode]
+    assert off_calls == [barcode]
+
+    # Session comme en production (expire_on_commit=False).
+    async with AsyncSession(db_session.bind, expire_on_commit=False) as db:
+        submission = Submission(barcode=barcode, productName="Hammoud Boualem")
+        db.add(submission)
+        await db.commit()
+        await bd_crud.approve_submission(
+            db, submission.id, AdminProductApproval(product_name="Hammoud Boualem", brand="Hamoud")
+        )
+
+    response = await client.get(f"/api/product/{barcode}")
+    assert response.status_code == 200
+    assert response.json()["product"]["product_name"] == "Hammoud Boualem"
+
+
+@pytest.mark.asyncio
+async def test_product_in_database_wins_over_a_stale_entry(client: AsyncClient, db_session, off_calls):
+    # Import d'un dump sans Redis : l'entrée d'un autre worker n'a pas été purgée.
+    barcode = "6130000000914"
+    await negative_cache.remember(barcode)
+    db_session.add(Product(barcode=barcode, product_name="Ifri citron"))
+    await db_session.commit()
+
+    response = await client.get(f"/api/product/{barcode}")
+    assert response.status_code == 200 and off_calls == []
+
+
+@pytest.mark.asyncio
+async def test_follower_worker_trusts_the_leaders_404(client: AsyncClient, monkeypatch, off_calls):
+    barcode = "6130000000915"
+
+    class LockedElsewhere:
+        """Redis vu par ce worker : le verrou single-flight est tenu par un autre worker."""
+
+        async def set(self, *args, **kwargs):
+            await negative_cache.remember(barcode)  # le leader reçoit 404 d'OFF pendant l'attente
+            return False
+
+        async def exists(self, key):
+            return True
+
+    monkeypatch.setattr(singleflight, "get_redis_client", lambda: LockedElsewhere())
+    monkeypatch.setattr(singleflight, "LOCK_POLL_SECONDS", 0.01)
+
+    response = await client.get(f"/api/product/{barcode}")
+    assert response.status_code == 404 and off_calls == []
+
+
+@pytest.mark.asyncio
+async def test_off_errors_are_not_remembered(client: AsyncClient, monkeypatch):
+    negative_cache.clear()
+    FastAPICache.init(InMemoryBackend(), prefix="dznutri-cache")
+    monkeypatch.setattr(products_router, "off_breaker", CircuitBreaker("openfoodfacts"))
+    barcode = "6130000000913"
+
+    # Pages d'erreur en JSON, sans "status": 1 : OFF en panne, pas produit inconnu.
+    for status in (503, 403):
+        transport = httpx.MockTransport(lambda request: httpx.Response(status, json={"status": 0}))
+        monkeypatch.setattr(products_router, "_off_client", httpx.AsyncClient(transport=transport))
+
+        response = await client.get(f"/api/product/{barcode}")
+        assert response.status_code == 503
+        response = await client.post("/api/products/batch", json={"barcodes": [barcode]})
+        assert response.json()["unavailable"] == [barcode] and response.json()["not_found"] == []
+        assert not await negative_cache.is_unknown(barcode)
+
+    negative_cache.clear()
+    InMemoryBackend._store.clear()
+    FastAPICache.reset()
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_with_jitter(monkeypatch):
+    negative_cache.clear()
+    monkeypatch.setattr(negative_cache, "NEGATIVE_CACHE_TTL_SECONDS", 100)
+    ttls = {negative_cache._ttl() for _ in range(200)}
+    assert min(ttls) >= 80 and max(ttls) <= 120 and len(ttls) > 10
+
+    monkeypatch.setattr(negative_cache, "NEGATIVE_CACHE_TTL_SECONDS", 0)
+    await negative_cache.remember("6130000000912")
+    negative_cache._local["6130000000912"] = 0.0  # échéance dépassée
+    assert not await negative_cache.is_unknown("6130000000912")
+    assert "6130000000912" not in negative_cache._local
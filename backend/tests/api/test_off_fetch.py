@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from bdproduitdz import off_fields
+from circuit_breaker import CircuitBreaker
+from routers import products as products_router
+
+FULL_DOCUMENT = json.loads((Path(__file__).parents[1] / "fixtures" / "off_product_full.json").read_text(encoding="utf-8"))
+
+
+class FakeOff:
+    """Faux OFF v2 : applique `fields=` comme le vrai serveur et note les requêtes."""
+
+    def __init__(self, document, drop=()):
+        self.document = document
+        self.drop = set(drop)  # champs que la projection « oublie »
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        fields = request.url.params.get("fields")
+        product = self.document["product"]
+        if fields:
+            product = {k: v for k, v in product.items() if k in fields.split(",") and k not in self.drop}
+        return httpx.Response(200, json={**self.document, "product": product})
+
+
+@pytest.fixture
+def fake_off(monkeypatch):
+    def install(server):
+        monkeypatch.setattr(products_router, "_off_client", httpx.AsyncClient(transport=httpx.MockTransport(server)))
+        return server
+    monkeypatch.setattr(products_router, "off_breaker", CircuitBreaker("openfoodfacts", min_calls=3, open_seconds=30))
+    return install
+
+
+@pytest.mark.asyncio
+async def test_projected_fetch_maps_like_the_full_document(fake_off, db_session):
+    server = fake_off(FakeOff(FULL_DOCUMENT))
+
+    projected = await products_router._fetch_off_product("6130234000154")
+
+    assert len(server.requests) == 1
+    assert server.requests[0].url.params["fields"] == off_fields.FIELDS_PARAM
+    assert set(projected) <= set(off_fields.OFF_FIELDS)
+    assert "images" not in projected and "ingredients" not in projected
+
+    from_projection = await products_router._build_product_from_off(db_session, "6130234000154", projected)
+    from_full = await products_router._build_product_from_off(db_session, "6130234000154", FULL_DOCUMENT["product"])
+    assert from_projection.model_dump(exclude={"fetched_at"}) == from_full.model_dump(exclude={"fetched_at"})
+
+
+@pytest.mark.asyncio
+async def test_missing_required_field_falls_back_to_full_document(fake_off):
+    server = fake_off(FakeOff(FULL_DOCUMENT, drop={"nutriments"}))
+
+    product = await products_router._fetch_off_product("6130234000154")
+
+    assert [r.url.params.get("fields") for r in server.requests] == [off_fields.FIELDS_PARAM, None]
+    assert product["nutriments"]["energy-kcal_100g"] == 43
+
+
+@pytest.mark.asyncio
+async def test_french_name_only_is_enough(fake_off):
+    french_only = {k: v for k, v in FULL_DOCUMENT["product"].items() if k != "product_name"}
+    server = fake_off(FakeOff({**FULL_DOCUMENT, "product": {**french_only, "product_name_fr": "Jus d'orange"}}))
+
+    product = await products_router._fetch_off_product("6130234000154")
+
+    assert len(server.requests) == 1 and product["product_name_fr"] == "Jus d'orange"
+
+
+@pytest.mark.asyncio
+async def test_unknown_product_and_non_json_answer(fake_off):
+    fake_off(lambda request: httpx.Response(200, json={"status": 0, "status_verbose": "product not found"}))
+    assert await products_router._fetch_off_product("0000000000000") is None
+
+    fake_off(lambda request: httpx.Response(502, text="<html>Bad gateway</html>"))
+    with pytest.raises(products_router.HTTPException) as exc:
+        await products_router._fetch_off_product("6130234000154")
+    assert exc.value.status_code == 503
+
+    # Réponse de limitation en JSON : échec pour le disjoncteur, pas un « produit inconnu ».
+    fake_off(lambda request: httpx.Response(429, json={"status": 0, "status_verbose": "rate limit"}))
+    with pytest.raises(products_router.HTTPException) as exc:
+        await products_router._fetch_off_product("6130234000154")
+    assert exc.value.status_code == 503
+    assert products_router.get_off_health()["failures"] == 2
+
+
+@pytest.mark.asyncio
+async def test_breaker_fails_fast_during_an_outage(fake_off):
+    calls = []
+
+    def down(request):
+        calls.append(request)
+        return httpx.Response(503, text="maintenance")
+
+    fake_off(down)
+    for _ in range(3):
+        with pytest.raises(products_router.HTTPException):
+            await products_router._fetch_off_product("6130234000154")
+    assert products_router.get_off_health()["state"] == "open"
+
+    started = time.perf_counter()
+    with pytest.raises(products_router.HTTPException) as exc:
+        await products_router._fetch_off_product("6130234000154")
+    assert exc.value.status_code == 503 and time.perf_counter() - started < 0.05
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_deadline_and_hedged_request(fake_off, monkeypatch):
+    calls = []
+
+    async def first_call_hangs(request):
+        calls.append(request)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json=FULL_DOCUMENT)
+
+    fake_off(first_call_hangs)
+    monkeypatch.setattr(products_router, "OFF_DEADLINE_SECONDS", 0.2)
+    started = time.perf_counter()
+    with pytest.raises(products_router.HTTPException) as exc:
+        await products_router._fetch_off_product("6130234000154")
+    assert exc.value.status_code == 503 and time.perf_counter() - started < 0.5
+
+    # Requête couverte : la seconde requête répond avant la première.
+    calls.clear()
+    monkeypatch.setattr(products_router, "OFF_HEDGE_AFTER_MS", 50)
+    product = await products_router._fetch_off_product("6130234000154")
+    assert product["code"] == "6130234000154" and len(calls) == 2
@@ -0,0 +1,106 @@
+import asyncio
+import importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from httpx import AsyncClient
+from sqlalchemy import select, text
+
+import off_refresh
+from bdproduitdz.models import PRODUCT_SOURCE_ADMIN, PRODUCT_SOURCE_OFF, Product
+
+
+@pytest.fixture
+def refresher(monkeypatch, session_factory):
+    FastAPICache.init(InMemoryBackend(), prefix="dznutri-cache")
+    calls = []
+
+    async def fake_fetch(barcode):
+        calls.append(barcode)
+        return {
+            "code": barcode,
+            "product_name": "Cherbet citron",
+            "nutriments": {"energy-kcal_100g": 38, "sugars_100g": 8.5},
+            "additives_tags": ["en:e330"],
+            "categories": "Boissons",
+        }
+
+    instance = off_refresh.OffRefresher(fake_fetch, session_factory, max_age_hours=24, rate_per_second=100)
+    instance.calls = calls
+    monkeypatch.setattr(off_refresh, "_refresher", instance)
+    yield instance
+    InMemoryBackend._store.clear()
+    FastAPICache.reset()
+
+
+@pytest.mark.asyncio
+async def test_stale_off_product_is_served_then_refreshed_once(client: AsyncClient, db_session, session_factory, refresher):
+    old = datetime.utcnow() - timedelta(days=30)
+    db_session.add_all([
+        Product(barcode="6130000000301", product_name="Cherbet", custom_score=40,
+                nutriments={"energy-kcal_100g": 60}, source=PRODUCT_SOURCE_OFF, fetched_at=old),
+        Product(barcode="6130000000302", product_name="Fraîche", source=PRODUCT_SOURCE_OFF, fetched_at=datetime.utcnow()),
+        Product(barcode="6130000000303", product_name="Corrigée", source=PRODUCT_SOURCE_ADMIN, fetched_at=old),
+    ])
+    await db_session.commit()
+
+    response = await client.get("/api/product/6130000000301")
+    assert response.json()["product"]["product_name"] == "Cherbet"  # ligne locale, sans attendre OFF
+    await client.post("/api/products/batch", json={"barcodes": ["6130000000301", "6130000000302", "6130000000303"]})
+    assert refresher.get_stats()["scheduled"] == 1 and refresher.get_stats()["coalesced"] == 1
+
+    refresher.start()
+    await asyncio.wait_for(refresher._queue.join(), 5)
+    await refresher.stop()
+
+    assert refresher.calls == ["6130000000301"]
+    async with session_factory() as db:
+        product = (await db.execute(select(Product).where(Product.barcode == "6130000000301"))).scalar_one()
+    assert product.product_name == "Cherbet citron"
+    assert product.nutriments == {"energy-kcal_100g": 38, "sugars_100g": 8.5}
+    assert product.source == PRODUCT_SOURCE_OFF and product.fetched_at > old
+    assert product.custom_score != 40
+
+    response = await client.get("/api/product/6130000000301")
+    assert response.json()["product"]["product_name"] == "Cherbet citron"
+
+
+@pytest.mark.asyncio
+async def test_refresh_rate_is_limited():
+    instance = off_refresh.OffRefresher(rate_per_second=50)
+    started = asyncio.get_running_loop().time()
+    for _ in range(5):
+        await instance._wait_for_slot()
+    assert asyncio.get_running_loop().time() - started >= 0.07
+
+
+@pytest.mark.asyncio
+async def test_backfill_leaves_products_edited_before_the_migration_alone(db_session, refresher):
+    path = Path(__file__).parents[2] / "alembic" / "versions" / "d4f2b8a6c1e3_source_produits.py"
+    spec = importlib.util.spec_from_file_location("source_produits", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    old = datetime.utcnow() - timedelta(days=90)
+    # État d'avant la migration : pas de source ; la 2e fiche a été corrigée par un admin.
+    db_session.add_all([
+        Product(barcode="6130000000311", product_name="Jamais touchée", created_at=old),
+        Product(barcode="6130000000312", product_name="Corrigée par l'admin", created_at=old,
+                updated_at=old + timedelta(days=1)),
+    ])
+    await db_session.commit()
+    for statement in migration.BACKFILL:
+        await db_session.execute(text(statement))
+    await db_session.commit()
+
+    untouched, edited = (await db_session.execute(
+        select(Product).where(Product.barcode.in_(["6130000000311", "6130000000312"])).order_by(Product.barcode)
+    )).scalars().all()
+    assert untouched.source == PRODUCT_SOURCE_OFF and refresher.is_stale(untouched)
+    assert edited.source is None and not refresher.is_stale(edited)
+    assert not await refresher.refresh("6130000000312")
+    await db_session.refresh(edited)
+    assert edited.product_name == "Corrigée par l'admin"
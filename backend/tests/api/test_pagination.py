@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import null, select
+
+from auth.models import UserTable
+from bdproduitdz.models import Favorite, Notification, Product
+
+
+async def _walk(client: AsyncClient, url: str, params: dict, headers=None):
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = await client.get(url, params=query, headers=headers)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_search_cursor_walks_every_product_once(client: AsyncClient, db_session):
+    scores = [50, 80, 80, 80, 10, None, 65, 80, 30]
+    db_session.add_all([
+        Product(barcode=f"61300000030{i:02d}", product_name=f"P{i}", category="Pagination", custom_score=s)
+        for i, s in enumerate(scores)
+    ])
+    await db_session.commit()
+
+    pages = await _walk(client, "/api/search", {"category": "Pagination", "limit": 4})
+    walked = [p["barcode"] for page in pages for p in page]
+
+    offset_mode = (await client.get("/api/search", params={"category": "Pagination", "limit": 50})).json()
+    assert walked == [p["barcode"] for p in offset_mode]
+    assert len(walked) == len(scores)
+    # Scores décroissants, produits sans score en dernier.
+    assert [p["custom_score"] for page in pages for p in page][-1] is None
+
+
+@pytest.mark.asyncio
+async def test_notifications_cursor_and_invalid_cursor(client: AsyncClient, db_session):
+    await client.post("/auth/register", json={
+        "email": "pagination@example.com", "username": "pagination",
+        "password": "testpassword123", "confirm_password": "testpassword123",
+    })
+    login = await client.post("/auth/login", json={"email": "pagination@example.com", "password": "testpassword123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    user = (await db_session.execute(select(UserTable).where(UserTable.email == "pagination@example.com"))).scalar_one()
+
+    base = datetime(2026, 1, 1)
+    # Deux notifications à la même seconde : l'id départage.
+    created = [base + timedelta(minutes=m) for m in (0, 1, 1, 2, 3)]
+    db_session.add_all([
+        Notification(user_id=user.id, title=f"N{i}", message="m", created_at=c)
+        for i, c in enumerate(created)
+    ])
+    await db_session.commit()
+
+    pages = await _walk(client, "/api/notifications", {"limit": 2}, headers)
+    titles = [n["title"] for page in pages for n in page]
+    assert titles == ["N4", "N3", "N2", "N1", "N0"]
+
+    bad = await client.get("/api/notifications", params={"cursor": "pas-un-curseur"}, headers=headers)
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_favorites_cursor_with_null_dates(client: AsyncClient, db_session):
+    await client.post("/auth/register", json={
+        "email": "favnull@example.com", "username": "favnull",
+        "password": "testpassword123", "confirm_password": "testpassword123",
+    })
+    login = await client.post("/auth/login", json={"email": "favnull@example.com", "password": "testpassword123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    user = (await db_session.execute(select(UserTable).where(UserTable.email == "favnull@example.com"))).scalar_one()
+
+    products = [Product(barcode=f"61300000031{i:02d}", product_name=f"F{i}") for i in range(6)]
+    db_session.add_all(products)
+    await db_session.flush()
+    base = datetime(2026, 1, 1)
+    # Favoris sans date (NULLS FIRST, comme le DESC de Postgres) : en tête, une seule fois chacun.
+    saved = [base, base + timedelta(minutes=1), null(), base + timedelta(minutes=1), null(), null()]
+    db_session.add_all([
+        Favorite(user_id=user.id, product_id=p.id, saved_at=s) for p, s in zip(products, saved)
+    ])
+    await db_session.commit()
+
+    pages = await _walk(client, "/api/favorites", {"limit": 2}, headers)
+    walked = [p["product_name"] for page in pages for p in page]
+
+    assert walked == ["F5", "F4", "F2", "F3", "F1", "F0"]
@@ -0,0 +1,64 @@
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from httpx import AsyncClient
+
+import product_cache
+from bdproduitdz.models import Product
+
+
+@pytest.fixture
+def memory_cache():
+    InMemoryBackend._store.clear()
+    FastAPICache.init(InMemoryBackend(), prefix="dznutri-cache")
+    yield InMemoryBackend._store
+    InMemoryBackend._store.clear()
+    product_cache._local_tags.clear()
+    FastAPICache.reset()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_only_evicts_the_touched_product_and_its_category(
+    client: AsyncClient, db_session, memory_cache
+):
+    db_session.add_all([
+        Product(barcode="6130000001001", product_name="Hamoud", category="Boissons", subcategory="Sodas", custom_score=30),
+        Product(barcode="6130000001002", product_name="Selecto", category="Boissons", subcategory="Sodas", custom_score=35),
+        Product(barcode="6130000001003", product_name="Bimo", category="Biscuits", subcategory="Gaufrettes", custom_score=40),
+    ])
+    await db_session.commit()
+
+    for barcode in ("6130000001001", "6130000001003"):
+        assert (await client.get(f"/api/product/{barcode}")).status_code == 200
+        assert (await client.get(f"/api/product/{barcode}/alternatives")).status_code == 200
+
+    cached = set(memory_cache)
+    assert {
+        "dznutri-cache:product:6130000001001",
+        "dznutri-cache:alternatives:6130000001001",
+        "dznutri-cache:product:6130000001003",
+        "dznutri-cache:alternatives:6130000001003",
+    } <= cached
+
+    # Un admin modifie Selecto (même sous-catégorie que Hamoud).
+    deleted = await product_cache.invalidate_product("6130000001002", ["Boissons"], ["Sodas"])
+
+    assert deleted == 1
+    assert "dznutri-cache:alternatives:6130000001001" not in memory_cache
+    assert "dznutri-cache:product:6130000001001" in memory_cache
+    assert "dznutri-cache:product:6130000001003" in memory_cache
+    assert "dznutri-cache:alternatives:6130000001003" in memory_cache
+
+
+@pytest.mark.asyncio
+async def test_query_variants_are_evicted_with_their_barcode(client: AsyncClient, db_session, memory_cache):
+    db_session.add(Product(barcode="6130000001004", product_name="Ifri", category="Eaux", custom_score=90))
+    await db_session.commit()
+
+    await client.get("/api/product/6130000001004")
+    await client.get("/api/product/6130000001004?lang=ar")
+    variants = [k for k in memory_cache if k.startswith("dznutri-cache:product:6130000001004")]
+    assert len(variants) == 2
+
+    await product_cache.invalidate_product("6130000001004", ["Eaux"])
+    assert not [k for k in memory_cache if k.startswith("dznutri-cache:product:6130000001004")]
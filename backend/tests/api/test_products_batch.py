@@ -0,0 +1,46 @@
+import pytest
+from httpx import AsyncClient
+
+from routers import products as products_router
+from bdproduitdz.models import Product
+
+
+@pytest.mark.asyncio
+async def test_batch_lookup_mixes_local_hits_and_off_misses(client: AsyncClient, db_session, monkeypatch):
+    db_session.add(Product(barcode="6130000000011", product_name="Lben", custom_score=70))
+    await db_session.commit()
+
+    fetched = []
+
+    async def fake_fetch(barcode):
+        fetched.append(barcode)
+        if barcode == "6130000000028":
+            return {
+                "code": barcode,
+                "product_name": "Cherbet",
+                "nutriments": {"energy-kcal_100g": 40, "sugars_100g": 9},
+                "categories": "Boissons",
+            }
+        return None
+
+    monkeypatch.setattr(products_router, "_fetch_off_product", fake_fetch)
+
+    response = await client.post(
+        "/api/products/batch",
+        json={"barcodes": ["6130000000011", "6130000000028", "0000000000000", "6130000000011"]},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["products"]) == ["6130000000011", "6130000000028"]
+    assert body["products"]["6130000000028"]["product_name"] == "Cherbet"
+    assert body["not_found"] == ["0000000000000"]
+    assert body["unavailable"] == []
+    # Le produit local n'est jamais demandé à OFF.
+    assert sorted(fetched) == ["0000000000000", "6130000000028"]
+
+    # Le produit OFF a été inséré : un second appel est entièrement local.
+    fetched.clear()
+    response = await client.post("/api/products/batch", json={"barcodes": ["6130000000028"]})
+    assert response.json()["products"]["6130000000028"]["product_name"] == "Cherbet"
+    assert fetched == []
@@ -0,0 +1,76 @@
+import json
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+import push
+from auth.models import UserTable
+
+
+class FakeExpo:
+    """Faux endpoint Expo /push/send : tickets "ok", sauf tokens désinscrits et pannes programmées."""
+
+    def __init__(self, unregistered=(), failures=0):
+        self.unregistered = set(unregistered)
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.failures:
+            self.failures -= 1
+            return httpx.Response(503, json={"errors": [{"code": "INTERNAL_SERVER_ERROR"}]})
+        messages = json.loads(request.content)
+        self.batches.append(len(messages))
+        return httpx.Response(200, json={"data": [
+            {"status": "error", "message": "not registered", "details": {"error": "DeviceNotRegistered"}}
+            if message["to"] in self.unregistered else {"status": "ok", "id": f"ticket-{i}"}
+            for i, message in enumerate(messages)
+        ]})
+
+
+def _dispatcher(expo: FakeExpo, session_factory) -> push.PushDispatcher:
+    return push.PushDispatcher(
+        url="http://expo.test/push/send", session_factory=session_factory,
+        transport=httpx.MockTransport(expo), linger=0.01, backoff=0.01,
+    )
+
+
+@pytest.mark.asyncio
+async def test_messages_are_sent_in_chunks_and_dead_tokens_cleared(db_session, session_factory):
+    db_session.add_all([
+        UserTable(username="pushalive", email="pushalive@example.com", userPushToken="ExponentPushToken[alive]"),
+        UserTable(username="pushdead", email="pushdead@example.com", userPushToken="ExponentPushToken[dead]"),
+    ])
+    await db_session.commit()
+    expo = FakeExpo(unregistered={"ExponentPushToken[dead]"})
+    dispatcher = _dispatcher(expo, session_factory)
+
+    for i in range(249):
+        dispatcher.enqueue(f"ExponentPushToken[{i}]", "Titre", "Message")
+    dispatcher.enqueue("ExponentPushToken[dead]", "Titre", "Message")
+    dispatcher.start()
+    await dispatcher.stop()
+
+    assert expo.batches == [100, 100, 50]
+    stats = dispatcher.get_stats()
+    assert stats["sent"] == 249 and stats["failed"] == 1 and stats["tokens_cleared"] == 1
+    async with session_factory() as db:
+        tokens = dict((await db.execute(
+            select(UserTable.username, UserTable.userPushToken).where(UserTable.username.in_(["pushalive", "pushdead"]))
+        )).all())
+    assert tokens == {"pushalive": "ExponentPushToken[alive]", "pushdead": None}
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried_with_backoff(session_factory):
+    expo = FakeExpo(failures=2)
+    dispatcher = _dispatcher(expo, session_factory)
+
+    dispatcher.enqueue("ExponentPushToken[a]", "Titre", "Message", {"productId": 1})
+    dispatcher.start()
+    await dispatcher.stop()
+
+    assert expo.batches == [1]
+    stats = dispatcher.get_stats()
+    assert stats["sent"] == 1 and stats["retries"] == 2 and stats["requests"] == 3
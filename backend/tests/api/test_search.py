@@ -0,0 +1,72 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from bdproduitdz import models, text_search
+from bdproduitdz.models import Product
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_by_similarity_then_score(client: AsyncClient, db_session):
+    db_session.add_all([
+        Product(barcode="6130000002001", product_name="Crème dessert vanille", brand="Danone", custom_score=20),
+        Product(barcode="6130000002002", product_name="Yaourt crémeux", brand="Soummam", custom_score=80),
+        Product(barcode="6130000002003", product_name="Crème dessert chocolat", brand="Trèfle", custom_score=55),
+    ])
+    await db_session.commit()
+
+    response = await client.get("/api/search", params={"q": "creme dessert"})
+
+    assert response.status_code == 200
+    names = [p["product_name"] for p in response.json()]
+    # Accents ignorés ; à similarité égale, le meilleur score d'abord.
+    assert names == ["Crème dessert chocolat", "Crème dessert vanille"]
+
+
+@pytest.mark.asyncio
+async def test_numeric_query_is_a_barcode_prefix(client: AsyncClient, db_session):
+    db_session.add_all([
+        Product(barcode="6139990000011", product_name="Jus Rouiba", custom_score=40),
+        Product(barcode="6139990000028", product_name="Jus Ifruit", custom_score=60),
+        Product(barcode="6130001399900", product_name="Autre", custom_score=90),
+        Product(barcode="6139990000035", product_name="Jus sans score", custom_score=None),
+        Product(barcode="6139990000042", product_name="Jus noté 0", custom_score=0),
+    ])
+    await db_session.commit()
+
+    response = await client.get("/api/search", params={"q": "613999"})
+
+    # Sans score en dernier, comme le NULLS LAST de la requête PostgreSQL.
+    assert [p["barcode"] for p in response.json()] == [
+        "6139990000028", "6139990000011", "6139990000042", "6139990000035",
+    ]
+
+
+def test_arabic_normalization_and_postgres_query_shape():
+    assert text_search.normalize_search_text("حَلِيب أَطْلَس") == text_search.normalize_search_text("حليب اطلس")
+
+    sql = str(
+        text_search._postgres_query(select(models.Product), "lben")
+        .compile(dialect=postgresql.dialect())
+    )
+    assert "dznutri_search_norm(coalesce(produits.product_name, '')" in sql
+    assert "<%" in sql and "word_similarity" in sql
+    assert "produits.custom_score DESC NULLS LAST" in sql
+
+
+@pytest.mark.asyncio
+async def test_list_endpoints_return_summaries_unless_detail_full(client: AsyncClient, db_session):
+    db_session.add(Product(
+        barcode="6130000002101", product_name="Couscous moyen", brand="Sim", category="Projection",
+        custom_score=70, nutriments={"energy-kcal_100g": 350}, ingredients_text="semoule de blé dur",
+    ))
+    await db_session.commit()
+
+    summary = (await client.get("/api/search", params={"category": "Projection"})).json()[0]
+    assert summary["product_name"] == "Couscous moyen" and summary["custom_score"] == 70
+    assert "nutriments" not in summary and "ingredients_text" not in summary
+
+    full = (await client.get("/api/search", params={"category": "Projection", "detail": "full"})).json()[0]
+    assert full["nutriments"] == {"energy-kcal_100g": 350}
+    assert full["ingredients_text"] == "semoule de blé dur"
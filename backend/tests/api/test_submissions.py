@@ -0,0 +1,146 @@
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import delete, select
+
+from bdproduitdz import additives_parser, image_cache, media, models, submission_jobs
+
+INGREDIENTS = "Ingrédients : eau, sucre, acidifiant : acide citrique (E330), arômes."
+NUTRITION = "Valeurs nutritionnelles pour 100 ml\nÉnergie 180 kJ / 43 kcal\nGlucides 10,5 g\nSel 0,01 g"
+
+
+@pytest_asyncio.fixture
+async def offline_media(monkeypatch, tmp_path, session_factory):
+    """Stockage et OCR locaux : une « photo » est un fichier texte. Cache des photos vidé."""
+    monkeypatch.setattr(media, "MEDIA_BACKEND", "local")
+    monkeypatch.setattr(media, "OCR_BACKEND", "local")
+    monkeypatch.setattr(media, "LOCAL_UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(additives_parser, "_matcher", None)
+    async with session_factory() as db:
+        await db.execute(delete(models.ImageCache))
+        await db.commit()
+    image_cache.clear()
+    yield
+    image_cache.clear()
+
+
+async def _submit(client: AsyncClient, username: str, barcode: str):
+    register = await client.post("/auth/register", json={
+        "email": f"{username}@example.com", "username": username,
+        "password": "testpassword123", "confirm_password": "testpassword123",
+    })
+    headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+    return await client.post(
+        "/api/submission",
+        headers=headers,
+        data={"barcode": barcode, "typeProduct": "Boissons", "productName": "Jus"},
+        files={
+            "image_front": ("front.jpg", b"photo de face", "image/jpeg"),
+            "image_ingredients": ("ing.jpg", INGREDIENTS.encode(), "image/jpeg"),
+            "image_nutrition": ("nut.jpg", NUTRITION.encode(), "image/jpeg"),
+        },
+    )
+
+
+async def _load(session_factory, submission_id: int):
+    async with session_factory() as db:
+        submission = await db.get(models.Submission, submission_id)
+        job = (await db.execute(
+            select(models.SubmissionJob).where(models.SubmissionJob.submission_id == submission_id)
+        )).scalar_one()
+        return submission, job
+
+
+@pytest.mark.asyncio
+async def test_submission_returns_immediately_and_is_processed_in_background(
+    client: AsyncClient, db_session, session_factory, offline_media
+):
+    db_session.add(models.Additif(e_number="E330", name="Acide citrique", danger_level=1))
+    await db_session.commit()
+
+    response = await _submit(client, "jobsubmitter", "6130000003001")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "processing" and body["image_front_url"] is None
+
+    assert await submission_jobs.run_pending(session_factory) == 1
+
+    submission, job = await _load(session_factory, body["id"])
+    assert submission.status == "pending"
+    assert submission.image_front_url.startswith(media.LOCAL_URL_PREFIX)
+    assert submission.parsed_nutriments["energy_kcal_100g"] == 43.0
+    assert submission.found_additives == [{"e_number": "E330", "name": "Acide citrique", "danger_level": 1}]
+    assert "--- NUTRITION ---" in submission.ocr_ingredients_text
+    assert job.status == "done" and job.image_front is None
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_is_retried_with_backoff_then_abandoned(
+    client: AsyncClient, session_factory, monkeypatch, offline_media
+):
+    monkeypatch.setattr(submission_jobs, "MAX_ATTEMPTS", 2)
+
+    def failing_upload(content, kind):
+        raise media.MediaError("Cloudinary indisponible")
+
+    monkeypatch.setattr(media, "upload_image", failing_upload)
+    submission_id = (await _submit(client, "jobretry", "6130000003002")).json()["id"]
+
+    assert await submission_jobs.run_pending(session_factory) == 1
+    submission, job = await _load(session_factory, submission_id)
+    assert job.status == "queued" and job.attempts == 1
+    assert job.run_after > datetime.utcnow()
+    assert "Cloudinary indisponible" in job.last_error
+    assert submission.status == "processing"
+
+    # Pas encore l'heure du nouvel essai.
+    assert await submission_jobs.run_pending(session_factory) == 0
+
+    async with session_factory() as db:
+        stored = await db.get(models.SubmissionJob, job.id)
+        stored.run_after = datetime.utcnow()
+        await db.commit()
+    assert await submission_jobs.run_pending(session_factory) == 1
+
+    submission, job = await _load(session_factory, submission_id)
+    assert job.status == "failed" and job.attempts == 2
+    assert job.image_front == b"photo de face"  # conservée pour une reprise manuelle
+    assert submission.status == "failed"
+    assert "Cloudinary indisponible" in submission.processing_error
+
+
+@pytest.mark.asyncio
+async def test_same_photos_skip_upload_and_ocr(client: AsyncClient, session_factory, monkeypatch, offline_media):
+    calls = {"upload": 0, "ocr": 0}
+    upload_image, detect_text_batch = media.upload_image, media.detect_text_batch
+
+    def counting_upload(content, kind):
+        calls["upload"] += 1
+        return upload_image(content, kind)
+
+    def counting_ocr(urls):
+        calls["ocr"] += len(urls)
+        return detect_text_batch(urls)
+
+    monkeypatch.setattr(media, "upload_image", counting_upload)
+    monkeypatch.setattr(media, "detect_text_batch", counting_ocr)
+
+    first_id = (await _submit(client, "cachefirst", "6130000003003")).json()["id"]
+    await submission_jobs.run_pending(session_factory)
+    assert calls == {"upload": 3, "ocr": 2}
+
+    # Même photos : cache mémoire vidé, la table image_cache suffit.
+    image_cache.clear()
+    second_id = (await _submit(client, "cachesecond", "6130000003004")).json()["id"]
+    await submission_jobs.run_pending(session_factory)
+    assert calls == {"upload": 3, "ocr": 2}
+
+    first, _ = await _load(session_factory, first_id)
+    second, job = await _load(session_factory, second_id)
+    assert second.status == "pending" and job.status == "done"
+    assert second.image_nutrition_url == first.image_nutrition_url
+    assert second.parsed_nutriments == first.parsed_nutriments
+    assert second.ocr_ingredients_text == first.ocr_ingredients_text
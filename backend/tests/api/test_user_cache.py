@@ -0,0 +1,41 @@
+import pytest
+from httpx import AsyncClient
+
+from auth import crud as auth_crud
+from auth import jwt as auth_jwt
+from auth import user_cache
+
+
+@pytest.mark.asyncio
+async def test_authenticated_user_is_cached_until_push_token_changes(client: AsyncClient, monkeypatch):
+    user_cache.clear()
+    register = await client.post("/auth/register", json={
+        "email": "usercache@example.com", "username": "usercache",
+        "password": "testpassword123", "confirm_password": "testpassword123",
+    })
+    token = register.json()["access_token"]
+    assert auth_jwt.verify_token(token)["uid"] is not None
+    headers = {"Authorization": f"Bearer {token}"}
+
+    lookups = []
+    real_get_user_by_id = auth_crud.get_user_by_id
+
+    async def counting_get_user_by_id(db, user_id):
+        lookups.append(user_id)
+        return await real_get_user_by_id(db, user_id)
+
+    monkeypatch.setattr(auth_crud, "get_user_by_id", counting_get_user_by_id)
+
+    for _ in range(3):
+        assert (await client.get("/api/notifications", headers=headers)).status_code == 200
+    assert len(lookups) == 1
+
+    me = (await client.get("/auth/me", headers=headers)).json()
+    assert me["username"] == "usercache"
+    assert me.get("hashed_password") is None
+
+    # Changement de push-token : l'instantané en cache est invalidé.
+    await client.post("/api/me/push-token", json={"expo_push_token": "ExponentPushToken[abc]"}, headers=headers)
+    me = (await client.get("/auth/me", headers=headers)).json()
+    assert me["userPushToken"] == "ExponentPushToken[abc]"
+    assert len(lookups) == 2
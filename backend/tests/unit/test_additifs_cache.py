@@ -0,0 +1,126 @@
+import pytest
+
+from bdproduitdz import additifs_cache
+
+
+class FakeRedis:
+    """Sous-ensemble de redis.asyncio utilisé par le cache des additifs."""
+
+    def __init__(self):
+        self.store = {}
+        self.published = []
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value):
+        self.store[key] = value
+
+    async def incr(self, key):
+        self.store[key] = str(int(self.store.get(key) or 0) + 1)
+        return int(self.store[key])
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    """Deux « workers » partageant le même Redis, avec une base simulée."""
+    redis = FakeRedis()
+    db_table = {"e250": 3.0}
+    loads = []
+
+    async def fake_load(db):
+        loads.append(dict(db_table))
+        return dict(db_table)
+
+    def reset_worker():
+        additifs_cache._state.update(data=None, ts=0.0, version=0, checked=0.0)
+
+    monkeypatch.setattr(additifs_cache, "get_redis_client", lambda: redis)
+    monkeypatch.setattr(additifs_cache, "load_additifs_penalty_from_db", fake_load)
+    monkeypatch.setattr(additifs_cache, "VERSION_CHECK_SECONDS", 0.0)
+    reset_worker()
+    yield redis, db_table, loads, reset_worker
+    reset_worker()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_shared_between_workers(shared):
+    redis, _, loads, reset_worker = shared
+
+    first = await additifs_cache.get_additifs_penalty(db=None)
+    assert first == {"e250": 3.0}
+    assert len(loads) == 1
+    version = additifs_cache.get_additifs_version()
+    assert version == 1
+
+    # Un autre worker démarre : il reprend l'instantané Redis sans toucher la base.
+    reset_worker()
+    assert await additifs_cache.get_additifs_penalty(db=None) == {"e250": 3.0}
+    assert additifs_cache.get_additifs_version() == version
+    assert len(loads) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bumps_version_and_reloads(shared):
+    redis, db_table, loads, _ = shared
+    await additifs_cache.get_additifs_penalty(db=None)
+
+    db_table["e250"] = 4.0
+    await additifs_cache.invalidate_additifs_cache()
+    assert redis.published[-1] == (additifs_cache.INVALIDATION_CHANNEL, 2)
+
+    assert await additifs_cache.get_additifs_penalty(db=None) == {"e250": 4.0}
+    assert additifs_cache.get_additifs_version() == 2
+    assert len(loads) == 2
+
+    # Version inchangée : pas de nouveau chargement.
+    await additifs_cache.get_additifs_penalty(db=None)
+    assert len(loads) == 2
+
+
+@pytest.mark.asyncio
+async def test_fallback_version_never_matches_a_redis_version(shared, monkeypatch):
+    redis, db_table, _, _ = shared
+    await additifs_cache.get_additifs_penalty(db=None)
+
+    class Down:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+    # Redis coupé : la table modifiée est rechargée en mémoire.
+    monkeypatch.setattr(additifs_cache, "get_redis_client", lambda: Down())
+    monkeypatch.setattr(additifs_cache, "ADDITIFS_TTL_SECONDS", 0.0)
+    db_table["e250"] = 4.0
+    assert await additifs_cache.get_additifs_penalty(db=None) == {"e250": 4.0}
+    assert additifs_cache.get_additifs_version() < 0
+
+    # Redis revient ; entre-temps un autre worker a publié la version 2.
+    redis.store[additifs_cache.VERSION_KEY] = "2"
+    redis.store[additifs_cache.SNAPSHOT_KEY] = '{"version": 2, "data": {"e250": 5.0}}'
+    monkeypatch.setattr(additifs_cache, "get_redis_client", lambda: redis)
+    monkeypatch.setattr(additifs_cache, "VERSION_CHECK_SECONDS", 3600.0)
+    assert await additifs_cache.get_additifs_penalty(db=None) == {"e250": 5.0}
+    assert additifs_cache.get_additifs_version() == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_fallback_without_redis(monkeypatch):
+    async def fake_load(db):
+        return {"e102": 2.0}
+
+    monkeypatch.setattr(additifs_cache, "get_redis_client", lambda: None)
+    monkeypatch.setattr(additifs_cache, "load_additifs_penalty_from_db", fake_load)
+    additifs_cache._state.update(data=None, ts=0.0, version=0, checked=0.0)
+
+    assert await additifs_cache.get_additifs_penalty(db=None) == {"e102": 2.0}
+    assert additifs_cache.get_additifs_version() == -1
+    # Contenu identique après rechargement forcé : la version ne bouge pas.
+    await additifs_cache.get_additifs_penalty(db=None, force_refresh=True)
+    assert additifs_cache.get_additifs_version() == -1
+    additifs_cache._state.update(data=None, ts=0.0, version=0, checked=0.0)
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+from bdproduitdz.additives_parser import AdditiveMatcher
+
+ADDITIFS = [
+    SimpleNamespace(id=1, e_number="E330", name="Acide citrique", danger_level=1, sin_number="SIN 330", ins_number=None),
+    SimpleNamespace(id=2, e_number="E415", name="Gomme xanthane", danger_level=1, sin_number=None, ins_number=None),
+    SimpleNamespace(id=3, e_number="E250", name="Nitrite de sodium", danger_level=3, sin_number=None, ins_number=None),
+    SimpleNamespace(id=4, e_number="E150d", name="Caramel au sulfite d'ammonium", danger_level=2, sin_number=None, ins_number=None),
+    SimpleNamespace(id=5, e_number=None, name="Acide ascorbique", danger_level=0, sin_number=None, ins_number="INS 300"),
+]
+
+
+def test_codes_and_names_in_one_pass():
+    matcher = AdditiveMatcher(ADDITIFS, version=7)
+    text = (
+        "Ingredients: eau, ACIDE CITRIQUE, gomme\nxanthane, conservateur: nitrite "
+        "de sodium (E-250), colorant: caramel (e150D), antioxydant: INS.300, SIN 330"
+    )
+
+    found = matcher.find(text)
+
+    # Ordre d'apparition, sans doublon (E250 trouvé par nom puis par code).
+    assert [a.id for a in found] == [1, 2, 3, 4, 5]
+    assert found[2].danger_level == 3
+    assert matcher.version == 7
+
+
+def test_accents_word_boundaries_and_unknown_codes():
+    matcher = AdditiveMatcher(ADDITIFS)
+
+    assert [a.id for a in matcher.find("Acide Citrique, Acide ascorbiqué")] == [1, 5]
+    # Pas de correspondance au milieu d'un mot ni pour un code inconnu.
+    assert matcher.find("superacide citriques, E999, E3300") == []
+    assert matcher.find("") == []
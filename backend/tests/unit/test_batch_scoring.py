@@ -0,0 +1,94 @@
+import math
+import random
+
+import pytest
+
+from bdproduitdz import batch_scoring, scoring
+
+PENALTIES = {"e330": 1.0, "e322": 1.0, "e250": 3.0, "e621": 2.0, "e951": 2.0, "e415": 1.0}
+CATEGORIES = [
+    None, "", "boissons", "Beverages", "matières grasses", "fromages", "Eau de source",
+    "Snacks sucrés", "beurre", "huiles", "Cheese", "soda", "Biscuits",
+]
+ADDITIVES = ["en:e330", "en:e322", "en:e250", "en:e621", "en:e951", "en:e415", "en:e999", "e1442", ""]
+
+
+def _random_value(rng, high):
+    kind = rng.random()
+    if kind < 0.1:
+        return None
+    if kind < 0.2:
+        return str(round(rng.uniform(0, high), 2)).replace(".", ",")
+    if kind < 0.25:
+        return 0
+    return round(rng.uniform(0, high), rng.choice([0, 1, 2, 3]))
+
+
+def _random_product(rng):
+    nutriments = {}
+    for key, high in [
+        ("energy-kcal_100g", 900), ("energy-kj_100g", 3800), ("saturated-fat_100g", 60),
+        ("fat_100g", 100), ("sugars_100g", 80), ("salt_100g", 5), ("sodium_100g", 2),
+        ("fiber_100g", 15), ("proteins_100g", 40), ("saturated-fat", 30), ("sugars", 50),
+    ]:
+        if rng.random() < 0.7:
+            nutriments[key] = _random_value(rng, high)
+    product = {
+        "nutriments": nutriments if rng.random() < 0.95 else None,
+        "nova_group": rng.choice([None, 1, 2, 3, 4, "4", "x"]),
+        "additives_tags": rng.sample(ADDITIVES, rng.randint(0, 4)),
+        "ecoscore_grade": rng.choice([None, "a", "C", ""]),
+        "category": rng.choice(CATEGORIES),
+    }
+    if rng.random() < 0.2:
+        product["fruits_percent"] = rng.choice([10, 45, 65, 80, 85, "90"])
+    if rng.random() < 0.2:
+        product["labels_tags"] = rng.choice([["en:organic"], ["fr:bio"], ["en:vegan"]])
+    return product
+
+
+def _same(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return sorted(a) == sorted(b)
+    return a == b and type(a) is type(b)
+
+
+@pytest.mark.asyncio
+async def test_batch_engine_matches_per_product_scoring(monkeypatch):
+    async def fake_penalties(db, force_refresh=False):
+        return PENALTIES
+
+    stored = []
+
+    async def fake_store(db, additives, occurrences=None):
+        stored.extend(additives)
+
+    monkeypatch.setattr(scoring.crud, "get_additifs_penalty", fake_penalties)
+    monkeypatch.setattr(scoring.crud, "store_or_increment_pending_additifs", fake_store)
+
+    rng = random.Random(20261017)
+    products = [_random_product(rng) for _ in range(3000)]
+
+    expected = [await scoring.calculate_score(None, dict(p)) for p in products]
+    actual, unknown = batch_scoring.score_products(products, PENALTIES)
+
+    for product, exp, got in zip(products, expected, actual):
+        assert _same(exp, got), (product, exp, got)
+
+    # Les additifs inconnus sont comptés une fois par produit concerné.
+    assert sum(unknown.values()) == len(stored)
+    assert set(unknown) == set(stored)
+
+
+def test_points_match_threshold_loop_on_boundaries():
+    import numpy as np
+
+    for name, table in batch_scoring._T.items():
+        thresholds = list(getattr(scoring, name))
+        probes = sorted({t + d for t in thresholds for d in (-0.5, 0.0, 0.5)} | {-1.0, 0.0, 1e9})
+        got = batch_scoring._points(np.array(probes), table)
+        assert [int(x) for x in got] == [scoring.get_points_from_thresholds(v, thresholds) for v in probes], name
@@ -0,0 +1,60 @@
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(clock):
+    return CircuitBreaker("off", window_seconds=10, min_calls=4, error_rate=0.5, p95_ms=1000, open_seconds=30, clock=clock)
+
+
+def test_error_rate_opens_then_a_probe_closes():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(0.1, ok)
+    assert breaker.state == OPEN
+    assert not breaker.allow() and breaker.stats["rejected"] == 1
+
+    clock.now += 31
+    assert breaker.allow()  # un seul appel d'essai
+    assert breaker.snapshot()["state"] == HALF_OPEN and not breaker.allow()
+    breaker.record(0.05, True)
+    assert breaker.state == CLOSED and breaker.snapshot()["window_calls"] == 0
+
+
+def test_slow_calls_open_and_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for duration in (0.2, 0.2, 0.2, 2.5):
+        breaker.allow()
+        breaker.record(duration, True)
+    assert breaker.state == OPEN and "p95" in breaker.reason
+
+    clock.now += 31
+    assert breaker.allow()
+    breaker.record(0.1, False)
+    assert breaker.state == OPEN and breaker.stats["trips"] == 2
+
+
+def test_old_calls_leave_the_window_and_cancelled_probe_is_released():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        breaker.record(0.1, False)
+    clock.now += 11
+    breaker.record(0.1, False)
+    assert breaker.state == CLOSED  # les 3 premiers échecs sont sortis de la fenêtre
+
+    for _ in range(3):
+        breaker.record(0.1, False)
+    clock.now += 31
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+import pytest
+
+import executors
+from executors import BoundedExecutor
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_does_not_starve_other_kinds_and_reports_its_queue():
+    uploads, crypto = BoundedExecutor("uploads", 1), BoundedExecutor("crypto", 1)
+    release = threading.Event()
+    try:
+        # Une rafale d'uploads bloquants : 1 en cours, 2 en file.
+        burst = [asyncio.ensure_future(uploads.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+
+        # Le pool crypto reste disponible.
+        assert await asyncio.wait_for(crypto.run(sum, [1, 2]), timeout=1) == 3
+
+        stats = uploads.get_stats()
+        assert stats["running"] == 1 and stats["queue_depth"] == 2
+        assert stats["max_queue_depth"] >= 2
+
+        release.set()
+        assert await asyncio.gather(*burst) == [True, True, True]
+        stats = uploads.get_stats()
+        assert stats["completed"] == 3 and stats["queue_depth"] == 0
+        assert stats["max_wait_ms"] > 0
+    finally:
+        release.set()
+        uploads.shutdown()
+        crypto.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_errors_are_counted_and_propagated():
+    with pytest.raises(ZeroDivisionError):
+        await executors.run("ocr", lambda: 1 / 0)
+    assert executors.get_stats()["ocr"]["failed"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_the_queue_and_the_pool_comes_back():
+    pool = BoundedExecutor("uploads", 1)
+    release = threading.Event()
+    running = asyncio.ensure_future(pool.run(release.wait, 5))
+    queued = [asyncio.ensure_future(pool.run(sum, [1])) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    pool.shutdown()
+    results = await asyncio.gather(*queued, return_exceptions=True)
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+    stats = pool.get_stats()
+    assert stats["queue_depth"] == 0 and stats["cancelled"] == 2
+
+    # Second démarrage de l'application : le pool est recréé.
+    assert await asyncio.wait_for(pool.run(sum, [1, 2]), timeout=1) == 3
+    release.set()
+    assert await running is True
+    pool.shutdown()
@@ -0,0 +1,32 @@
+import json
+import os
+
+import pytest
+
+from bdproduitdz.parser import parse_nutritional_info_improved
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "fixtures")
+
+
+def _golden_cases():
+    with open(os.path.join(FIXTURES, "ocr_nutrition.txt"), encoding="utf-8") as f:
+        lines = [line for line in f if not line.startswith("#")]
+    texts = [block.strip() for block in "".join(lines).split("\n---\n") if block.strip()]
+    with open(os.path.join(FIXTURES, "ocr_nutrition.golden.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    assert len(texts) == len(expected)
+    return list(zip(texts, expected))
+
+
+@pytest.mark.parametrize("text,expected", _golden_cases())
+def test_golden_corpus(text, expected):
+    # Régénérer avec script/bench_nutrition_parser.py --write-golden (et relire le diff).
+    assert parse_nutritional_info_improved(text) == expected
+
+
+def test_energy_prefers_kcal_and_value_on_next_line():
+    parsed = parse_nutritional_info_improved("Énergie 2217 kJ / 530 kcal\nFibres\n3,1 g\nSodium 400 mg")
+
+    assert parsed["energy_kcal_100g"] == 530.0
+    assert parsed["fiber_100g"] == 3.1
+    assert parsed["sodium_100g"] == 0.4 and parsed["salt_100g"] == 1.0
@@ -0,0 +1,40 @@
+import pytest
+
+from bdproduitdz import media, ocr
+from bdproduitdz.fake_vision import FakeVisionServer
+
+
+@pytest.fixture
+def vision_server(monkeypatch):
+    with FakeVisionServer({"https://img/ing.jpg": "Ingrédients : eau, E330", "https://img/nut.jpg": "Sel 0,1 g"}) as server:
+        monkeypatch.setattr(ocr, "_client", server.client())
+        yield server
+
+
+def test_one_submission_is_one_rpc(vision_server, monkeypatch):
+    monkeypatch.setattr(media, "OCR_BACKEND", "vision")
+
+    texts = media.detect_text_batch(["https://img/ing.jpg", "https://img/nut.jpg"])
+
+    assert texts == ["Ingrédients : eau, E330", "Sel 0,1 g"]
+    assert vision_server.calls == 1 and vision_server.images == 2
+
+
+def test_image_error_raises_and_legacy_helper_returns_message(vision_server):
+    with pytest.raises(ocr.OcrError, match="introuvable"):
+        ocr.detect_text_batch(["https://img/ing.jpg", "https://img/floue.jpg"])
+
+    assert ocr.detect_text_from_url("https://img/floue.jpg").startswith("Erreur OCR :")
+
+
+def test_client_is_created_once_per_process(monkeypatch):
+    created = []
+    monkeypatch.setattr(ocr, "_client", None)
+    monkeypatch.setattr(ocr.os.path, "exists", lambda path: True)
+    monkeypatch.setattr(
+        ocr.vision.ImageAnnotatorClient, "from_service_account_json",
+        staticmethod(lambda path: created.append(path) or object()),
+    )
+
+    assert ocr.get_client() is ocr.get_client()
+    assert created == [ocr.KEY_PATH]
@@ -0,0 +1,81 @@
+import gzip
+import json
+from pathlib import Path
+
+import orjson
+
+from bdproduitdz import off_dump, off_fields, scoring
+
+FULL_PRODUCT = json.loads((Path(__file__).parents[1] / "fixtures" / "off_product_full.json").read_text(encoding="utf-8"))["product"]
+PENALTIES = {"e330": 1.0, "e322": 1.0, "e250": 3.0}
+
+
+def _jsonl(tmp_path, products, name="dump.jsonl.gz"):
+    path = tmp_path / name
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for product in products:
+            f.write(product if isinstance(product, str) else json.dumps(product))
+            f.write("\n")
+    return str(path)
+
+
+def test_jsonl_is_streamed_projected_and_resumable(tmp_path):
+    other = {"code": "3017620422003", "product_name": "Pâte à tartiner", "countries_tags": ["en:france"], "brands": ""}
+    path = _jsonl(tmp_path, [FULL_PRODUCT, "{pas du json", other])
+
+    records = list(off_dump.iter_products(path))
+
+    assert [number for number, _ in records] == [1, 2, 3]
+    assert records[1][1] is None
+    first = records[0][1]
+    assert set(first) <= set(off_dump.DUMP_FIELDS)
+    assert "images" not in first and first["nutriments"] == FULL_PRODUCT["nutriments"]
+    assert "brands" not in records[2][1]  # valeur vide retirée
+
+    assert [number for number, _ in off_dump.iter_products(path, skip=2)] == [3]
+
+
+def test_csv_export_is_mapped_to_the_json_shape(tmp_path):
+    header = ["code", "product_name", "brands", "countries_tags", "additives_tags", "nova_group",
+              "energy-kcal_100g", "sugars_100g", "salt_100g", "image_small_url"]
+    row = ["6130234000154", "Jus d'orange", "Rouiba", "en:algeria,en:france", "en:e330", "4", "43", "9.8", "", "x"]
+    path = tmp_path / "products.csv"
+    path.write_text("\t".join(header) + "\n" + "\t".join(row) + "\n", encoding="utf-8")
+
+    [(number, product)] = list(off_dump.iter_products(str(path)))
+
+    assert number == 1
+    assert product == {
+        "code": "6130234000154", "product_name": "Jus d'orange", "brands": "Rouiba",
+        "countries_tags": ["en:algeria", "en:france"], "additives_tags": ["en:e330"], "nova_group": "4",
+        "nutriments": {"energy-kcal_100g": 43.0, "sugars_100g": 9.8},
+    }
+
+
+def test_filters_combine_criteria():
+    keep = off_dump.make_filter(countries=["algeria", "en:tunisia"], prefixes=["613", "619"])
+
+    assert keep({"code": "6130234000154", "countries_tags": ["en:algeria"]})
+    assert keep({"code": "6190000000000", "countries_tags": ["en:tunisia", "en:france"]})
+    assert not keep({"code": "3017620422003", "countries_tags": ["en:algeria"]})
+    assert not keep({"code": "6130234000154", "countries_tags": ["en:france"]})
+    assert off_dump.make_filter()({"code": "123"})
+
+
+def test_prepare_batch_uses_the_api_mapping_and_scoring():
+    product = {k: v for k, v in FULL_PRODUCT.items() if k in off_dump.DUMP_FIELDS}
+    duplicate = {**product, "product_name": "Ancienne fiche"}
+    batch = [duplicate, product, {"code": "123"}, {"product_name": "Sans code"}, {**product, "code": "9", "nova_group": "x"}]
+
+    rows, unknown, rejected = off_dump.prepare_batch(batch, PENALTIES)
+
+    assert rejected == 3
+    [row] = rows
+    loaded = dict(zip(off_dump.COPY_COLUMNS, row))
+    expected = off_fields.to_product_create(
+        product["code"], product, scoring.score_product(product, PENALTIES, None)
+    ).model_dump()
+    for column in off_dump.JSON_COLUMNS:
+        loaded[column] = orjson.loads(loaded[column]) if loaded[column] is not None else None
+    assert loaded.pop("fetched_at") <= expected.pop("fetched_at")
+    assert loaded == expected and loaded["source"] == "openfoodfacts"
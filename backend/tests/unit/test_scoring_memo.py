@@ -0,0 +1,47 @@
+from bdproduitdz import scoring
+
+PENALTIES = {"e330": 1.0, "e250": 3.0}
+PRODUCT = {
+    "product_name": "Cachir",
+    "nutriments": {"energy-kcal_100g": 250, "salt_100g": 2.1, "saturated-fat_100g": 6},
+    "additives_tags": ["en:e250", "en:e330"],
+    "nova_group": 4,
+}
+
+
+def setup_function():
+    scoring.clear_score_memo()
+
+
+def test_identical_content_hits_the_memo():
+    first = scoring.score_product(PRODUCT, PENALTIES, version=1)
+    # Même contenu, clés dans un autre ordre et champ non pertinent différent.
+    reordered = {"nova_group": 4, "additives_tags": ["en:e250", "en:e330"],
+                 "nutriments": dict(PRODUCT["nutriments"]), "product_name": "Autre nom"}
+    second = scoring.score_product(reordered, PENALTIES, version=1)
+
+    assert first == second
+    assert scoring.get_score_memo_stats()["hits"] == 1
+    assert scoring.get_score_memo_stats()["misses"] == 1
+
+
+def test_new_additive_version_recomputes():
+    before = scoring.score_product(PRODUCT, PENALTIES, version=1)
+    after = scoring.score_product(PRODUCT, {"e330": 1.0, "e250": 1.0}, version=2)
+
+    assert before["score"] < after["score"]
+    assert scoring.get_score_memo_stats()["misses"] == 2
+
+
+def test_callers_cannot_corrupt_cached_result():
+    result = scoring.score_product(PRODUCT, PENALTIES, version=1)
+    result["details"]["nutrition_details"]["N_total"] = -1
+
+    again = scoring.score_product(PRODUCT, PENALTIES, version=1)
+    assert again["details"]["nutrition_details"]["N_total"] != -1
+
+
+def test_without_version_nothing_is_memoized():
+    scoring.score_product(PRODUCT, PENALTIES)
+    scoring.score_product(PRODUCT, PENALTIES)
+    assert scoring.get_score_memo_stats()["size"] == 0
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    sf = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"barcode": "6131234567890"}
+
+    results = await asyncio.gather(*(sf.do("off:6131234567890", fetch) for _ in range(50)))
+
+    assert calls == 1
+    assert all(r == {"barcode": "6131234567890"} for r in results)
+    assert sf.stats == {"leaders": 1, "followers": 49}
+    assert not sf.in_flight("off:6131234567890")
+
+
+@pytest.mark.asyncio
+async def test_leader_exception_is_shared_then_key_is_released():
+    sf = SingleFlight()
+    calls = 0
+
+    async def missing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise LookupError("not found")
+
+    results = await asyncio.gather(*(sf.do("k", missing) for _ in range(5)), return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, LookupError) for r in results)
+
+    # Un nouvel appel après coup relance bien le travail.
+    with pytest.raises(LookupError):
+        await sf.do("k", missing)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_leader_is_cancelled():
+    sf = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "ok"
+
+    leader = asyncio.create_task(sf.do("k", slow))
+    await started.wait()
+    follower = asyncio.create_task(sf.do("k", fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ok"
+    with pytest.raises(asyncio.CancelledError):
+        await leader